@@ -10,69 +10,42 @@ Groundwater recharge calculations for drought proofing tool
 
 import numpy as np
 import pandas as pd
-from shared.utilities import to_float, convert_dtypes
-from soil_storage_bucket.processing.water_stress import calc_ks_soil_cond, calc_ks_soil
-from soil_storage_bucket.outflux.evapotranspiration import calc_ke, calc_esi_fallow, calc_ae_soil_fallow
-from shared import config_constants
+from shared.utilities import to_float, convert_dtypes, assign_columns
+from shared.model_state import get_label_matrix
+from shared.model_calendar import resample_monthly
+from soil_storage_bucket.processing.water_stress import calc_ks_cond_array, calc_ks_array
+from soil_storage_bucket.outflux.evapotranspiration import calc_ae_soil_array
+from shared.run_context import get_constant
 # Removed circular import - moved calc_smd_fallow function to this file
 from soil_storage_bucket.outflux.irrigation_demand import calculate_iwr, calculate_monthly_iwr
 from orchestrator.input_collector import collect_inp_variables
 
 
 # recharge_calculations.py - Function 001: Calculates groundwater recharge for fallow and crop plots
-# Interactions: calc_monthly_gwnrm_crop, soil_storage_bucket.outflux.evapotranspiration.calc_ke, soil_storage_bucket.outflux.evapotranspiration.calc_esi_fallow, soil_storage_bucket.processing.water_stress.calc_ks_soil_cond, soil_storage_bucket.processing.water_stress.calc_ks_soil, soil_storage_bucket.outflux.evapotranspiration.calc_ae_soil_fallow, calc_smd_fallow, calc_gwnr_fallow, calc_monthly_gwnrm_fallow, calc_fallow_area1, calc_recharge, calc_monthly_recharge, soil_storage_bucket.outflux.irrigation_demand.calculate_iwr, soil_storage_bucket.outflux.irrigation_demand.calculate_monthly_iwr, shared.utilities.convert_dtypes, numpy, pandas
-def calc_gwnr_fallow_plot(df_crop, df_mm, df_dd, all_plots, all_crops, inp_lulc_val_list, df_cc):
+# Interactions: calc_monthly_gwnrm_crop, set_fallow_evaporation, calc_fallow_smd_series, calc_gwnr_fallow_array, shared.utilities.assign_columns, calc_monthly_gwnrm_fallow, calc_fallow_area1, calc_recharge_array, calc_monthly_recharge, soil_storage_bucket.outflux.irrigation_demand.calculate_iwr, soil_storage_bucket.outflux.irrigation_demand.calculate_monthly_iwr, shared.utilities.convert_dtypes, shared.run_context.get_constant, numpy, pandas
+def calc_gwnr_fallow_plot(df_crop, df_mm, df_dd, all_plots, all_crops, inp_lulc_val_list, df_cc, model_calendar,
+                          fallow=None):
     print("FUNCTION 19: calc_gwnr_fallow_plot() - Calculating groundwater recharge for fallow plots")
-    df_mm = calc_monthly_gwnrm_crop(df_crop, df_mm, all_plots)
-    df_dd["Kc_Fallow"] = np.float32(0)
-    df_dd["Ke_Fallow"] = df_dd["Kc_Fallow"].apply(calc_ke)
-    df_dd["ESi_Fallow"] = df_dd.apply(lambda row: calc_esi_fallow(row), axis=1)
-    df_dd.loc[0, "SMDi_shifted_Fallow"] = config_constants.SMDi_1
-    
-    # TEMPORARILY DISABLED: September 1st fallow reset (for testing)
-    # fallow_reset_indices = []
-    # for i in range(len(df_dd)):
-    #     # Check if date is September 1st of any year
-    #     date = pd.to_datetime(df_dd.loc[i, "Date"])
-    #     if date.month == 9 and date.day == 1:
-    #         fallow_reset_indices.append(i)
-    for i in range(len(df_dd)):
-        if i > 0:
-            # ALWAYS use previous day's SMDi_Fallow (no reset)
-            df_dd.loc[i, "SMDi_shifted_Fallow"] = df_dd.loc[i - 1, "SMDi_Fallow"]
-            # ORIGINAL RESET LOGIC (commented out):
-            # if i in fallow_reset_indices:
-            #     df_dd.loc[i, "SMDi_shifted_Fallow"] = 0
-            # else:
-            #     df_dd.loc[i, "SMDi_shifted_Fallow"] = df_dd.loc[i - 1, "SMDi_Fallow"]
-        df_dd.loc[i, "Ks_soil_cond_Fallow"] = calc_ks_soil_cond(df_dd.loc[i, "Ke_Fallow"],
-                                                                df_dd.loc[i, "SMDi_shifted_Fallow"],
-                                                                df_crop.loc[i, "REWi"],
-                                                                df_crop.loc[i, "TEWi"])
-        df_dd.loc[i, "Ks_soil_Fallow"] = calc_ks_soil(df_dd.loc[i, "Ks_soil_cond_Fallow"],
-                                                      df_crop.loc[i, "TEWi"],
-                                                      df_dd.loc[i, "SMDi_shifted_Fallow"],
-                                                      df_crop.loc[i, "REWi"])
-        df_dd.loc[i, "AE_soil_Fallow"] = calc_ae_soil_fallow(df_dd.loc[i, "ESi_Fallow"],
-                                                             df_dd.loc[i, "Pei"],
-                                                             df_dd.loc[i, "Ks_soil_cond_Fallow"],
-                                                             df_dd.loc[i, "Ks_soil_Fallow"])
-        df_dd.loc[i, "SMDi_Fallow"] = calc_smd_fallow(df_dd.loc[i, "SMDi_shifted_Fallow"],
-                                                      df_dd.loc[i, "AE_soil_Fallow"],
-                                                      df_dd.loc[i, "Pei"])
-    df_crop["GWnr_Fallow"] = df_dd.apply(lambda row: calc_gwnr_fallow(row["SMDi_Fallow"],
-                                                                      row["SMDi_shifted_Fallow"],
-                                                                      row["AE_soil_Fallow"],
-                                                                      row["Pei"]), axis=1)
-    df_mm = calc_monthly_gwnrm_fallow(df_crop, df_mm)
+    df_mm = calc_monthly_gwnrm_crop(df_crop, df_mm, all_plots, model_calendar)
+    df_dd = set_fallow_evaporation(df_dd)
+    # The fallow deficit carries over day to day with no seasonal reset; ensembles pass a member's stepped series
+    if fallow is None:
+        fallow = calc_fallow_smd_series(df_dd["Ke_Fallow"].to_numpy(), df_dd["ESi_Fallow"].to_numpy(),
+                                        df_dd["Pei"].to_numpy(dtype=np.float64),
+                                        df_crop["REWi"].to_numpy(dtype=np.float64),
+                                        df_crop["TEWi"].to_numpy(dtype=np.float64), get_constant("SMDi_1"))
+    df_dd = assign_columns(df_dd, {f"{var}_Fallow": values for var, values in fallow.items()})
+    df_crop["GWnr_Fallow"] = calc_gwnr_fallow_array(fallow["SMDi"], fallow["SMDi_shifted"], fallow["AE_soil"],
+                                                    df_dd["Pei"].to_numpy(dtype=np.float64))
+    df_mm = calc_monthly_gwnrm_fallow(df_crop, df_mm, model_calendar)
     df_crop = calc_fallow_area1(df_crop, inp_lulc_val_list[1], inp_lulc_val_list[2], inp_lulc_val_list[3], inp_lulc_val_list[4], inp_lulc_val_list[5])
     # Calculate sum of all crop areas for recharge calculation
     # This will be the sum of all crop areas (Chilli: 712 + Tobacco: 1880 + Pulses: 1150 = 3742)
     total_crop_areas = sum(df_cc["Area"].values)  # Sum of all crop areas from crop characteristics
-    df_crop["Recharge"] = df_crop.apply(lambda row: calc_recharge(row, all_plots, total_crop_areas), axis=1)
-    df_mm = calc_monthly_recharge(df_crop, df_mm)
+    df_crop["Recharge"] = calc_recharge_array(df_crop, all_plots, total_crop_areas)
+    df_mm = calc_monthly_recharge(df_crop, df_mm, model_calendar)
     df_crop = calculate_iwr(df_dd, df_crop, all_crops)
-    df_mm = calculate_monthly_iwr(df_dd, df_mm.copy(), df_crop.copy(), all_crops)
+    df_mm = calculate_monthly_iwr(df_dd, df_mm.copy(), df_crop.copy(), all_crops, model_calendar)
     df_dd = convert_dtypes(df_dd)
     df_crop = convert_dtypes(df_crop)
     
@@ -87,41 +60,71 @@ def calc_gwnr_fallow_plot(df_crop, df_mm, df_dd, all_plots, all_crops, inp_lulc_
     #         df_crop.loc[not_sown_mask, ae_soil_crop_col] = df_dd.loc[not_sown_mask, "AE_soil_Fallow"]
     
     # Recalculate monthly aggregation after AE_soil changes
-    df_mm = calculate_monthly_iwr(df_dd, df_mm.copy(), df_crop.copy(), all_crops)
+    df_mm = calculate_monthly_iwr(df_dd, df_mm.copy(), df_crop.copy(), all_crops, model_calendar)
     
     return df_crop, df_mm, df_dd
 
 
+# recharge_calculations.py - Function 001A: Steps the fallow soil moisture deficit through time for day-indexed arrays
+# Interactions: soil_storage_bucket.processing.water_stress.calc_ks_cond_array, soil_storage_bucket.processing.water_stress.calc_ks_array, soil_storage_bucket.outflux.evapotranspiration.calc_ae_soil_array, numpy
+def calc_fallow_smd_series(ke, esi, pei, rewi, tewi, smdi_1):
+    # Arrays are days first; any trailing axes (e.g. ensemble members) are stepped together, and day-only inputs
+    # are shared by every member
+    pei = np.asarray(pei, dtype=np.float64)
+    shape = pei.shape
+    ke, esi, rewi, tewi = (np.asarray(values, dtype=np.float64) for values in (ke, esi, rewi, tewi))
+    ke, esi, rewi, tewi = (np.broadcast_to(values.reshape((shape[0],) + (1,) * (len(shape) - 1))
+                                           if values.ndim == 1 else values, shape)
+                           for values in (ke, esi, rewi, tewi))
+    fallow = {var: np.zeros(shape, dtype=np.float64)
+              for var in ["SMDi_shifted", "Ks_soil_cond", "Ks_soil", "AE_soil", "SMDi"]}
+    smdi_prev = np.full(shape[1:], smdi_1, dtype=np.float64)
+    for i in range(shape[0]):
+        fallow["SMDi_shifted"][i] = smdi_prev
+        fallow["Ks_soil_cond"][i] = calc_ks_cond_array(ke[i], smdi_prev, rewi[i], tewi[i])
+        fallow["Ks_soil"][i] = calc_ks_array(fallow["Ks_soil_cond"][i], tewi[i], smdi_prev, rewi[i])
+        # Fallow evaporation is the bare-soil case of AE_soil with no conservation reduction
+        fallow["AE_soil"][i] = calc_ae_soil_array(esi[i], pei[i], fallow["Ks_soil_cond"][i], fallow["Ks_soil"][i], 1)
+        smdi_value = smdi_prev + fallow["AE_soil"][i] - pei[i]
+        smdi_prev = np.where(smdi_value < 0, 0, smdi_value)
+        fallow["SMDi"][i] = smdi_prev
+    return fallow
+
+
+# recharge_calculations.py - Function 001B: Sets the bare-soil fallow evaporation coefficient and daily evaporation
+# Interactions: numpy
+def set_fallow_evaporation(df_dd):
+    df_dd["Kc_Fallow"] = np.float32(0)
+    df_dd["Ke_Fallow"] = np.where(df_dd["Kc_Fallow"] == 0, 1.05, 0)
+    df_dd["ESi_Fallow"] = df_dd["EToi"].to_numpy(dtype=np.float64) * df_dd["Ke_Fallow"].to_numpy()
+    return df_dd
+
+
 # recharge_calculations.py - Function 002: Calculates groundwater natural recharge when soil is at field capacity
 # Interactions: None
 def calc_gwnr(smdi, smdi_shifted, ae_crop, ae_soil, pei):
     return abs(smdi_shifted + ae_crop + ae_soil - pei) if smdi == 0 else 0
 
 
+# recharge_calculations.py - Function 002A: Calculates groundwater natural recharge for day x plot arrays
+# Interactions: numpy
+def calc_gwnr_array(smdi, smdi_shifted, ae_crop, ae_soil, pei):
+    # Recharge only drains when the soil is back at field capacity (no deficit)
+    return np.where(smdi == 0, np.abs(smdi_shifted + ae_crop + ae_soil - pei), 0)
+
+
 # recharge_calculations.py - Function 003: Updates groundwater natural recharge for all plots in dataset
-# Interactions: calc_gwnr, numpy, pandas
+# Interactions: calc_gwnr_array, shared.model_state.get_label_matrix, shared.utilities.assign_columns, numpy
 def update_gwnr(df_crop, df_dd, all_plots):
     # Initialize a column for total GWnr
     df_crop["GWnr"] = np.float32(0)
-    # Loop over each plot and calculate GWnr
-    for plot in all_plots:
-        smdi_col = f"SMDi_{plot}"
-        smdi_shifted_col = f"SMDi_shifted_{plot}"
-        ae_crop_col = f"AE_crop_{plot}"
-        ae_soil_col = f"AE_soil_{plot}"
-        # Calculate GWnr for each plot and store in a new column
-        df_crop[f"GWnr_{plot}"] = df_crop.apply(
-            lambda row: calc_gwnr(
-                row[smdi_col],
-                row[smdi_shifted_col],
-                row[ae_crop_col],
-                row[ae_soil_col],
-                df_dd.loc[row.name, "Pei"]
-            ),
-            axis=1
-        )
-        # # Add to the total GWnr
-        # df_crop["GWnr"] += df_crop[f"GWnr_{plot}"]
+    # Calculate GWnr for all plots at once as days x plots matrices
+    gwnr = calc_gwnr_array(get_label_matrix(df_crop, "SMDi", all_plots),
+                           get_label_matrix(df_crop, "SMDi_shifted", all_plots),
+                           get_label_matrix(df_crop, "AE_crop", all_plots),
+                           get_label_matrix(df_crop, "AE_soil", all_plots),
+                           df_dd["Pei"].to_numpy()[:, np.newaxis])
+    df_crop = assign_columns(df_crop, {f"GWnr_{plot}": gwnr[:, j] for j, plot in enumerate(all_plots)})
 
     # Ensure the total GWnr is of the correct type
     df_crop["GWnr"] = df_crop["GWnr"].astype("float32")
@@ -130,12 +133,12 @@ def update_gwnr(df_crop, df_dd, all_plots):
 
 
 # recharge_calculations.py - Function 004: Aggregates daily groundwater recharge to monthly values for crops
-# Interactions: pandas
-def calc_monthly_gwnrm_crop(df_crop, df_mm, all_plots):
+# Interactions: shared.model_calendar.resample_monthly, pandas
+def calc_monthly_gwnrm_crop(df_crop, df_mm, all_plots, model_calendar):
     print("FUNCTION 38: calc_monthly_gwnrm_crop() - Calculating monthly groundwater recharge")
     for plot in all_plots:
-        # Resample the GWnr values for each crop to a monthly frequency and sum them
-        gw_nrm = df_crop.resample("M", on="Date")[f"GWnr_{plot}"].sum().reset_index()
+        # Sum the GWnr values for each plot per calendar month
+        gw_nrm = resample_monthly(model_calendar, df_crop, [f"GWnr_{plot}"])
         # Merge the resampled monthly GWnr values into df_mm
         df_mm = df_mm.merge(gw_nrm, on="Date", how="left")
         # Rename the column appropriately
@@ -149,11 +152,17 @@ def calc_gwnr_fallow(smdi_fallow, smdi_shifted_fallow, ae_soil_fallow, pei):
     return abs(smdi_shifted_fallow + ae_soil_fallow - pei) if smdi_fallow == 0 else np.float32(0)
 
 
+# recharge_calculations.py - Function 005A: Calculates fallow groundwater natural recharge for day-indexed arrays
+# Interactions: numpy
+def calc_gwnr_fallow_array(smdi_fallow, smdi_shifted_fallow, ae_soil_fallow, pei):
+    return np.where(smdi_fallow == 0, np.abs(smdi_shifted_fallow + ae_soil_fallow - pei), 0)
+
+
 # recharge_calculations.py - Function 006: Aggregates daily groundwater recharge from fallow areas to monthly totals
-# Interactions: pandas
-def calc_monthly_gwnrm_fallow(df_crop, df_mm):
-    # Resample the GWnr values to a monthly frequency and sum them
-    gw_nrmf = df_crop.resample("M", on="Date")["GWnr_Fallow"].sum().reset_index()
+# Interactions: shared.model_calendar.resample_monthly, pandas
+def calc_monthly_gwnrm_fallow(df_crop, df_mm, model_calendar):
+    # Sum the GWnr values per calendar month
+    gw_nrmf = resample_monthly(model_calendar, df_crop, ["GWnr_Fallow"])
     # Merge the resampled monthly GWnr values into df_mm
     df_mm = df_mm.merge(gw_nrmf, on="Date", how="left")
     # Rename the column appropriately
@@ -184,10 +193,23 @@ def calc_recharge(row, all_plots, total_crop_areas):
     return numerator / denominator if denominator != 0 else 0
 
 
+# recharge_calculations.py - Function 008A: Calculates area-weighted recharge for all days from day x plot matrices
+# Interactions: shared.model_state.get_label_matrix, numpy
+def calc_recharge_array(df_crop, all_plots, total_crop_areas):
+    nsa = get_label_matrix(df_crop, "NSA", all_plots, dtype=np.float64, template="{label}_{var}")
+    gwnr = get_label_matrix(df_crop, "GWnr", all_plots, dtype=np.float64)
+    fallow_area = df_crop["Fallow Area Recharge"].to_numpy(dtype=np.float64)
+    numerator = (nsa * gwnr).sum(axis=1) + fallow_area * df_crop["GWnr_Fallow"].to_numpy(dtype=np.float64)
+    # Use sum of all crop areas + fallow area recharge as denominator
+    denominator = total_crop_areas + fallow_area
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator != 0, numerator / denominator, 0)
+
+
 # recharge_calculations.py - Function 009: Aggregates daily recharge values to monthly totals for water balance
-# Interactions: pandas
-def calc_monthly_recharge(df_crop, df_mm):
-    recharge = df_crop.resample("M", on="Date")["Recharge"].sum().reset_index()
+# Interactions: shared.model_calendar.resample_monthly, pandas
+def calc_monthly_recharge(df_crop, df_mm, model_calendar):
+    recharge = resample_monthly(model_calendar, df_crop, ["Recharge"])
     # Merge the resampled monthly GWnr values into df_mm
     df_mm = df_mm.merge(recharge, on="Date", how="left")
     return df_mm
@@ -14,12 +14,14 @@ Usage:
     python converter.py all
 """
 
-import pandas as pd
 import os
 import sys
 
+# pandas is imported inside the conversion functions, so usage and argument errors return without loading it
+
 def read_correct_csv(scenario_num):
     """Read the tabular 'correct' CSV file for a scenario."""
+    import pandas as pd
     file_path = f"Datasets/Inputs/csv_inputs/interventions_scenario_{scenario_num}_correct.csv"
     
     if not os.path.exists(file_path):
@@ -31,6 +33,7 @@ def read_correct_csv(scenario_num):
 
 def parse_tabular_data(df):
     """Parse the tabular CSV data into structured format."""
+    import pandas as pd
     data = {}
     
     # Find the general settings
@@ -211,6 +214,7 @@ def parse_tabular_data(df):
 
 def generate_keyvalue_csv(interventions, scenario_num):
     """Generate key-value pair CSV file from interventions data."""
+    import pandas as pd
     output_file = f"Datasets/Inputs/csv_inputs/interventions_scenario_{scenario_num}.csv"
     
     # Define the order of parameters to match existing files
@@ -0,0 +1,252 @@
+"""
+Multi-site batch controller for drought proofing tool
+
+This module contains functions for running many sites from one site manifest:
+- Site manifest rows giving each site's input, intervention and optional climate files
+- Crop and radiation databases read once and shared by every site
+- Sites grouped by climate series so the parsed rainfall and run calendar are built once per group
+- Site groups run sequentially or across worker processes
+- Per-site outputs and a consolidated cross-site summary
+- A run ledger of completed sites and optional stage checkpoints, so an interrupted batch resumes
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Runs hundreds of sites (villages) from a site manifest in one batch, sharing the static databases and climate stages between sites and writing per-site outputs and a cross-site summary
+# ========================================
+
+import io
+import os
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from shared.run_context import create_run_context, activate_run_context, get_default_constants
+from shared.checkpoints import (calc_input_hash, calc_model_hash, read_run_ledger, append_ledger_entry,
+                                save_stage_checkpoint, load_stage_checkpoint, clear_stage_checkpoints)
+from orchestrator.main_controller import (get_scenario_file_paths, prepare_climate_stages,
+                                          prepare_rain_independent_stages, prepare_supply_independent_stages,
+                                          run_supply_dependent_stages, save_dataframes_scenario)
+from orchestrator.model_api import INPUT_TABLE_READ_KWARGS
+from orchestrator.model_service import summarize_outputs
+
+
+# Manifest columns naming a site's own files; blank cells fall back to the master Datasets files
+SITE_FILE_KEYS = ["input_baseline", "input_interventions", "daily_data", "monthly_data", "irrigation"]
+# Databases shared by every site of a batch
+STATIC_TABLE_KEYS = ["crop_db", "radiation_db"]
+# Files that make up a site's climate; sites with the same files share climate stages
+CLIMATE_TABLE_KEYS = ["daily_data", "monthly_data"]
+# Folder under Datasets/Outputs that holds batch outputs unless another is given
+DEFAULT_BATCH_FOLDER = "Sites"
+
+# Shared databases and batch settings held by each worker process
+_worker_state = {}
+
+
+# batch_controller.py - Function 001: Reads a site manifest into site definitions with resolved file paths
+# Interactions: orchestrator.main_controller.get_scenario_file_paths, pandas, os
+def read_site_manifest(manifest_path, master_path, scenario_num=0):
+    df_sites = pd.read_csv(manifest_path, dtype=str).fillna("")
+    if "Site" not in df_sites.columns:
+        raise ValueError(f"Site manifest {manifest_path} has no 'Site' column")
+    duplicated = df_sites.loc[df_sites.duplicated(["Site"] + (["Scenario"] if "Scenario" in df_sites else [])),
+                              "Site"].tolist()
+    if duplicated:
+        raise ValueError(f"Site manifest {manifest_path} repeats sites {duplicated}")
+    # Relative file paths in the manifest are taken from the manifest's own folder
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    sites = []
+    for row in df_sites.to_dict("records"):
+        site_scenario = int(row["Scenario"]) if row.get("Scenario") else scenario_num
+        file_paths = dict(get_scenario_file_paths("csv", master_path, site_scenario))
+        for key in SITE_FILE_KEYS:
+            if row.get(key):
+                file_paths[key] = os.path.join(manifest_dir, row[key])
+        missing = [file_paths[key] for key in SITE_FILE_KEYS + STATIC_TABLE_KEYS
+                   if not os.path.exists(file_paths[key])]
+        if missing:
+            raise ValueError(f"Site '{row['Site']}' is missing input files {missing}")
+        sites.append({"site": row["Site"], "scenario_num": site_scenario, "file_paths": file_paths})
+    return sites
+
+
+# batch_controller.py - Function 002: Groups sites by the climate files they read
+# Interactions: None
+def group_sites_by_climate(sites):
+    groups = {}
+    for site in sites:
+        groups.setdefault(tuple(site["file_paths"][key] for key in CLIMATE_TABLE_KEYS), []).append(site)
+    return list(groups.values())
+
+
+# batch_controller.py - Function 003: Reads input tables once so every site of the batch shares them
+# Interactions: orchestrator.model_api.INPUT_TABLE_READ_KWARGS, pandas
+def read_shared_tables(file_paths, keys):
+    return {file_paths[key]: pd.read_csv(file_paths[key], **INPUT_TABLE_READ_KWARGS.get(key, {})) for key in keys}
+
+
+# batch_controller.py - Function 004: Prepares a site's stages, resuming from its stage checkpoints when they exist
+# Interactions: orchestrator.main_controller.prepare_rain_independent_stages, orchestrator.main_controller.prepare_supply_independent_stages, shared.checkpoints
+def prepare_site_stages(site, master_path, context, checkpoint_dir=None):
+    static_stages = balance_stages = None
+    if checkpoint_dir is not None:
+        static_stages = load_stage_checkpoint(checkpoint_dir, "static", site["input_hash"])
+    if static_stages is None:
+        static_stages = prepare_rain_independent_stages("csv", master_path, site["file_paths"], context,
+                                                        site["scenario_num"])
+        if checkpoint_dir is not None:
+            # The run context holds the batch's shared tables, so it is left out and rebuilt on resume
+            save_stage_checkpoint(checkpoint_dir, "static", site["input_hash"],
+                                  {key: value for key, value in static_stages.items() if key != "context"})
+    else:
+        static_stages = dict(static_stages, context=context)
+        balance_stages = load_stage_checkpoint(checkpoint_dir, "balance", site["input_hash"])
+    if balance_stages is None:
+        balance_stages = prepare_supply_independent_stages(static_stages)
+        if checkpoint_dir is not None:
+            save_stage_checkpoint(checkpoint_dir, "balance", site["input_hash"], balance_stages)
+    return static_stages, balance_stages
+
+
+# batch_controller.py - Function 004A: Runs one site with the shared tables and climate stages and saves its outputs
+# Interactions: prepare_site_stages, orchestrator.main_controller, orchestrator.model_service.summarize_outputs, shared.checkpoints.clear_stage_checkpoints, shared.run_context, contextlib, io, time, os
+def run_site(site, settings, tables, climate_stages):
+    start = time.perf_counter()
+    master_path = settings["master_path"]
+    context = create_run_context("csv", master_path, site["scenario_num"], site["file_paths"], tables=tables)
+    context["climate_stages"] = climate_stages
+    checkpoint_dir = None
+    if settings["checkpoint_dir"] is not None:
+        checkpoint_dir = os.path.join(settings["checkpoint_dir"], site["site"], f"Scenario_{site['scenario_num']}")
+    # Stage progress messages are silenced per site to keep the batch log readable
+    with activate_run_context(context), contextlib.redirect_stdout(io.StringIO()):
+        static_stages, balance_stages = prepare_site_stages(site, master_path, context, checkpoint_dir)
+        outputs = run_supply_dependent_stages(static_stages, balance_stages, settings["year_type"])
+        if settings["output_dir"] is not None:
+            save_dataframes_scenario(site["scenario_num"], master_path, outputs, "csv",
+                                     os.path.join(settings["output_dir"], site["site"]))
+    if checkpoint_dir is not None:
+        clear_stage_checkpoints(checkpoint_dir, settings["checkpoint_dir"])
+    return {"Site": site["site"], "Scenario": site["scenario_num"], "Status": "completed",
+            "Run Time (s)": round(time.perf_counter() - start, 2),
+            **summarize_outputs(outputs, static_stages["all_crops"])}
+
+
+# batch_controller.py - Function 005: Runs a group of sites on one climate, building its climate stages once
+# Interactions: read_shared_tables, run_site, orchestrator.main_controller.prepare_climate_stages, shared.checkpoints.append_ledger_entry, shared.run_context
+def run_site_group(sites, settings, static_tables):
+    file_paths = sites[0]["file_paths"]
+    tables = {**static_tables, **read_shared_tables(file_paths, CLIMATE_TABLE_KEYS)}
+    climate_context = create_run_context("csv", settings["master_path"], 0, file_paths, tables=tables)
+    with activate_run_context(climate_context):
+        climate_stages = prepare_climate_stages(file_paths)
+    rows = []
+    for site in sites:
+        # A failing site is recorded in the summary and does not stop the rest of the batch
+        try:
+            row = run_site(site, settings, tables, climate_stages)
+        except Exception as e:
+            rows.append({"Site": site["site"], "Scenario": site["scenario_num"], "Status": f"failed: {e}"})
+            continue
+        # The ledger entry is written once the site's outputs are saved, so a resumed batch can skip the site
+        append_ledger_entry(settings["ledger_path"], {**row, "Input_Hash": site["input_hash"]})
+        rows.append(row)
+    return rows
+
+
+# batch_controller.py - Function 006: Stores the shared databases and batch settings in a worker process
+# Interactions: None
+def _init_worker(settings, static_tables):
+    _worker_state["settings"] = settings
+    _worker_state["static_tables"] = static_tables
+
+
+# batch_controller.py - Function 007: Runs one site group inside a worker process
+# Interactions: run_site_group
+def _run_worker_group(sites):
+    return run_site_group(sites, _worker_state["settings"], _worker_state["static_tables"])
+
+
+# batch_controller.py - Function 008: Splits climate groups into chunks so every worker gets a share of the sites
+# Interactions: None
+def split_site_groups(groups, workers):
+    n_sites = sum(len(group) for group in groups)
+    chunk_size = max(1, -(-n_sites // (4 * workers))) if workers > 1 else max(n_sites, 1)
+    return [group[i:i + chunk_size] for group in groups for i in range(0, len(group), chunk_size)]
+
+
+# batch_controller.py - Function 008A: Writes a table through a temporary file so readers never see a partial file
+# Interactions: pandas, os
+def write_table_atomic(df, file_path):
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    temp_path = f"{file_path}.tmp"
+    df.to_csv(temp_path, index=False)
+    os.replace(temp_path, file_path)
+    return file_path
+
+
+# batch_controller.py - Function 009: Runs every site of a manifest and returns the cross-site summary
+# Interactions: read_site_manifest, group_sites_by_climate, read_shared_tables, split_site_groups, run_site_group, write_table_atomic, _init_worker, _run_worker_group, shared.checkpoints, shared.run_context.get_default_constants, concurrent.futures, pandas, os, time
+def run_site_batch(manifest_path, master_path, year_type="calendar", scenario_num=0, workers=1, output_dir=None,
+                   save_outputs=True, summary_path=None, resume=True, checkpoint_stages=False, ledger_path=None):
+    print("FUNCTION 37: run_site_batch() - Running multi-site batch")
+    sites = read_site_manifest(manifest_path, master_path, scenario_num)
+    if not sites:
+        raise ValueError(f"Site manifest {manifest_path} lists no sites")
+    if output_dir is None:
+        output_dir = os.path.join(master_path, "Datasets", "Outputs", DEFAULT_BATCH_FOLDER)
+    ledger_path = ledger_path or os.path.join(output_dir, "run_ledger.jsonl")
+    settings = {
+        "master_path": master_path,
+        "year_type": year_type,
+        "output_dir": output_dir if save_outputs else None,
+        "ledger_path": ledger_path,
+        # Stage checkpoints are kept next to the ledger, so everything a resume needs sits in one folder
+        "checkpoint_dir": os.path.join(os.path.dirname(os.path.abspath(ledger_path)), "checkpoints")
+        if checkpoint_stages else None,
+    }
+
+    # Units whose inputs, constants and model code are unchanged since the ledger recorded them complete are not
+    # run again
+    digests = {}
+    model_hash = calc_model_hash(get_default_constants())
+    for site in sites:
+        site["input_hash"] = calc_input_hash(site["file_paths"], (site["scenario_num"], year_type, model_hash),
+                                             digests)
+    completed = read_run_ledger(settings["ledger_path"]) if resume else {}
+    finished_rows, pending = [], []
+    for site in sites:
+        entry = completed.get((site["site"], site["scenario_num"]))
+        if entry is not None and entry["Input_Hash"] == site["input_hash"]:
+            finished_rows.append({key: value for key, value in entry.items() if key != "Input_Hash"})
+        else:
+            pending.append(site)
+    if finished_rows:
+        print(f"Resuming batch: {len(finished_rows)} of {len(sites)} sites already completed")
+
+    start = time.perf_counter()
+    chunk_rows = []
+    if pending:
+        # The crop and radiation databases are the master ones for every site, so they are read once here
+        static_tables = read_shared_tables(pending[0]["file_paths"], STATIC_TABLE_KEYS)
+        groups = group_sites_by_climate(pending)
+        print(f"Running {len(pending)} sites on {len(groups)} climate series")
+        chunks = split_site_groups(groups, workers)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(settings, static_tables)) as executor:
+                chunk_rows = list(executor.map(_run_worker_group, chunks))
+        else:
+            chunk_rows = [run_site_group(chunk, settings, static_tables) for chunk in chunks]
+    # Rows come back grouped by climate, so they are put back in manifest order
+    order = {(site["site"], site["scenario_num"]): position for position, site in enumerate(sites)}
+    df_summary = pd.DataFrame(sorted(finished_rows + [row for rows in chunk_rows for row in rows],
+                                     key=lambda row: order[(row["Site"], row["Scenario"])]))
+    failed = int((df_summary["Status"] != "completed").sum())
+    print(f"Ran {len(pending)} sites in {time.perf_counter() - start:.1f} s, {failed} failed")
+
+    # The summary is written last, so its presence marks a finished batch
+    write_table_atomic(df_summary, summary_path or os.path.join(output_dir, "batch_summary.csv"))
+    return {"batch_summary.csv": df_summary}
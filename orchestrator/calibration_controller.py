@@ -0,0 +1,143 @@
+"""
+Calibration controller for drought proofing tool
+
+This module contains functions for calibrating model parameters against observed monthly series:
+- Observed series matched to df_mm columns or the derived water table depth
+- Recharge coefficient, land use curve numbers and specific yield searched within bounds
+- Each trial run from the runoff stage on with prepared stages and no file I/O
+- Search history, calibrated parameters and best-fit series
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Fits recharge, curve number and aquifer parameters of a new site to observed groundwater and runoff series with a derivative-free search over the in-memory model stages
+# ========================================
+
+import io
+import time
+import contextlib
+import numpy as np
+import pandas as pd
+from shared.utilities import to_float
+from shared.data_readers import get_file_paths
+from shared.run_context import activate_run_context
+from shared.calibration import (CALIBRATION_OBJECTIVES, read_observed_series, pair_with_observed, calc_nse,
+                                calc_rmse, calc_objective_loss, minimize_nelder_mead)
+from orchestrator.main_controller import prepare_rain_independent_stages, run_storage_stages, create_scenario_context
+from orchestrator.sensitivity_controller import (get_parameter_value, get_parameter_bounds, create_evaluator,
+                                                 prepare_point_stages)
+
+
+# Parameters calibrated unless others are named: groundwater recharge, the land use curve numbers and specific yield
+CALIBRATION_PARAMETERS = ["Soil_GWrecharge_coefficient", "Builtup_cn2", "Pasture_cn2", "Forest_cn2", "Specific_Yield"]
+# Parameters are searched this fraction either side of their configured value unless bounds are given
+CALIBRATION_RELATIVE_RANGE = 0.5
+# Series derived from df_mm that can be matched to observations
+WATER_TABLE_SERIES = "Water_Table_Depth"
+
+
+# calibration_controller.py - Function 001: Calculates the monthly depth to the water table (m below ground) from residual storage
+# Interactions: shared.utilities.to_float, numpy
+def calc_water_table_depth(df_mm, aquifer_para_list):
+    aquifer_depth = to_float(aquifer_para_list[0], 0)
+    specific_yield = to_float(aquifer_para_list[2], 0)
+    total_area = to_float(aquifer_para_list[3], 0)
+    if specific_yield == 0 or total_area == 0:
+        raise ValueError("Water table depth needs a non-zero Specific_Yield and area")
+    # Residual storage is the saturated thickness times specific yield and area, as in the storage limit
+    saturated_thickness = df_mm["Residual_storage"].to_numpy(dtype=np.float64) / (
+        specific_yield / 100 * total_area * 10000)
+    return aquifer_depth - saturated_thickness
+
+
+# calibration_controller.py - Function 002: Returns a simulated monthly series by name
+# Interactions: calc_water_table_depth
+def get_simulated_series(df_mm, aquifer_para_list, name):
+    if name == WATER_TABLE_SERIES:
+        return calc_water_table_depth(df_mm, aquifer_para_list)
+    if name not in df_mm.columns:
+        raise ValueError(f"'{name}' is neither a monthly output nor '{WATER_TABLE_SERIES}'")
+    return df_mm[name].to_numpy(dtype=np.float64)
+
+
+# calibration_controller.py - Function 003: Runs one parameter set and scores each simulated series against its observations
+# Interactions: get_simulated_series, orchestrator.sensitivity_controller.prepare_point_stages, orchestrator.main_controller.run_storage_stages, shared.calibration, shared.run_context.activate_run_context, contextlib, io
+def evaluate_calibration_point(evaluator, values, observations):
+    # Stage progress messages are silenced per trial to keep the calibration log readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        static_stages, balance_stages = prepare_point_stages(evaluator, values)
+        with activate_run_context(static_stages["context"]):
+            df_mm, _, _, _ = run_storage_stages(static_stages, balance_stages)
+    series, scores = {}, {}
+    for name, observed in observations.items():
+        series[name] = get_simulated_series(df_mm, balance_stages["aquifer_para_list"], name)
+        simulated, matched = pair_with_observed(df_mm["Date"], series[name], observed)
+        scores[name] = (simulated, matched)
+    return df_mm["Date"], series, scores
+
+
+# calibration_controller.py - Function 004: Calibrates parameters against observed series and returns the history, parameters and best-fit series
+# Interactions: evaluate_calibration_point, orchestrator.sensitivity_controller, orchestrator.main_controller, shared.calibration, shared.data_readers.get_file_paths, shared.run_context.activate_run_context, numpy, pandas, time
+def calibrate_parameters(inp_source, master_path, observations, context=None, scenario_num=0, parameters=None,
+                         bounds=None, objective="nse", max_evaluations=100,
+                         relative_range=CALIBRATION_RELATIVE_RANGE):
+    print("FUNCTION 36: calibrate_parameters() - Calibrating model parameters against observations")
+    if objective not in CALIBRATION_OBJECTIVES:
+        raise ValueError(f"Objective must be one of {CALIBRATION_OBJECTIVES}, got '{objective}'")
+    if not observations:
+        raise ValueError("Give at least one observed series to calibrate against")
+    # Observations are given as observed series or as paths of Date/value CSV files
+    observations = {name: read_observed_series(observed) if isinstance(observed, str) else observed
+                    for name, observed in observations.items()}
+    parameters = list(CALIBRATION_PARAMETERS) if parameters is None else list(parameters)
+    if context is None:
+        context = create_scenario_context(inp_source, master_path, scenario_num)
+    with activate_run_context(context):
+        file_paths = get_file_paths(inp_source, master_path)
+        static_stages = prepare_rain_independent_stages(inp_source, master_path, file_paths, context, scenario_num)
+    initial = [get_parameter_value(static_stages, name) for name in parameters]
+    lows, highs = get_parameter_bounds(static_stages, parameters, bounds, relative_range)
+    evaluator = create_evaluator(static_stages, None, parameters)
+
+    history = []
+    best = {}
+
+    def loss_function(values):
+        dates, series, scores = evaluate_calibration_point(evaluator, values, observations)
+        # Several series count equally; NSE is already scale-free, RMSE is in each series' own units
+        loss = float(np.mean([calc_objective_loss(simulated, observed, objective)
+                              for simulated, observed in scores.values()]))
+        record = {"Evaluation": len(history), **dict(zip(parameters, map(float, values))), "Loss": loss}
+        for name, (simulated, observed) in scores.items():
+            record[f"{name}_NSE"] = calc_nse(simulated, observed)
+            record[f"{name}_RMSE"] = calc_rmse(simulated, observed)
+        history.append(record)
+        if len(history) == 1:
+            best["initial"] = series
+        if np.isfinite(loss) and loss < best.get("loss", np.inf):
+            best.update(loss=loss, dates=dates, series=series)
+        return loss
+
+    start = time.perf_counter()
+    result = minimize_nelder_mead(loss_function, initial, lows, highs, max_evaluations)
+    elapsed = time.perf_counter() - start
+    if "dates" not in best:
+        raise ValueError(f"None of the {len(history)} calibration trials gave a finite {objective.upper()} loss; "
+                         f"check that the observed series overlap the model run and vary over time")
+    print(f"Ran {len(history)} calibration trials in {elapsed:.1f} s; "
+          f"{objective.upper()} loss {history[0]['Loss']:.4f} -> {result['loss']:.4f}")
+
+    df_parameters = pd.DataFrame({"Parameter": parameters, "Initial": initial, "Calibrated": result["x"],
+                                  "Lower": lows, "Upper": highs})
+    df_series = pd.DataFrame({"Date": best["dates"].to_numpy()})
+    for name, observed in observations.items():
+        df_series[f"{name}_observed"] = observed.reindex(
+            pd.DatetimeIndex(df_series["Date"]).to_period("M")).to_numpy()
+        df_series[f"{name}_initial"] = best["initial"][name]
+        df_series[f"{name}_calibrated"] = best["series"][name]
+    return {
+        "calibration_history.csv": pd.DataFrame(history),
+        "calibrated_parameters.csv": df_parameters,
+        "calibration_series.csv": df_series,
+    }
@@ -0,0 +1,233 @@
+"""
+Rainfall ensemble controller for drought proofing tool
+
+This module contains functions for running the model over many rainfall realizations:
+- Rain-independent stages prepared once and shared by every member
+- Member rainfall injected in memory into the daily and monthly frames
+- Synthetic members from the fitted stochastic weather generator, with member temperatures driving reference ET
+- Member batches stepped together as day x member arrays through runoff, soil moisture and fallow recharge
+- Batches run sequentially or across worker processes
+- Percentile bands of recharge, GW extraction, CWR met and yields
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Runs N rainfall realizations (block-bootstrapped years, member files or weather generator members) through the rainfall-driven stages and reports percentile bands
+# ========================================
+
+import io
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from shared.data_readers import get_file_paths
+from shared.model_calendar import get_year_end_dates
+from shared.rainfall_ensemble import (DEFAULT_PERCENTILES, bootstrap_rainfall_members, read_rainfall_members,
+                                      calc_last_5_days_rain, calc_member_monthly_rain, build_band_frame)
+from shared.weather_generator import DEFAULT_WET_THRESHOLD, fit_weather_generator, generate_weather_members
+from soil_storage_bucket.outflux.evapotranspiration import get_monthly_radiation, calc_hargreaves_etom, update_reference_et
+from shared.run_context import activate_run_context
+from shared.model_state import create_model_state, pack_columns, get_state_var, get_label_matrix
+from shared.utilities import assign_columns
+from shared.dtype_schema import apply_dtype_schema
+from surface_water_bucket.processing.moisture_conditions import calc_amc_cond
+from surface_water_bucket.processing.runoff_calculations import calc_runoff_arrays
+from soil_storage_bucket.processing.soil_moisture_deficit import SMDI_INPUT_VARS, calc_smdi_series, write_smdi_outputs
+from aquifer_storage_bucket.influx.recharge_calculations import set_fallow_evaporation, calc_fallow_smd_series
+from orchestrator.main_controller import (prepare_rain_independent_stages, create_scenario_context,
+                                          prepare_curve_number_stage, get_runoff_fixed_values,
+                                          complete_supply_independent_stages, run_storage_stages)
+
+
+# Monthly water balance columns and yearly crop column templates summarised across members
+ENSEMBLE_MONTHLY_COLUMNS = ["Final_Recharge", "GW_extracted"]
+ENSEMBLE_YEARLY_TEMPLATES = ["%Irr_CWR_met_{crop}", "%Rainfed_CWR_met_{crop}", "Avg_yield_{crop}"]
+ENSEMBLE_YEARLY_COLUMNS = ["Irrigated_Yield_Avg", "Rainfed_Yield_Avg", "Drought Proofing"]
+
+# Members stepped together per batch; larger batches share the daily loop more widely but hold more memory
+ENSEMBLE_BATCH_SIZE = 32
+
+# Prepared stages held by each worker process
+_worker_stages = {}
+
+
+# ensemble_controller.py - Function 001: Returns prepared stages with one member's rainfall in place of the record
+# Interactions: None
+def apply_member_rainfall(static_stages, pi, last_5_days_rain, monthly_rain):
+    member_stages = dict(static_stages)
+    df_dd = static_stages["df_dd"].copy()
+    df_mm = static_stages["df_mm"].copy()
+    # Keep each column's dtype so members run exactly like the recorded series
+    df_dd["Pi"] = pi.astype(df_dd["Pi"].dtype)
+    df_dd["last_5_days_Rain"] = last_5_days_rain.astype(df_dd["last_5_days_Rain"].dtype)
+    df_mm["Rain"] = monthly_rain.astype(df_mm["Rain"].dtype)
+    member_stages["df_dd"] = df_dd
+    member_stages["df_mm"] = df_mm
+    return member_stages
+
+
+# ensemble_controller.py - Function 001A: Puts one member's monthly temperatures and reference ET into its stages
+# Interactions: soil_storage_bucket.outflux.evapotranspiration.update_reference_et
+def apply_member_temperature(member_stages, etom, tmin, tmax, tmean):
+    # Member frames are already private copies, so they are updated in place
+    df_dd, df_mm = member_stages["df_dd"], member_stages["df_mm"]
+    for col, values in (("Tmin", tmin), ("Tmax", tmax), ("Tmean", tmean)):
+        df_mm[col] = values.astype(df_mm[col].dtype)
+    member_stages["df_dd"], member_stages["df_mm"] = update_reference_et(
+        df_dd, df_mm, member_stages["df_crop"], etom, member_stages["all_crops"], member_stages["all_plots"],
+        member_stages["model_calendar"])
+    return member_stages
+
+
+# ensemble_controller.py - Function 002: Extracts the summarised metrics from one member's outputs
+# Interactions: numpy
+def collect_member_metrics(outputs, all_crops):
+    df_mm, df_yr = outputs["df_mm.csv"], outputs["df_yr.csv"]
+    metrics = {col: df_mm[col].to_numpy(dtype=np.float64) for col in ENSEMBLE_MONTHLY_COLUMNS}
+    for template in ENSEMBLE_YEARLY_TEMPLATES:
+        for crop in all_crops:
+            col = template.format(crop=crop)
+            metrics[col] = df_yr[col].to_numpy(dtype=np.float64)
+    for col in ENSEMBLE_YEARLY_COLUMNS:
+        metrics[col] = df_yr[col].to_numpy(dtype=np.float64)
+    return metrics
+
+
+# ensemble_controller.py - Function 003: Runs a batch of members through the rainfall-driven stages as member arrays and returns each member's metrics
+# Interactions: apply_member_rainfall, apply_member_temperature, collect_member_metrics, surface_water_bucket.processing.moisture_conditions.calc_amc_cond, surface_water_bucket.processing.runoff_calculations.calc_runoff_arrays, soil_storage_bucket.processing.soil_moisture_deficit, aquifer_storage_bucket.influx.recharge_calculations, orchestrator.main_controller, shared.model_state, shared.utilities.assign_columns, shared.dtype_schema.apply_dtype_schema, shared.run_context.activate_run_context, numpy, contextlib, io
+def run_member_batch(static_stages, df_crop_cn, pi, last_5_days_rain, monthly_rain, temperatures=None):
+    constants = static_stages["context"]["constants"]
+    all_plots = static_stages["all_plots"]
+    temperatures = [None] * len(pi) if temperatures is None else temperatures
+    # Stage progress messages are silenced per batch to keep the ensemble log readable
+    with activate_run_context(static_stages["context"]), contextlib.redirect_stdout(io.StringIO()):
+        member_stages = []
+        for m in range(len(pi)):
+            stages = apply_member_rainfall(static_stages, pi[m], last_5_days_rain[m], monthly_rain[m])
+            if temperatures[m] is not None:
+                stages = apply_member_temperature(stages, *temperatures[m])
+            stages["df_dd"] = set_fallow_evaporation(stages["df_dd"])
+            member_stages.append(stages)
+
+        # Daily series are stacked as days x members from the member frames, so they keep the frames' precision
+        def stack_members(col):
+            return np.column_stack([stages["df_dd"][col].to_numpy(dtype=np.float64) for stages in member_stages])
+
+        # Curve numbers do not follow the rainfall, so only the AMC and the runoff are evaluated per member
+        amc = calc_amc_cond({"last_5_days_Rain": stack_members("last_5_days_Rain")},
+                            {"Dormant": df_crop_cn["Dormant"].to_numpy()[:, np.newaxis]})
+        curve_numbers = {"AMC": amc, **{col: df_crop_cn[col].to_numpy()[:, np.newaxis]
+                                        for col in ["Final_CN1", "Final_CN2", "Final_CN3"]}}
+        runoff = calc_runoff_arrays(stack_members("Pi"), curve_numbers, get_runoff_fixed_values(constants))
+
+        # Plot deficits and the fallow deficit are stepped for every member of the batch in one daily loop
+        state = create_model_state(len(df_crop_cn), plots=all_plots, plot_vars=SMDI_INPUT_VARS)
+        pack_columns(state, df_crop_cn, "plot", ["Kei", "REWi", "TEWi", "Final_Evap_Red", "Kci", "RAWi", "TAWi"])
+        crop_inputs = [get_state_var(state, "plot", var)[..., np.newaxis] for var in SMDI_INPUT_VARS[:7]]
+        esi, etci = (np.stack([get_label_matrix(stages["df_dd"], var, all_plots, dtype=np.float64)
+                               for stages in member_stages], axis=-1) for var in ["ESi", "ETci"])
+        smdi_outputs = calc_smdi_series(*crop_inputs, esi, etci, runoff["Pei"][:, np.newaxis, :], constants["SMDi_1"])
+        fallow = calc_fallow_smd_series(stack_members("Ke_Fallow"), stack_members("ESi_Fallow"), runoff["Pei"],
+                                        df_crop_cn["REWi"].to_numpy(dtype=np.float64),
+                                        df_crop_cn["TEWi"].to_numpy(dtype=np.float64), constants["SMDi_1"])
+
+        # Frames are rebuilt per member only for the monthly aggregation, storage and yearly stages
+        member_results = []
+        for m, stages in enumerate(member_stages):
+            df_dd = assign_columns(stages["df_dd"], {col: values[:, m] for col, values in runoff.items()})
+            df_crop = df_crop_cn.copy()
+            df_crop["AMC"] = amc[:, m]
+            df_crop = write_smdi_outputs(df_crop, df_dd, {var: values[..., m] for var, values in smdi_outputs.items()},
+                                         static_stages["valid_crops_df"], all_plots)
+            balance_stages = complete_supply_independent_stages(stages, df_dd, stages["df_mm"], df_crop,
+                                                                 static_stages["df_cc"].copy(),
+                                                                 {var: values[:, m] for var, values in fallow.items()})
+            df_mm, _, _, df_yr = run_storage_stages(stages, balance_stages)
+            # Metrics are read at the precision a single run saves its outputs with
+            df_mm = apply_dtype_schema(df_mm, compact_scalars=True)
+            member_results.append(collect_member_metrics({"df_mm.csv": df_mm, "df_yr.csv": df_yr},
+                                                         static_stages["all_crops"]))
+    return member_results
+
+
+# ensemble_controller.py - Function 004: Stores the prepared stages in a worker process
+# Interactions: None
+def _init_worker(static_stages, df_crop_cn):
+    _worker_stages["static"] = static_stages
+    _worker_stages["df_crop_cn"] = df_crop_cn
+
+
+# ensemble_controller.py - Function 005: Runs one batch of members inside a worker process
+# Interactions: run_member_batch
+def _run_worker_batch(pi, last_5_days_rain, monthly_rain, temperatures=None):
+    return run_member_batch(_worker_stages["static"], _worker_stages["df_crop_cn"], pi, last_5_days_rain,
+                            monthly_rain, temperatures)
+
+
+# ensemble_controller.py - Function 006: Runs a rainfall ensemble and returns percentile band tables
+# Interactions: shared.data_readers.get_file_paths, orchestrator.main_controller.create_scenario_context, orchestrator.main_controller.prepare_rain_independent_stages, shared.run_context.activate_run_context, shared.rainfall_ensemble, shared.weather_generator, soil_storage_bucket.outflux.evapotranspiration, shared.model_calendar.get_year_end_dates, orchestrator.main_controller.prepare_curve_number_stage, run_member_batch, _init_worker, _run_worker_batch, concurrent.futures, numpy, contextlib, io
+def run_rainfall_ensemble(inp_source, master_path, context=None, scenario_num=0, n_members=100, block_years=1,
+                          seed=None, member_files=None, percentiles=None, workers=1, weather_generator=False,
+                          wet_threshold=DEFAULT_WET_THRESHOLD, batch_size=ENSEMBLE_BATCH_SIZE):
+    print("FUNCTION 32: run_rainfall_ensemble() - Running rainfall ensemble")
+    if member_files and weather_generator:
+        raise ValueError("Choose either rainfall member files or the weather generator, not both")
+    percentiles = DEFAULT_PERCENTILES if percentiles is None else list(percentiles)
+    if context is None:
+        context = create_scenario_context(inp_source, master_path, scenario_num)
+    with activate_run_context(context):
+        file_paths = get_file_paths(inp_source, master_path)
+        static_stages = prepare_rain_independent_stages(inp_source, master_path, file_paths, context, scenario_num)
+    model_calendar = static_stages["model_calendar"]
+    temperatures = None
+
+    if member_files:
+        rainfall = read_rainfall_members(member_files, model_calendar)
+    elif weather_generator:
+        # The generator is fitted to the recorded pcp.csv and temp.csv series already held by the prepared frames
+        df_dd, df_mm = static_stages["df_dd"], static_stages["df_mm"]
+        generator = fit_weather_generator(model_calendar, df_dd["Pi"].to_numpy(), df_mm["Tmin"].to_numpy(),
+                                          df_mm["Tmax"].to_numpy(), wet_threshold)
+        weather = generate_weather_members(generator, model_calendar, n_members, seed)
+        rainfall = weather["rainfall"]
+        radiation = get_monthly_radiation(file_paths, static_stages["inp_var"]["latitude"], model_calendar)
+        etom = calc_hargreaves_etom(radiation, weather["Tmin"], weather["Tmax"], weather["Tmean"],
+                                    model_calendar["months"]["days"])
+        temperatures = list(zip(etom, weather["Tmin"], weather["Tmax"], weather["Tmean"]))
+    else:
+        rainfall = bootstrap_rainfall_members(model_calendar, static_stages["df_dd"]["Pi"].to_numpy(),
+                                              n_members, block_years, seed)
+    # Antecedent and monthly rain are derived for all members in one pass
+    last_5_days_rain = calc_last_5_days_rain(rainfall)
+    monthly_rain = calc_member_monthly_rain(model_calendar, rainfall)
+    if temperatures is None:
+        temperatures = [None] * len(rainfall)
+    print(f"Running {len(rainfall)} rainfall members")
+
+    # Members run in batches: each batch steps its members together as arrays through the daily stages
+    batches = [slice(start, start + batch_size) for start in range(0, len(rainfall), max(int(batch_size), 1))]
+    batch_args = ([rainfall[batch] for batch in batches], [last_5_days_rain[batch] for batch in batches],
+                  [monthly_rain[batch] for batch in batches], [temperatures[batch] for batch in batches])
+    with activate_run_context(context), contextlib.redirect_stdout(io.StringIO()):
+        df_crop_cn = prepare_curve_number_stage(static_stages)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(static_stages, df_crop_cn)) as executor:
+            batch_results = list(executor.map(_run_worker_batch, *batch_args))
+    else:
+        batch_results = [run_member_batch(static_stages, df_crop_cn, *args) for args in zip(*batch_args)]
+    member_results = [result for results in batch_results for result in results]
+
+    # Stack each metric as members x periods before taking the bands
+    member_metrics = {metric: np.vstack([result[metric] for result in member_results])
+                      for metric in member_results[0]} if member_results else {}
+    monthly_metrics = {k: v for k, v in member_metrics.items() if k in ENSEMBLE_MONTHLY_COLUMNS}
+    yearly_metrics = {k: v for k, v in member_metrics.items() if k not in ENSEMBLE_MONTHLY_COLUMNS}
+    band_tables = {
+        "ensemble_monthly_bands.csv": build_band_frame(model_calendar["months"]["dates"], monthly_metrics,
+                                                       percentiles),
+        "ensemble_yearly_bands.csv": build_band_frame(get_year_end_dates(model_calendar), yearly_metrics,
+                                                      percentiles),
+    }
+    return band_tables
+
@@ -14,11 +14,17 @@ from shared.input_utilities import (
     get_demand_side_interv_values, get_soil_moisture_interv_area_values,
     get_soil_moisture_interv_values
 )
+from shared.run_context import get_run_input, store_run_input
 
 
 # input_collector.py - Function 001: Collects and organizes all input variables into ordered dictionary
-# Interactions: shared.input_utilities.get_kei_value, shared.input_utilities.get_variable_value, shared.input_utilities.get_crops_variable_values
+# Interactions: shared.input_utilities.get_kei_value, shared.input_utilities.get_variable_value, shared.input_utilities.get_crops_variable_values, shared.run_context
 def collect_inp_variables(inp_source,master_path):
+    # Inputs are collected once per run and reused by every later stage
+    context_key = ("inp_var", inp_source, master_path)
+    cached = get_run_input(context_key)
+    if cached is not None:
+        return cached
     variables_list = [
         # (index, "variable_name", function_call)
         (1, "kei", lambda: get_kei_value(get_variable_value(inp_source,master_path,"climate", 1))),
@@ -91,12 +97,16 @@ def collect_inp_variables(inp_source,master_path):
     variables_dict = {}
     for index, var_name, func in variables_list:
         variables_dict[var_name] = func()
-    return variables_dict
+    return store_run_input(context_key, variables_dict)
 
 
 # input_collector.py - Function 002: Collects and organizes all intervention variables into ordered dictionary
-# Interactions: shared.input_utilities.get_supply_side_int_values, shared.input_utilities.get_demand_side_interv_area_values, shared.input_utilities.get_demand_side_interv_values, shared.input_utilities.get_soil_moisture_interv_area_values, shared.input_utilities.get_soil_moisture_interv_values
+# Interactions: shared.input_utilities.get_supply_side_int_values, shared.input_utilities.get_demand_side_interv_area_values, shared.input_utilities.get_demand_side_interv_values, shared.input_utilities.get_soil_moisture_interv_area_values, shared.input_utilities.get_soil_moisture_interv_values, shared.run_context
 def collect_int_variables(inp_source,master_path, scenario_num=0):
+    context_key = ("int_var", inp_source, master_path, scenario_num)
+    cached = get_run_input(context_key)
+    if cached is not None:
+        return cached
     variables_list = [
         (0, "Time_Period", lambda: get_supply_side_int_values(inp_source,master_path,"Time_Period", 0, scenario_num)),
         (1, "Interest_Rate", lambda: get_supply_side_int_values(inp_source,master_path,"Interest_Rate", 1, scenario_num)),
@@ -238,4 +248,4 @@ def collect_int_variables(inp_source,master_path, scenario_num=0):
     for index, var_name, func in variables_list:
         variables_dict[var_name] = func()
 
-    return variables_dict
\ No newline at end of file
+    return store_run_input(context_key, variables_dict)
\ No newline at end of file
@@ -0,0 +1,257 @@
+"""
+Intervention sizing optimizer for drought proofing tool
+
+This module contains functions for searching intervention sizes against cost and drought objectives:
+- Candidate sizes sampled over bounds (Latin hypercube) or laid out on a grid
+- Prepared stages shared by every candidate with the same demand-side interventions
+- Each candidate run through the recharge structure, storage and yearly stages only
+- Portfolio NPV and capital cost of all candidates in one batched economics call
+- Budget constraint and the Pareto front of the feasible candidates
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Searches recharge structure sizes and demand-side areas for the best trade-off between intervention cost and drought proofing, reusing cached invariant stages so thousands of candidates run in minutes
+# ========================================
+
+import io
+import time
+import itertools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from shared.utilities import to_float
+from shared.run_context import activate_run_context
+from shared.economics import (get_supplyside_int_data, get_demandside_int_data, get_soil_moistureside_int_data,
+                              create_intervention_data, calc_economics_arrays)
+from orchestrator.input_collector import collect_int_variables
+from orchestrator.main_controller import run_storage_stages
+from orchestrator.model_service import (ECONOMIC_SUFFIXES, is_supply_side_intervention, get_stage_cache_key,
+                                        create_query_context, get_prepared_stages, create_model_service)
+
+
+# Objectives as metric -> "min" or "max"
+DEFAULT_OBJECTIVES = {"NPV": "min", "Drought Proofing": "max"}
+# Portfolio economics totals available as objectives and budget metrics
+ECONOMIC_METRICS = ["Total Capital Cost", "Equalized Annual Cost", "Maintenance Cost", "NPV"]
+
+# Prepared stages held by each worker process
+_worker_stages = {}
+
+
+# intervention_optimizer.py - Function 001: Samples candidate sizes over bounds with a Latin hypercube
+# Interactions: numpy
+def sample_sizing_candidates(bounds, n_candidates, seed=None):
+    rng = np.random.default_rng(seed)
+    candidates = [{} for _ in range(int(n_candidates))]
+    for name, (low, high) in bounds.items():
+        if high < low:
+            raise ValueError(f"Upper bound of '{name}' is below its lower bound")
+        # One sample per stratum, with the strata shuffled independently for every variable
+        strata = (rng.permutation(len(candidates)) + rng.random(len(candidates))) / max(len(candidates), 1)
+        values = low + strata * (high - low)
+        # Counts of structures are whole numbers
+        if name.endswith("_Nos"):
+            values = np.round(values)
+        for candidate, value in zip(candidates, values):
+            candidate[name] = float(value)
+    return candidates
+
+
+# intervention_optimizer.py - Function 001A: Checks that every bounded structure volume has a non-zero depth to size it with
+# Interactions: shared.utilities.to_float
+def check_structure_depths(bounds, interventions):
+    for name, (low, high) in bounds.items():
+        depth_name = f"{name[:-len('_Vol')]}_Depth"
+        if not name.endswith("_Vol") or depth_name not in interventions:
+            continue
+        # A bounded depth is sampled with the volume; otherwise the scenario's configured depth is used
+        depth = bounds[depth_name][0] if depth_name in bounds else to_float(interventions[depth_name], 0)
+        if high > 0 and depth <= 0:
+            raise ValueError(f"'{name}' is bounded up to {high} but '{depth_name}' is {depth} in this scenario; "
+                             f"set a depth above zero or bound '{depth_name}' as well")
+
+
+# intervention_optimizer.py - Function 002: Lays out every combination of variable levels, optionally crossed with given candidates
+# Interactions: itertools
+def build_candidate_grid(levels, candidates=None):
+    names = list(levels)
+    grid = [dict(zip(names, combination)) for combination in itertools.product(*(levels[name] for name in names))]
+    if candidates is None:
+        return grid
+    return [{**point, **candidate} for point in grid for candidate in candidates]
+
+
+# intervention_optimizer.py - Function 003: Calculates portfolio economics totals of a group of candidates in one batch
+# Interactions: shared.economics, shared.utilities.to_float, numpy, pandas
+def calc_candidate_economics(static_stages, balance_stages, candidates):
+    int_var = static_stages["int_var"]
+    inp_source, master_path = static_stages["inp_source"], static_stages["master_path"]
+    scenario_num = static_stages["scenario_num"]
+    economic_list = [float(int_var["Interest_Rate"]), float(int_var["Time_Period"])]
+    df_cc = balance_stages["df_cc"]
+    combined_intervention_data = create_intervention_data(
+        get_supplyside_int_data(economic_list, inp_source, master_path, scenario_num, int_var),
+        get_demandside_int_data(df_cc, economic_list, inp_source, master_path, scenario_num, int_var),
+        get_soil_moistureside_int_data(df_cc, economic_list, inp_source, master_path, scenario_num, int_var))
+    df_int = pd.DataFrame(combined_intervention_data)
+    df_int = df_int.map(lambda x: np.nan if isinstance(x, list) and len(x) == 0 else x)
+
+    # Each candidate is a portfolio: the group's volumes with its own structure volumes and well count in place
+    portfolios = np.tile(df_int["Volume (Cu.m)/Area"].to_numpy(dtype=np.float64), (len(candidates), 1))
+    supply_rows = {f"{intervention}_Vol": row for row, intervention in enumerate(
+        ["Farm_Pond", "Farm_Pond_Lined", "Check_Dam", "Infiltration_Pond", "Injection_Wells"])}
+    for i, candidate in enumerate(candidates):
+        for name, row in supply_rows.items():
+            if name in candidate:
+                portfolios[i, row] = to_float(candidate[name], 0)
+        # Injection_Wells_Vol is the volume of one well, so the portfolio pays for every well the candidate adds
+        portfolios[i, supply_rows["Injection_Wells_Vol"]] *= to_float(
+            candidate.get("Injection_Wells_Nos", int_var["Injection_Wells_Nos"]), 0)
+    economics = calc_economics_arrays(
+        portfolios, df_int["Cost (Rs/Cu.m)"], df_int["Life Span (years)"], df_int["Maintenance (%)"],
+        [economic_list[0]], [economic_list[1]], num_units=df_int["Number of Units"]
+    )
+    # Interventions without costs are NaN and left out of the totals
+    return {metric: np.nansum(economics[metric][:, 0, 0, :], axis=1) for metric in ECONOMIC_METRICS}
+
+
+# intervention_optimizer.py - Function 004: Runs one candidate through the storage stages and averages its model metrics
+# Interactions: orchestrator.main_controller.run_storage_stages, shared.run_context.activate_run_context, numpy, contextlib, io
+def evaluate_candidate(static_stages, balance_stages, candidate, metric_names):
+    candidate_stages = dict(static_stages, int_var={**static_stages["int_var"], **candidate})
+    # Stage progress messages are silenced per candidate to keep the search log readable
+    try:
+        with activate_run_context(static_stages["context"]), contextlib.redirect_stdout(io.StringIO()):
+            df_mm, _, _, df_yr = run_storage_stages(candidate_stages, balance_stages)
+    except Exception as e:
+        # A candidate the model cannot run is recorded with its error instead of ending the search
+        return {"Error": f"{type(e).__name__}: {e}"}
+    metrics = {}
+    for name in metric_names:
+        if name in df_yr.columns:
+            metrics[name] = float(np.nanmean(df_yr[name].to_numpy(dtype=np.float64)))
+        elif name in df_mm.columns:
+            metrics[name] = float(np.nanmean(df_mm[name].to_numpy(dtype=np.float64)))
+        else:
+            raise ValueError(f"Objective '{name}' is neither an economics total nor a yearly or monthly output")
+    return metrics
+
+
+# intervention_optimizer.py - Function 005: Stores the prepared stages of one candidate group in a worker process
+# Interactions: None
+def _init_worker(static_stages, balance_stages, metric_names):
+    _worker_stages["static"] = static_stages
+    _worker_stages["balance"] = balance_stages
+    _worker_stages["metric_names"] = metric_names
+
+
+# intervention_optimizer.py - Function 006: Evaluates one candidate inside a worker process
+# Interactions: evaluate_candidate
+def _evaluate_worker_candidate(candidate):
+    return evaluate_candidate(_worker_stages["static"], _worker_stages["balance"], candidate,
+                              _worker_stages["metric_names"])
+
+
+# intervention_optimizer.py - Function 007: Marks the candidates that no other candidate dominates
+# Interactions: numpy
+def find_pareto_front(values, directions):
+    # Objectives are turned into minimisation so one comparison covers both directions
+    signs = np.array([1.0 if direction == "min" else -1.0 for direction in directions])
+    costs = np.asarray(values, dtype=np.float64) * signs
+    on_front = np.ones(len(costs), dtype=bool)
+    for i in range(len(costs)):
+        if not on_front[i]:
+            continue
+        dominated = np.all(costs[i] <= costs, axis=1) & np.any(costs[i] < costs, axis=1)
+        on_front &= ~dominated
+    return on_front
+
+
+# intervention_optimizer.py - Function 008: Searches intervention sizes and returns all candidates and the Pareto front
+# Interactions: check_structure_depths, sample_sizing_candidates, calc_candidate_economics, evaluate_candidate, find_pareto_front, _init_worker, _evaluate_worker_candidate, orchestrator.model_service, orchestrator.input_collector.collect_int_variables, shared.run_context.activate_run_context, concurrent.futures, pandas, numpy
+def optimize_interventions(master_path, bounds=None, n_candidates=200, seed=None, candidates=None, objectives=None,
+                           budget=None, budget_metric="Total Capital Cost", scenario_num=0, workers=1, service=None):
+    print("FUNCTION 34: optimize_interventions() - Searching intervention sizes")
+    objectives = dict(DEFAULT_OBJECTIVES if objectives is None else objectives)
+    if any(direction not in ("min", "max") for direction in objectives.values()):
+        raise ValueError("Objective directions must be 'min' or 'max'")
+    if candidates is None and not bounds:
+        raise ValueError("Give either bounds to sample or a list of candidates")
+    # Every sampled value of a demand-side variable would need its own prepared stages
+    for name in (bounds if candidates is None else {}):
+        if not is_supply_side_intervention(name):
+            raise ValueError(f"'{name}' is not a recharge structure variable and cannot be bounded; give its "
+                             f"levels to build_candidate_grid and pass the grid as candidates")
+    if service is None:
+        service = create_model_service(master_path, scenario_num)
+    if candidates is None:
+        check_structure_depths(bounds, service["inputs"]["interventions"])
+        candidates = sample_sizing_candidates(bounds, n_candidates, seed)
+    # Economic inputs are shared by every candidate so their costs can be batched
+    for name in set().union(*candidates):
+        if name in ("Time_Period", "Interest_Rate") or name.endswith(ECONOMIC_SUFFIXES):
+            raise ValueError(f"'{name}' is an economic input; vary it with "
+                             f"orchestrator.model_api.run_economic_sensitivity instead")
+    model_metrics = [name for name in objectives if name not in ECONOMIC_METRICS]
+
+    start = time.perf_counter()
+    # Candidates with the same demand-side interventions share one set of prepared stages
+    groups = {}
+    for index, candidate in enumerate(candidates):
+        groups.setdefault(get_stage_cache_key(candidate), []).append(index)
+    results = [None] * len(candidates)
+    for key, indices in groups.items():
+        group_candidates = [candidates[i] for i in indices]
+        context = create_query_context(service, {name: value for name, value in group_candidates[0].items()
+                                                 if not is_supply_side_intervention(name)})
+        with activate_run_context(context), contextlib.redirect_stdout(io.StringIO()):
+            static_stages, balance_stages, _ = get_prepared_stages(service, context, key)
+            static_stages = dict(static_stages, context=context,
+                                 int_var=collect_int_variables(context["inp_source"], context["master_path"],
+                                                               service["scenario_num"]))
+        supply_candidates = [{name: value for name, value in candidate.items() if is_supply_side_intervention(name)}
+                             for candidate in group_candidates]
+        economics = calc_candidate_economics(static_stages, balance_stages, supply_candidates)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(static_stages, balance_stages, model_metrics)) as executor:
+                group_metrics = list(executor.map(_evaluate_worker_candidate, supply_candidates,
+                                                  chunksize=max(1, len(supply_candidates) // (4 * workers))))
+        else:
+            group_metrics = [evaluate_candidate(static_stages, balance_stages, candidate, model_metrics)
+                             for candidate in supply_candidates]
+        for position, (index, metrics) in enumerate(zip(indices, group_metrics)):
+            results[index] = {**{metric: float(economics[metric][position]) for metric in ECONOMIC_METRICS},
+                              **metrics}
+    elapsed = time.perf_counter() - start
+    print(f"Evaluated {len(candidates)} candidates in {len(groups)} stage groups in {elapsed:.1f} s")
+
+    df_candidates = pd.DataFrame([{name: (", ".join(map(str, value)) if isinstance(value, list) else value)
+                                   for name, value in candidate.items()} for candidate in candidates])
+    df_results = pd.DataFrame(results, columns=ECONOMIC_METRICS + model_metrics + ["Error"])
+    df_results["Error"] = df_results["Error"].fillna("")
+    df_candidates = pd.concat([df_candidates, df_results], axis=1)
+    # Candidates the model could not run are never feasible
+    failed = (df_candidates["Error"] != "").to_numpy()
+    feasible = ~failed
+    if budget is not None:
+        if budget_metric not in ECONOMIC_METRICS:
+            raise ValueError(f"Budget metric must be one of {ECONOMIC_METRICS}")
+        feasible &= df_candidates[budget_metric].to_numpy() <= float(budget)
+    df_candidates["Feasible"] = feasible
+    on_front = np.zeros(len(df_candidates), dtype=bool)
+    on_front[feasible] = find_pareto_front(df_candidates.loc[feasible, list(objectives)].to_numpy(),
+                                           list(objectives.values()))
+    df_candidates["Pareto"] = on_front
+    first_objective = next(iter(objectives))
+    df_front = df_candidates[on_front].sort_values(first_objective,
+                                                   ascending=objectives[first_objective] == "min")
+    print(f"{int(feasible.sum())} candidates within budget, {int(on_front.sum())} on the Pareto front"
+          + (f"; {int(failed.sum())} candidates failed (see the Error column)" if failed.any() else ""))
+    return {
+        "optimizer_candidates.csv": df_candidates,
+        "optimizer_pareto_front.csv": df_front.reset_index(drop=True),
+    }
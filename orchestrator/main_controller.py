@@ -11,14 +11,17 @@ Main controller functions for drought proofing tool
 import os
 import sys
 import getopt
-import shutil
 import pandas as pd
-from shared import config_constants
+from concurrent.futures import ThreadPoolExecutor
+from shared.run_context import create_run_context, activate_run_context
 from orchestrator.input_collector import collect_inp_variables, collect_int_variables
 from shared.data_readers import get_file_paths, get_crop_data, get_pcp_value, process_monthly_data, get_seasons_val, get_cover_type, get_season_data, get_seasons_data, get_land_use_types
 from outputs.output_aggregator import get_resample_yr_optimized, calculate_weighted_averages, process_year_data, process_water_year_data, calc_weighted_avg
 from outputs.yield_calculations import calc_yield, calculate_yield_wyr
 from shared.utilities import convert_dtypes
+from shared.dtype_schema import apply_dtype_schema, report_frame_memory
+from shared.crop_database import build_crop_database
+from shared.model_calendar import build_model_calendar
 from shared.crop_processing import assign_plots_to_crops, select_valid_crops, attribute_names, crop_details, process_seasonal_crops, yield_columns, other_columns
 from soil_storage_bucket.outflux.evapotranspiration import calculate_daily_etoi, calc_etci_plot
 from soil_storage_bucket.input_data.soil_properties import calculate_awc_capacity, soil_calculation
@@ -38,7 +41,7 @@ from shared.economics import calculate_intervention_economics
 
 # main_controller.py - Function 001: Saves all output dataframes to CSV files in scenario-specific folders
 # Interactions: orchestrator.input_collector.collect_inp_variables, orchestrator.input_collector.collect_int_variables, pandas, os
-def save_dataframes_scenario(val_scenario, master_path, output_dictionary, inp_source):
+def save_dataframes_scenario(val_scenario, master_path, output_dictionary, inp_source, output_dir=None):
 
     # main_controller.py - Function 001.1: Saves input and intervention variables to CSV files
     # Interactions: orchestrator.input_collector.collect_inp_variables, orchestrator.input_collector.collect_int_variables, pandas, os
@@ -81,8 +84,9 @@ def save_dataframes_scenario(val_scenario, master_path, output_dictionary, inp_s
         except Exception as e:
             print(f"Error saving input and integer variables to CSV: {e}")
 
-    # Pre-compute output directory and scenario folder
-    output_dir = os.path.join(master_path, "Datasets", "Outputs")
+    # Pre-compute output directory and scenario folder; batch runs give each site its own output directory
+    if output_dir is None:
+        output_dir = os.path.join(master_path, "Datasets", "Outputs")
 
     # Create the scenario folder based on the scenario number or baseline
     if val_scenario == 0:
@@ -125,9 +129,9 @@ def save_dataframes_scenario(val_scenario, master_path, output_dictionary, inp_s
 
 # main_controller.py - Function 002: Processes yearly data and calculates weighted averages
 # Interactions: outputs.output_aggregator.get_resample_yr_optimized, outputs.yield_calculations.calc_yield, outputs.output_aggregator.calculate_weighted_averages, shared.utilities.convert_dtypes
-def process_yearly_df(df_mm, df_cc, all_crops, yield_columns, other_columns):
+def process_yearly_df(df_mm, df_cc, all_crops, yield_columns, other_columns, model_calendar):
     print("FUNCTION 28: process_yearly_df() - Processing yearly data aggregations")
-    df_yr = get_resample_yr_optimized(df_mm, all_crops)
+    df_yr = get_resample_yr_optimized(df_mm, all_crops, model_calendar)
     df_yr = calc_yield(df_cc, df_yr, all_crops)
     df_yr = calculate_weighted_averages(df_cc, df_yr, all_crops, yield_columns, other_columns)
     df_yr = convert_dtypes(df_yr)
@@ -135,7 +139,7 @@ def process_yearly_df(df_mm, df_cc, all_crops, yield_columns, other_columns):
 
 
 # main_controller.py - Function 003: Processes command line arguments and runs the scenario
-# Interactions: getopt, sys, run_dr_pf_routines, save_dataframes_scenario
+# Interactions: getopt, sys, create_scenario_context, run_dr_pf_routines, save_dataframes_scenario, shared.dtype_schema.report_frame_memory, shared.run_context.activate_run_context
 def main(argument):
     # Options
     runfile = ''
@@ -196,53 +200,86 @@ def main(argument):
         run_type = 'csv'
 
     print("processing scenario:", scenario_no)
-    final_dataframe_drpr = run_dr_pf_routines(run_type, base_path, year_type, counter)
-    saved_files = save_dataframes_scenario(scenario_no, base_path, final_dataframe_drpr, run_type)
+    context = create_scenario_context(run_type, base_path, scenario_no or 0)
+    final_dataframe_drpr = run_dr_pf_routines(run_type, base_path, year_type, context, scenario_no or 0)
+    # The memory report is printed once per command line run, not on every in-memory evaluation
+    report_frame_memory({name: final_dataframe_drpr[f"{name}.csv"] for name in ["df_dd", "df_crop", "df_mm"]})
+    with activate_run_context(context):
+        saved_files = save_dataframes_scenario(scenario_no, base_path, final_dataframe_drpr, run_type)
     print("scenario:", scenario_no, 'completed')
 
 
-# main_controller.py - Function 004: Copies scenario-specific intervention file to main interventions.csv
-# Interactions: os, shutil
-def copy_scenario_intervention_file(scenario_no, base_path):
-    csv_dir = os.path.join(base_path, 'Datasets', 'Inputs', 'csv_inputs')
-    
-    # Determine source file based on scenario number
+# main_controller.py - Function 004A: Returns file paths that read the scenario's own interventions file
+# Interactions: shared.data_readers.get_file_paths, os
+def get_scenario_file_paths(inp_source, master_path, scenario_no):
+    paths = dict(get_file_paths(inp_source, master_path))
+    if paths["input_interventions"] is None:
+        return paths
+    csv_dir = os.path.dirname(paths["input_interventions"])
     if scenario_no == 0:
         source_file = os.path.join(csv_dir, 'interventions_baseline.csv')
     else:
         source_file = os.path.join(csv_dir, f'interventions_scenario_{scenario_no}.csv')
-    
-    target_file = os.path.join(csv_dir, 'interventions.csv')
-    
-    # Check if scenario-specific file exists
+    # Reading the scenario file directly leaves interventions.csv alone, so scenarios can share a folder
     if os.path.exists(source_file):
-        shutil.copy2(source_file, target_file)
-        print(f"Using interventions from: {os.path.basename(source_file)}")
-    else:
-        print(f"Warning: {os.path.basename(source_file)} not found. Using default interventions.csv")
+        paths["input_interventions"] = source_file
+    return paths
+
+
+# main_controller.py - Function 004B: Creates the run context of one scenario
+# Interactions: get_scenario_file_paths, shared.run_context.create_run_context
+def create_scenario_context(inp_source, master_path, scenario_no=0, constants=None):
+    file_paths = get_scenario_file_paths(inp_source, master_path, scenario_no)
+    return create_run_context(inp_source, master_path, scenario_no, file_paths, constants)
+
+
+# main_controller.py - Function 004C: Parses the daily rainfall series and builds the run calendar from its dates
+# Interactions: shared.data_readers.get_pcp_value, shared.model_calendar.build_model_calendar
+def prepare_climate_stages(file_paths):
+    df_dd = get_pcp_value(file_paths["daily_data"])
+    # Calendar facts are derived once from the daily dates and shared by every stage
+    model_calendar = build_model_calendar(df_dd["Date"])
+    return {"df_dd": df_dd, "model_calendar": model_calendar}
 
 
 # main_controller.py - Function 005: Main orchestrator running all drought proofing processes
-# Interactions: orchestrator.input_collector, shared.data_readers, shared.crop_processing, soil_storage_bucket.outflux.evapotranspiration, soil_storage_bucket.input_data.soil_properties, soil_storage_bucket.processing.conservation_practices, soil_storage_bucket.processing.water_storage, shared.land_use, shared.irrigation_efficiency, aquifer_storage_bucket.processing.storage_capacity, aquifer_storage_bucket.influx.recharge_capacity, surface_water_bucket.processing.curve_numbers, surface_water_bucket.processing.runoff_calculations, soil_storage_bucket.processing.soil_moisture_deficit, aquifer_storage_bucket.influx.recharge_calculations, orchestrator.water_balance_coordinator, shared.economics, outputs.output_aggregator, outputs.yield_calculations, pandas, shared.config_constants
-def dr_prf_all_processes(inp_source,master_path,file_paths,year_type, counter, scenario_num=0):
+# Interactions: prepare_rain_independent_stages, run_rain_dependent_stages
+def dr_prf_all_processes(inp_source,master_path,file_paths,year_type, context, scenario_num=0):
     print("FUNCTION 30: dr_prf_all_processes() - Running all drought proofing processes")
+    static_stages = prepare_rain_independent_stages(inp_source, master_path, file_paths, context, scenario_num)
+    return run_rain_dependent_stages(static_stages, year_type)
+
+
+# main_controller.py - Function 005A: Runs the stages that do not depend on the daily rainfall series
+# Interactions: prepare_climate_stages, orchestrator.input_collector, shared.data_readers, shared.crop_processing, soil_storage_bucket.outflux.evapotranspiration, soil_storage_bucket.input_data.soil_properties, soil_storage_bucket.processing.conservation_practices, soil_storage_bucket.processing.water_storage, shared.land_use, surface_water_bucket.processing.curve_numbers, shared.dtype_schema, shared.crop_database, shared.model_calendar, pandas
+def prepare_rain_independent_stages(inp_source, master_path, file_paths, context, scenario_num=0):
+    # Constants and the ETc counter belong to this run's context
+    constants = context["constants"]
+    counter = context["counter"]
     inp_var = collect_inp_variables(inp_source,master_path)
     int_var = collect_int_variables(inp_source,master_path, scenario_num)
     crop_df = get_crop_data(file_paths["crop_db"])
+    # Parse the crop database once; crop stages index it by crop id
+    crop_db = build_crop_database(crop_df)
     season_data = get_season_data(inp_source,master_path)
     df_cp, num_plots = assign_plots_to_crops(season_data)
-    df_dd = get_pcp_value(file_paths["daily_data"])
-    df_mm = process_monthly_data(df_dd, file_paths,inp_source,master_path)
-    df_dd = calculate_daily_etoi(df_mm, df_dd)
+    # Sites sharing a climate series reuse its parsed daily frame and calendar from the context
+    climate_stages = context["climate_stages"] or prepare_climate_stages(file_paths)
+    df_dd = climate_stages["df_dd"].copy()
+    model_calendar = climate_stages["model_calendar"]
+    df_mm = process_monthly_data(df_dd, file_paths,inp_source,master_path, model_calendar)
+    df_dd = calculate_daily_etoi(df_mm, df_dd, model_calendar)
     df_crop = pd.DataFrame(df_dd["Date"])
     valid_crops_df = select_valid_crops(df_cp)
     all_crops = valid_crops_df["Crop"].tolist()
     all_plots = valid_crops_df["Plot"].unique().tolist()
-    df_cc = crop_details(attribute_names, all_crops, crop_df,inp_source,master_path, scenario_num)
+    df_cc = crop_details(attribute_names, all_crops, crop_db,inp_source,master_path, scenario_num)
     season = get_seasons_val(inp_source,master_path)
-    df_crop = process_seasonal_crops(df_crop, crop_df, df_cp, season)
+    df_crop = process_seasonal_crops(df_crop, crop_db, df_cp, season, model_calendar)
     df_dd, df_crop, df_mm = calc_etci_plot(df_crop, df_cc, df_cp, df_dd, df_mm, all_plots, all_crops,
-                                           num_plots, counter, inp_var["kei"], valid_crops_df, crop_df)
+                                           num_plots, counter, inp_var["kei"], valid_crops_df, crop_db,
+                                           model_calendar)
+    df_crop = apply_dtype_schema(df_crop)
     soil_output_list = soil_calculation(inp_source,master_path)
     # Calculate AWC capacity
     depth, awc, awc_capacity = calculate_awc_capacity(soil_output_list[6], soil_output_list[7], soil_output_list[8],
@@ -250,74 +287,83 @@ def dr_prf_all_processes(inp_source,master_path,file_paths,year_type, counter, s
     # Assuming df_cc is your DataFrame
     df_cc, overall_sum = calculate_soil_moisture_sums(df_cc)
     # Calculate AWC for soil
-    awc_soil_con = calculate_awc_soil(df_cc, config_constants.Cover_Crops_SM_with_practice,
-                                            config_constants.Mulching_SM_with_practice,
-                                            config_constants.BBF_SM_with_practice, config_constants.Bund_SM_with_practice,
-                                            config_constants.Tillage_SM_with_practice,
+    awc_soil_con = calculate_awc_soil(df_cc, constants["Cover_Crops_SM_with_practice"],
+                                            constants["Mulching_SM_with_practice"],
+                                            constants["BBF_SM_with_practice"], constants["Bund_SM_with_practice"],
+                                            constants["Tillage_SM_with_practice"],
                                             awc_capacity)
-    df_cc = get_cover_type(df_cc, crop_df)
+    df_cc = get_cover_type(df_cc, crop_db)
     seasons = get_seasons_data(inp_source,master_path)
     df_cc, actual_fallow_cn2, actual_cn2 = process_cn_values(seasons, df_cc, crop_df, soil_output_list,
                                                                             all_crops,inp_source,master_path)
     
     # land_use_types = get_land_use_types()
     crop_area_inp_list = list(get_land_use_types(inp_source,master_path).values())
-    cn_lulc_values_list = [config_constants.slope, actual_fallow_cn2] + [getattr(config_constants, attr) for attr in
-                                                                     ["Builtup_cn2", "WB_cn2", "Pasture_cn2",
-                                                                      "Forest_cn2"]]
     total_area = calculate_total_area(crop_area_inp_list)
-    capacity = calculate_capacity(awc_capacity, config_constants.with_out_soil_con, total_area, overall_sum, awc_soil_con)
-    soil_prop_list = [capacity, config_constants.theta_FC, config_constants.theta_WP, config_constants.Ze]
+    capacity = calculate_capacity(awc_capacity, constants["with_out_soil_con"], total_area, overall_sum, awc_soil_con)
+    soil_prop_list = [capacity, constants["theta_FC"], constants["theta_WP"], constants["Ze"]]
     
     
     df_crop = calc_crop_int(df_crop, df_cc, df_cp, valid_crops_df, all_plots, all_crops, soil_prop_list)
-
-    df_crop = calc_crop_consolidated_cn(df_dd, df_crop, actual_cn2, df_cc, all_crops, crop_area_inp_list,
-                                                       cn_lulc_values_list)
-    fixed_values = {
-        "Ia_AMC1": config_constants.Ia_AMC1,
-        "Ia_AMC2": config_constants.Ia_AMC2,
-        "Ia_AMC3": config_constants.Ia_AMC3,
-        "Soil_GWrecharge_coefficient": config_constants.Soil_GWrecharge_coefficient
+    # Everything up to here is independent of the rainfall series, so ensemble members can share it
+    static_stages = {
+        "inp_source": inp_source, "master_path": master_path, "file_paths": file_paths, "context": context,
+        "scenario_num": scenario_num, "inp_var": inp_var, "int_var": int_var, "crop_df": crop_df,
+        "crop_db": crop_db, "df_cp": df_cp, "model_calendar": model_calendar, "df_dd": df_dd, "df_mm": df_mm,
+        "df_crop": df_crop, "df_cc": df_cc, "valid_crops_df": valid_crops_df, "all_crops": all_crops,
+        "all_plots": all_plots, "actual_cn2": actual_cn2, "crop_area_inp_list": crop_area_inp_list,
+        "actual_fallow_cn2": actual_fallow_cn2, "total_area": total_area,
     }
-    fixed_values_list = list(fixed_values.values())
-    df_dd = calc_discharge(df_dd, df_crop, fixed_values_list)
-    aquifer_para_list = [inp_var["Aquifer_Depth"], inp_var["Starting_Level"], inp_var["Specific_Yield"], total_area]
-    df_mm = process_monthly_qi(df_dd, df_mm, aquifer_para_list)
-    df_crop = calc_smdi_plot(df_crop, df_dd, valid_crops_df, all_plots, config_constants.SMDi_1)
-    df_crop, df_mm, df_dd = calc_gwnr_fallow_plot(df_crop, df_mm, df_dd, all_plots, all_crops, crop_area_inp_list, df_cc)
-    area_eff_list = [
-        inp_var.get(attr) for attr in ["SW_Area", "GW_Area", "SW_Area_Irr_Eff", "GW_Area_Irr_Eff"]
-    ] + [config_constants.Eff_Default_Irrigation]
-    
-    irr_eff = calc_irr_eff(area_eff_list, crop_area_inp_list)
-    df_cc, df_mm = calc_overall_eff(df_mm, df_cc, all_crops, irr_eff)
-    storage_limit = calculate_storage_limit(aquifer_para_list)
-    surface_areas, added_recharges, added_recharge_capacity, sw_storage_capacity_created = calc_recharge_capacity(
-        int_var["Farm_Pond_Vol"], int_var["Farm_Pond_Depth"], int_var["Farm_Pond_Inf_Rate"],
-        int_var["Farm_Pond_Lined_Vol"], int_var["Farm_Pond_Lined_Depth"], int_var["Farm_Pond_Lined_Inf_Rate"],
-        int_var["Check_Dam_Vol"], int_var["Check_Dam_Depth"], int_var["Check_Dam_Inf_Rate"],
-        int_var["Infiltration_Pond_Vol"], int_var["Infiltration_Pond_Depth"], int_var["Infiltration_Pond_Inf_Rate"],
-        int_var["Injection_Wells_Vol"], int_var["Injection_Wells_Nos"]
-    )
-    
-    water_resource_list = [
-        inp_var.get(attr) for attr in [
-            "Population", "Domestic_Water_Use", "Other", "Other_Water_Use", "Groundwater_Dependent"
-        ]] + [sw_storage_capacity_created, added_recharge_capacity, storage_limit]
-    df_mm = process_water_management(df_mm, all_crops, surface_areas, added_recharges, water_resource_list,
-                                                    aquifer_para_list, file_paths["irrigation"])
-    df_mm = process_final_wb(df_mm, all_crops, df_cc, df_crop)
-    df_yr = process_yearly_df(df_mm, df_cc, all_crops, yield_columns,
-                                             other_columns)
+    return static_stages
+
+
+# main_controller.py - Function 005B: Runs the rainfall-driven stages and output aggregation on prepared inputs
+# Interactions: prepare_supply_independent_stages, run_supply_dependent_stages
+def run_rain_dependent_stages(static_stages, year_type):
+    balance_stages = prepare_supply_independent_stages(static_stages)
+    return run_supply_dependent_stages(static_stages, balance_stages, year_type)
+
+
+# main_controller.py - Function 005C: Runs the rainfall-driven runoff, soil moisture and recharge stages that do not use the supply-side interventions
+# Interactions: prepare_curve_number_stage, get_runoff_fixed_values, complete_supply_independent_stages, surface_water_bucket.processing.runoff_calculations.calc_discharge, soil_storage_bucket.processing.soil_moisture_deficit.calc_smdi_plot
+def prepare_supply_independent_stages(static_stages):
+    constants = static_stages["context"]["constants"]
+    # Stages add columns in place, so each run works on its own copies of the prepared frames
+    df_dd = static_stages["df_dd"].copy()
+    df_mm = static_stages["df_mm"].copy()
+    df_crop = prepare_curve_number_stage(static_stages)
+    df_cc = static_stages["df_cc"].copy()
+
+    df_dd = calc_discharge(df_dd, df_crop, get_runoff_fixed_values(constants))
+    df_crop = calc_smdi_plot(df_crop, df_dd, static_stages["valid_crops_df"], static_stages["all_plots"],
+                             constants["SMDi_1"])
+    return complete_supply_independent_stages(static_stages, df_dd, df_mm, df_crop, df_cc)
+
+
+# main_controller.py - Function 005D: Runs the supply-side storage, water balance, economics and output aggregation stages
+# Interactions: run_storage_stages, shared.economics, outputs.output_aggregator, outputs.yield_calculations, shared.dtype_schema
+def run_supply_dependent_stages(static_stages, balance_stages, year_type):
+    inp_source = static_stages["inp_source"]
+    master_path = static_stages["master_path"]
+    scenario_num = static_stages["scenario_num"]
+    int_var = static_stages["int_var"]
+    df_cp = static_stages["df_cp"]
+    model_calendar = static_stages["model_calendar"]
+    all_crops = static_stages["all_crops"]
+    df_dd = balance_stages["df_dd"].copy()
+    df_mm, df_crop, df_cc, df_yr = run_storage_stages(static_stages, balance_stages)
     economic_list = [float(int_var["Interest_Rate"]), float(int_var["Time_Period"])]
     df_int = calculate_intervention_economics(economic_list, df_cc,inp_source,master_path, scenario_num)
-    df_crop_yr, df_wb_yr, df_wb_mm = process_water_year_data(df_mm, df_cp, all_crops, year_type)
+    df_crop_yr, df_wb_yr, df_wb_mm = process_water_year_data(df_mm, df_cp, all_crops, model_calendar, year_type)
     df_crop_yr = calculate_yield_wyr(df_cc, df_crop_yr, all_crops)
     df_crop_yr = calc_weighted_avg(df_cc, df_crop_yr, all_crops, yield_columns,
                                       other_columns)
     df_cwr, df_cwr_met, df_yield, df_drought = process_year_data(df_yr, df_crop_yr, all_crops, year_type)
 # Removed from here - moved to proper location in calc_gwnr_fallow_plot
+    # Output boundary: constant columns are kept as scalars from here on
+    df_dd = apply_dtype_schema(df_dd, compact_scalars=True)
+    df_crop = apply_dtype_schema(df_crop, compact_scalars=True)
+    df_mm = apply_dtype_schema(df_mm, compact_scalars=True)
     output_dictionary = {
         "df_dd.csv": df_dd,
         "df_mm.csv": df_mm,
@@ -332,14 +378,116 @@ def dr_prf_all_processes(inp_source,master_path,file_paths,year_type, counter, s
         "df_int.csv": df_int,
         "df_wb_yr_output.csv": df_wb_yr
     }
-    
     return output_dictionary
 
 
+# main_controller.py - Function 005E: Runs the recharge structure, storage, final water balance and yearly stages
+# Interactions: aquifer_storage_bucket.influx.recharge_capacity, orchestrator.water_balance_coordinator, process_yearly_df
+def run_storage_stages(static_stages, balance_stages):
+    inp_var = static_stages["inp_var"]
+    int_var = static_stages["int_var"]
+    file_paths = static_stages["file_paths"]
+    model_calendar = static_stages["model_calendar"]
+    all_crops = static_stages["all_crops"]
+    aquifer_para_list = balance_stages["aquifer_para_list"]
+    storage_limit = balance_stages["storage_limit"]
+    # Later stages add columns in place, so each run works on its own copies of the balance frames
+    df_mm = balance_stages["df_mm"].copy()
+    df_crop = balance_stages["df_crop"].copy()
+    df_cc = balance_stages["df_cc"].copy()
+    surface_areas, added_recharges, added_recharge_capacity, sw_storage_capacity_created = calc_recharge_capacity(
+        int_var["Farm_Pond_Vol"], int_var["Farm_Pond_Depth"], int_var["Farm_Pond_Inf_Rate"],
+        int_var["Farm_Pond_Lined_Vol"], int_var["Farm_Pond_Lined_Depth"], int_var["Farm_Pond_Lined_Inf_Rate"],
+        int_var["Check_Dam_Vol"], int_var["Check_Dam_Depth"], int_var["Check_Dam_Inf_Rate"],
+        int_var["Infiltration_Pond_Vol"], int_var["Infiltration_Pond_Depth"], int_var["Infiltration_Pond_Inf_Rate"],
+        int_var["Injection_Wells_Vol"], int_var["Injection_Wells_Nos"]
+    )
+    
+    water_resource_list = [
+        inp_var.get(attr) for attr in [
+            "Population", "Domestic_Water_Use", "Other", "Other_Water_Use", "Groundwater_Dependent"
+        ]] + [sw_storage_capacity_created, added_recharge_capacity, storage_limit]
+    df_mm = process_water_management(df_mm, all_crops, surface_areas, added_recharges, water_resource_list,
+                                                    aquifer_para_list, file_paths["irrigation"], model_calendar)
+    df_mm = process_final_wb(df_mm, all_crops, df_cc, df_crop)
+    df_yr = process_yearly_df(df_mm, df_cc, all_crops, yield_columns,
+                                             other_columns, model_calendar)
+    return df_mm, df_crop, df_cc, df_yr
+
+
+# main_controller.py - Function 005F: Adds the land use and crop curve numbers and the AMC of the recorded rainfall to df_crop
+# Interactions: surface_water_bucket.processing.curve_numbers.calc_crop_consolidated_cn, shared.dtype_schema.apply_dtype_schema
+def prepare_curve_number_stage(static_stages):
+    constants = static_stages["context"]["constants"]
+    # Land use CN2 values are constants, so they are read here where the curve numbers are first used
+    cn_lulc_values_list = [constants["slope"], static_stages["actual_fallow_cn2"]] + [constants[attr] for attr in
+                                                                                      ["Builtup_cn2", "WB_cn2",
+                                                                                       "Pasture_cn2", "Forest_cn2"]]
+    # Only the AMC column follows the rainfall, so ensembles compute this stage once and redo the AMC per member
+    df_crop = calc_crop_consolidated_cn(static_stages["df_dd"], static_stages["df_crop"].copy(),
+                                        static_stages["actual_cn2"], static_stages["df_cc"].copy(),
+                                        static_stages["all_crops"], static_stages["crop_area_inp_list"],
+                                        cn_lulc_values_list)
+    return apply_dtype_schema(df_crop)
+
+
+# main_controller.py - Function 005G: Returns the initial abstraction ratios and soil recharge coefficient of the runoff stage
+# Interactions: None
+def get_runoff_fixed_values(constants):
+    return [constants[attr] for attr in ["Ia_AMC1", "Ia_AMC2", "Ia_AMC3", "Soil_GWrecharge_coefficient"]]
+
+
+# main_controller.py - Function 005H: Runs the monthly runoff, fallow recharge and irrigation efficiency stages on one run's daily results
+# Interactions: surface_water_bucket.processing.runoff_calculations.process_monthly_qi, aquifer_storage_bucket.influx.recharge_calculations.calc_gwnr_fallow_plot, shared.irrigation_efficiency, aquifer_storage_bucket.processing.storage_capacity, shared.dtype_schema
+def complete_supply_independent_stages(static_stages, df_dd, df_mm, df_crop, df_cc, fallow=None):
+    inp_var = static_stages["inp_var"]
+    model_calendar = static_stages["model_calendar"]
+    all_crops = static_stages["all_crops"]
+    crop_area_inp_list = static_stages["crop_area_inp_list"]
+    constants = static_stages["context"]["constants"]
+    aquifer_para_list = [inp_var["Aquifer_Depth"], inp_var["Starting_Level"], inp_var["Specific_Yield"],
+                         static_stages["total_area"]]
+    df_mm = process_monthly_qi(df_dd, df_mm, aquifer_para_list, model_calendar)
+    df_crop = apply_dtype_schema(df_crop)
+    df_crop, df_mm, df_dd = calc_gwnr_fallow_plot(df_crop, df_mm, df_dd, static_stages["all_plots"], all_crops,
+                                                  crop_area_inp_list, df_cc, model_calendar, fallow)
+    df_dd = apply_dtype_schema(df_dd)
+    area_eff_list = [
+        inp_var.get(attr) for attr in ["SW_Area", "GW_Area", "SW_Area_Irr_Eff", "GW_Area_Irr_Eff"]
+    ] + [constants["Eff_Default_Irrigation"]]
+    
+    irr_eff = calc_irr_eff(area_eff_list, crop_area_inp_list)
+    df_cc, df_mm = calc_overall_eff(df_mm, df_cc, all_crops, irr_eff)
+    storage_limit = calculate_storage_limit(aquifer_para_list)
+    # Supply-side interventions only enter after this point, so these frames can be reused across them
+    balance_stages = {
+        "df_dd": df_dd, "df_mm": df_mm, "df_crop": df_crop, "df_cc": df_cc,
+        "aquifer_para_list": aquifer_para_list, "storage_limit": storage_limit,
+    }
+    return balance_stages
+
+
 # main_controller.py - Function 006: Entry point for drought proofing routines
-# Interactions: shared.data_readers.get_file_paths, dr_prf_all_processes
-def run_dr_pf_routines(inp_source, master_path, year_type, counter, scenario_num=0):
+# Interactions: create_scenario_context, shared.run_context.activate_run_context, shared.data_readers.get_file_paths, dr_prf_all_processes
+def run_dr_pf_routines(inp_source, master_path, year_type, context=None, scenario_num=0):
     print("FUNCTION 31: run_dr_pf_routines() - Starting main drought proofing routines")
-    file_paths = get_file_paths(inp_source, master_path)
-    consolidated_dataframes = dr_prf_all_processes(inp_source, master_path, file_paths, year_type, counter, scenario_num)
-    return consolidated_dataframes
\ No newline at end of file
+    if context is None:
+        context = create_scenario_context(inp_source, master_path, scenario_num)
+    # Every stage of this run reads its constants, inputs and caches from the active context
+    with activate_run_context(context):
+        file_paths = get_file_paths(inp_source, master_path)
+        consolidated_dataframes = dr_prf_all_processes(inp_source, master_path, file_paths, year_type, context,
+                                                       scenario_num)
+    return consolidated_dataframes
+
+
+# main_controller.py - Function 007: Runs several scenarios concurrently in a thread pool, one run context each
+# Interactions: create_scenario_context, run_dr_pf_routines, concurrent.futures
+def run_scenarios_in_threads(inp_source, master_path, year_type, scenario_nums, workers=4, constants=None):
+    contexts = {scenario: create_scenario_context(inp_source, master_path, scenario, constants)
+                for scenario in scenario_nums}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {scenario: executor.submit(run_dr_pf_routines, inp_source, master_path, year_type,
+                                             contexts[scenario], scenario)
+                   for scenario in scenario_nums}
+        return {scenario: future.result() for scenario, future in futures.items()}
\ No newline at end of file
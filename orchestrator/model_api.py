@@ -0,0 +1,142 @@
+"""
+In-memory model API for drought proofing tool
+
+This module contains functions for running the model as a library without touching the filesystem:
+- Baseline and intervention dictionaries converted to and from the key/value input tables
+- Daily rainfall and monthly temperature arrays converted to the climate tables
+- A one-off loader that reads a Datasets folder into an in-memory input bundle
+- A run context whose readers see the in-memory tables in place of the input files
+- Intervention economics over interest rates, time periods and volume portfolios from the same inputs
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Runs the drought proofing model on in-memory inputs and returns the output dictionary without reading or writing files
+# ========================================
+
+import numpy as np
+import pandas as pd
+from shared.run_context import create_run_context, activate_run_context
+from shared.economics import (get_supplyside_int_data, get_demandside_int_data, get_soil_moistureside_int_data,
+                              create_intervention_data, calc_economic_sensitivity)
+from orchestrator.main_controller import get_scenario_file_paths, run_dr_pf_routines, prepare_rain_independent_stages
+
+
+# Folder name standing in for master_path when inputs come from memory
+MEMORY_ROOT = "<memory>"
+# Input tables read from the Datasets folder, keyed like the file paths
+INPUT_TABLE_KEYS = ["daily_data", "monthly_data", "irrigation", "crop_db", "radiation_db"]
+# Keyword arguments each input table is read with, matching the stage readers
+INPUT_TABLE_READ_KWARGS = {"crop_db": {"header": None}}
+
+
+# model_api.py - Function 001: Builds a key/value input table (input.csv layout) from a variable dictionary
+# Interactions: pandas, numpy
+def build_input_table(values):
+    rows = [[name] + (list(value) if isinstance(value, (list, tuple)) else [value])
+            for name, value in values.items()]
+    width = max((len(row) for row in rows), default=1)
+    # Empty cells read as NaN from the CSV files, so missing values are NaN here as well
+    rows = [[np.nan if cell is None else cell for cell in row] + [np.nan] * (width - len(row)) for row in rows]
+    return pd.DataFrame(rows, dtype=object)
+
+
+# model_api.py - Function 002: Converts a key/value input table into a variable dictionary
+# Interactions: pandas
+def read_input_values(table):
+    values = {}
+    for row in table.itertuples(index=False):
+        name = row[0]
+        # The first row of a name wins, as in the input readers
+        if pd.isna(name) or name in values:
+            continue
+        cells = [None if pd.isna(cell) else cell for cell in row[1:]]
+        while cells and cells[-1] is None:
+            cells.pop()
+        values[name] = cells[0] if len(cells) == 1 else cells
+    return values
+
+
+# model_api.py - Function 003: Builds the daily rainfall and monthly temperature tables from climate arrays
+# Interactions: pandas, numpy
+def build_climate_tables(dates, rainfall, tmin, tmax, tmean=None):
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    rainfall = np.asarray(rainfall, dtype=np.float64)
+    if len(rainfall) != len(dates):
+        raise ValueError(f"Rainfall has {len(rainfall)} values but {len(dates)} dates were given")
+    months = pd.period_range(dates.min().to_period("M"), dates.max().to_period("M"), freq="M")
+    tmin = np.asarray(tmin, dtype=np.float64)
+    tmax = np.asarray(tmax, dtype=np.float64)
+    tmean = (tmin + tmax) / 2 if tmean is None else np.asarray(tmean, dtype=np.float64)
+    if not len(tmin) == len(tmax) == len(tmean) == len(months):
+        raise ValueError(f"Temperatures must cover the {len(months)} months spanned by the dates")
+
+    df_daily = pd.DataFrame({"Date": dates, "Rain(mm)": rainfall})
+    # Year labels follow temp.csv (Year0, Year1, ...) counted from the first model year
+    df_monthly = pd.DataFrame({
+        "Year": [f"Year{year - months[0].year}" for year in months.year],
+        "Month": months.month,
+        "Tmin": tmin,
+        "Tmax": tmax,
+        "Tmean": tmean,
+    })
+    return df_daily, df_monthly
+
+
+# model_api.py - Function 004: Reads a Datasets folder once into an in-memory input bundle
+# Interactions: orchestrator.main_controller.get_scenario_file_paths, read_input_values, pandas
+def load_model_inputs(master_path, scenario_num=0):
+    file_paths = get_scenario_file_paths("csv", master_path, scenario_num)
+    inputs = {key: pd.read_csv(file_paths[key], **INPUT_TABLE_READ_KWARGS.get(key, {})) for key in INPUT_TABLE_KEYS}
+    inputs["baseline"] = read_input_values(pd.read_csv(file_paths["input_baseline"], header=None))
+    inputs["interventions"] = read_input_values(pd.read_csv(file_paths["input_interventions"], header=None))
+    return inputs
+
+
+# model_api.py - Function 005: Creates a run context whose readers use the in-memory inputs
+# Interactions: build_input_table, build_climate_tables, shared.run_context.create_run_context
+def create_memory_context(inputs, scenario_num=0, constants=None):
+    tables = {key: inputs[key] for key in INPUT_TABLE_KEYS if key in inputs}
+    if "climate" in inputs:
+        climate = inputs["climate"]
+        tables["daily_data"], tables["monthly_data"] = build_climate_tables(
+            climate["dates"], climate["rainfall"], climate["tmin"], climate["tmax"], climate.get("tmean"))
+    missing = [key for key in INPUT_TABLE_KEYS if key not in tables]
+    if missing:
+        raise ValueError(f"In-memory inputs are missing {missing}")
+    if "baseline" not in inputs:
+        raise ValueError("In-memory inputs are missing the baseline variables")
+    tables["input_baseline"] = build_input_table(inputs["baseline"])
+    tables["input_interventions"] = build_input_table(inputs.get("interventions", {}))
+
+    # Every input is addressed by a placeholder path that only the context's tables can resolve
+    file_paths = {key: f"{MEMORY_ROOT}/{key}" for key in tables}
+    file_paths.update({"supply_interventions": None, "demand_interventions": None, "soil_interventions": None})
+    return create_run_context("csv", MEMORY_ROOT, scenario_num, file_paths, constants,
+                              {file_paths[key]: table for key, table in tables.items()})
+
+
+# model_api.py - Function 006: Runs the model on in-memory inputs and returns the output dictionary
+# Interactions: create_memory_context, orchestrator.main_controller.run_dr_pf_routines
+def run_model(inputs, year_type="calendar", scenario_num=0, constants=None):
+    context = create_memory_context(inputs, scenario_num, constants)
+    # The in-memory tables are served through the same readers as the csv inputs
+    return run_dr_pf_routines("csv", MEMORY_ROOT, year_type, context, scenario_num)
+
+
+# model_api.py - Function 007: Tabulates portfolio economics of the scenario's interventions over interest rates and time periods
+# Interactions: create_memory_context, orchestrator.main_controller.prepare_rain_independent_stages, shared.economics, shared.run_context.activate_run_context
+def run_economic_sensitivity(inputs, interest_rates, time_periods, scenario_num=0, portfolios=None, constants=None):
+    context = create_memory_context(inputs, scenario_num, constants)
+    with activate_run_context(context):
+        # Intervention areas come from the crop calendar, so only the rain-independent stages are prepared
+        static_stages = prepare_rain_independent_stages("csv", MEMORY_ROOT, context["file_paths"], context,
+                                                        scenario_num)
+        int_var, df_cc = static_stages["int_var"], static_stages["df_cc"]
+        economic_list = [float(int_var["Interest_Rate"]), float(int_var["Time_Period"])]
+        combined_intervention_data = create_intervention_data(
+            get_supplyside_int_data(economic_list, "csv", MEMORY_ROOT, scenario_num, int_var),
+            get_demandside_int_data(df_cc, economic_list, "csv", MEMORY_ROOT, scenario_num, int_var),
+            get_soil_moistureside_int_data(df_cc, economic_list, "csv", MEMORY_ROOT, scenario_num, int_var))
+    return calc_economic_sensitivity(combined_intervention_data, interest_rates, time_periods, portfolios)
@@ -0,0 +1,208 @@
+"""
+Local model service for drought proofing tool
+
+This module contains functions for answering many small what-if queries from one warm process:
+- Input tables loaded once and prepared stages cached per set of non supply-side interventions
+- Supply-side intervention deltas (recharge structures, costs, economics) answered by the supply-dependent stages only
+- Summary metrics returned as JSON with the request latency
+- A localhost HTTP/JSON server queuing requests onto a worker pool, callable without a network for tests
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Keeps the climate, crop database and baseline configuration in memory and serves intervention what-if queries over HTTP/JSON on localhost, rerunning only the stages the deltas affect
+# ========================================
+
+import os
+import json
+import time
+import threading
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer, make_server
+import numpy as np
+from shared.run_context import activate_run_context
+from orchestrator.input_collector import collect_int_variables
+from orchestrator.main_controller import (prepare_rain_independent_stages, prepare_supply_independent_stages,
+                                          run_supply_dependent_stages)
+from orchestrator.model_api import load_model_inputs, create_memory_context
+from orchestrator.ensemble_controller import collect_member_metrics
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Prepared stage sets kept per distinct set of non supply-side interventions
+STAGE_CACHE_SIZE = 8
+# Recharge structures whose interventions only enter the storage and water balance stages
+SUPPLY_SIDE_STRUCTURES = ["Farm_Pond", "Check_Dam", "Infiltration_Pond", "Injection_Wells"]
+# Costs, life spans and maintenance only enter the economics stage
+ECONOMIC_SUFFIXES = ("_Cost", "_Life_Span", "_Maintenance")
+
+
+# WSGI server handling each connection in its own thread so queries wait on the worker pool together
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+# model_service.py - Function 001: Checks whether an intervention only affects the supply-dependent stages
+# Interactions: None
+def is_supply_side_intervention(name):
+    if name in ("Time_Period", "Interest_Rate") or name.endswith(ECONOMIC_SUFFIXES):
+        return True
+    return any(name.startswith(f"{structure}_") for structure in SUPPLY_SIDE_STRUCTURES)
+
+
+# model_service.py - Function 002: Returns the stage cache key of an intervention delta
+# Interactions: is_supply_side_intervention
+def get_stage_cache_key(deltas):
+    # Supply-side deltas reuse the stages prepared for the rest of the delta
+    return tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                        for name, value in deltas.items() if not is_supply_side_intervention(name)))
+
+
+# model_service.py - Function 003: Creates the run context of one query from the service inputs and its deltas
+# Interactions: orchestrator.model_api.create_memory_context, numpy
+def create_query_context(service, deltas):
+    interventions = service["inputs"]["interventions"]
+    unknown = [name for name in deltas if name not in interventions]
+    if unknown:
+        raise ValueError(f"Unknown intervention variables {unknown}")
+    # Values are checked here, so a bad delta answers with a 400 instead of failing inside a model stage
+    for name, value in deltas.items():
+        values = value if isinstance(value, list) else [value]
+        try:
+            valid = len(values) > 0 and all(np.isfinite([float(item) for item in values]))
+        except (TypeError, ValueError):
+            valid = False
+        if not valid:
+            raise ValueError(f"Intervention variable '{name}' must be a number or a list of numbers, got {value!r}")
+    query_inputs = dict(service["inputs"])
+    query_inputs["interventions"] = {**interventions, **deltas}
+    return create_memory_context(query_inputs, service["scenario_num"])
+
+
+# model_service.py - Function 004: Returns the prepared and balance stages for a cache key, preparing them on a miss
+# Interactions: orchestrator.main_controller.prepare_rain_independent_stages, orchestrator.main_controller.prepare_supply_independent_stages
+def get_prepared_stages(service, context, key):
+    with service["lock"]:
+        if key in service["stage_cache"]:
+            service["stage_cache"].move_to_end(key)
+            return service["stage_cache"][key] + (True,)
+    # Preparing runs outside the lock so cached queries are not held up by a miss
+    static_stages = prepare_rain_independent_stages(context["inp_source"], context["master_path"],
+                                                    context["file_paths"], context, service["scenario_num"])
+    balance_stages = prepare_supply_independent_stages(static_stages)
+    with service["lock"]:
+        service["stage_cache"][key] = (static_stages, balance_stages)
+        while len(service["stage_cache"]) > service["cache_size"]:
+            service["stage_cache"].popitem(last=False)
+    return static_stages, balance_stages, False
+
+
+# model_service.py - Function 005: Reduces a run's outputs to summary metrics averaged over the run
+# Interactions: orchestrator.ensemble_controller.collect_member_metrics, numpy
+def summarize_outputs(outputs, all_crops):
+    metrics = collect_member_metrics(outputs, all_crops)
+    return {name: float(np.nanmean(values)) if len(values) else None for name, values in metrics.items()}
+
+
+# model_service.py - Function 006: Runs one what-if query and returns its summary metrics and latency
+# Interactions: create_query_context, get_stage_cache_key, get_prepared_stages, summarize_outputs, orchestrator.input_collector.collect_int_variables, orchestrator.main_controller.run_supply_dependent_stages, shared.run_context.activate_run_context
+def run_service_query(service, deltas):
+    start = time.perf_counter()
+    context = create_query_context(service, deltas)
+    with activate_run_context(context):
+        static_stages, balance_stages, cached = get_prepared_stages(service, context, get_stage_cache_key(deltas))
+        # Cached stages may come from another query, so this query's context and supply-side inputs are swapped in
+        static_stages = dict(static_stages, context=context,
+                             int_var=collect_int_variables(context["inp_source"], context["master_path"],
+                                                           service["scenario_num"]))
+        outputs = run_supply_dependent_stages(static_stages, balance_stages, service["year_type"])
+    return {
+        "metrics": summarize_outputs(outputs, static_stages["all_crops"]),
+        "stages_cached": cached,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+# model_service.py - Function 007: Creates a service holding the inputs, stage cache and worker pool
+# Interactions: orchestrator.model_api.load_model_inputs, create_query_context, get_prepared_stages, shared.run_context.activate_run_context, concurrent.futures
+def create_model_service(master_path, scenario_num=0, year_type="calendar", workers=2, cache_size=STAGE_CACHE_SIZE):
+    service = {
+        "inputs": load_model_inputs(master_path, scenario_num),
+        "scenario_num": scenario_num,
+        "year_type": year_type,
+        "cache_size": int(cache_size),
+        "stage_cache": OrderedDict(),
+        "lock": threading.Lock(),
+        "executor": ThreadPoolExecutor(max_workers=int(workers)),
+    }
+    # The configured interventions are prepared up front, so supply-side queries are warm from the first request
+    context = create_query_context(service, {})
+    with activate_run_context(context):
+        get_prepared_stages(service, context, get_stage_cache_key({}))
+    return service
+
+
+# model_service.py - Function 008: Routes one request and returns the HTTP status and JSON payload
+# Interactions: run_service_query, json
+def handle_service_request(service, method, path, body=b""):
+    if method == "GET" and path == "/health":
+        return 200, {"status": "ok", "cached_stages": len(service["stage_cache"])}
+    if method != "POST" or path != "/run":
+        return 404, {"error": f"No route for {method} {path}"}
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError as e:
+        return 400, {"error": f"Request body is not valid JSON: {e}"}
+    except Exception as e:
+        return 500, {"error": f"Request body could not be read: {type(e).__name__}: {e}"}
+    deltas = payload.get("interventions", {}) if isinstance(payload, dict) else None
+    if not isinstance(deltas, dict):
+        return 400, {"error": "'interventions' must be an object of variable -> value"}
+    # Queries wait on the worker pool, which bounds how many model runs share the process
+    future = service["executor"].submit(run_service_query, service, deltas)
+    try:
+        return 200, future.result()
+    except ValueError as e:
+        return 400, {"error": str(e)}
+    except Exception as e:
+        # Any other model failure still answers with a JSON body instead of dropping the connection
+        return 500, {"error": f"{type(e).__name__}: {e}"}
+
+
+# model_service.py - Function 009: Wraps the request router as a WSGI application
+# Interactions: handle_service_request, json
+def create_service_app(service):
+    def app(environ, start_response):
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        body = environ["wsgi.input"].read(length) if length else b""
+        status, payload = handle_service_request(service, environ["REQUEST_METHOD"], environ.get("PATH_INFO", "/"),
+                                                 body)
+        response = json.dumps(payload).encode("utf-8")
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+        start_response(f"{status} {reasons[status]}", [("Content-Type", "application/json"),
+                                                       ("Content-Length", str(len(response)))])
+        return [response]
+    return app
+
+
+# model_service.py - Function 010: Serves what-if queries on localhost until interrupted
+# Interactions: create_model_service, create_service_app, wsgiref.simple_server, contextlib, os
+def serve_model(master_path, host=DEFAULT_HOST, port=DEFAULT_PORT, scenario_num=0, year_type="calendar", workers=2):
+    print("FUNCTION 33: serve_model() - Starting local model service")
+    service = create_model_service(master_path, scenario_num, year_type, workers)
+    server = make_server(host, int(port), create_service_app(service), server_class=_ThreadingWSGIServer)
+    print(f"Serving scenario {scenario_num} on http://{host}:{server.server_port} (POST /run, GET /health)")
+    # Stage progress messages would flood the console on every query, so they are dropped while serving
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service["executor"].shutdown()
@@ -0,0 +1,226 @@
+"""
+Global sensitivity controller for drought proofing tool
+
+This module contains functions for running Morris screening and Sobol analysis over model parameters:
+- Model constants and input.csv variables with the first stage each one enters
+- Parameter samples run from the first stage their perturbed parameters enter, reusing prepared stages
+- Trajectories and Saltelli blocks evaluated sequentially or across worker processes
+- Ranked sensitivity indices of recharge, GW extraction, CWR met and yields
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Drives Morris and Sobol sensitivity analysis of soil, runoff, aquifer and irrigation parameters, recomputing only the stages downstream of each perturbed parameter
+# ========================================
+
+import io
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from shared.utilities import to_float
+from shared.data_readers import get_file_paths
+from shared.run_context import create_run_context, activate_run_context
+from shared.sensitivity_analysis import (DEFAULT_MORRIS_LEVELS, sample_morris_trajectories, calc_morris_indices,
+                                         sample_saltelli_blocks, calc_sobol_indices, scale_unit_samples,
+                                         build_ranked_index_frame)
+from orchestrator.main_controller import (prepare_rain_independent_stages, prepare_supply_independent_stages,
+                                          run_supply_dependent_stages, create_scenario_context)
+from orchestrator.model_service import summarize_outputs
+
+
+# Parameters as name -> (source, first stage): constants come from config_constants, inputs from input.csv;
+# "prepare" parameters need the rain-independent stages again, "balance" ones only the stages from runoff on
+SENSITIVITY_PARAMETERS = {
+    "theta_FC": ("constant", "prepare"),
+    "theta_WP": ("constant", "prepare"),
+    "Ia_AMC1": ("constant", "balance"),
+    "Ia_AMC2": ("constant", "balance"),
+    "Ia_AMC3": ("constant", "balance"),
+    "Soil_GWrecharge_coefficient": ("constant", "balance"),
+    "Builtup_cn2": ("constant", "balance"),
+    "Pasture_cn2": ("constant", "balance"),
+    "Forest_cn2": ("constant", "balance"),
+    "Eff_Default_Irrigation": ("constant", "balance"),
+    "Specific_Yield": ("input", "balance"),
+    "SW_Area_Irr_Eff": ("input", "balance"),
+    "GW_Area_Irr_Eff": ("input", "balance"),
+}
+# Parameters are varied by this fraction either side of their configured value unless bounds are given
+DEFAULT_RELATIVE_RANGE = 0.2
+# Physical limits the default bounds are clipped to: curve numbers and efficiencies (%) stay within 0-100
+PARAMETER_LIMITS = {
+    "Builtup_cn2": (0, 100), "Pasture_cn2": (0, 100), "Forest_cn2": (0, 100),
+    "Eff_Default_Irrigation": (0, 100), "SW_Area_Irr_Eff": (0, 100), "GW_Area_Irr_Eff": (0, 100),
+}
+# Rain-independent stage sets each evaluator keeps for reuse
+SENSITIVITY_CACHE_SIZE = 2
+
+# Evaluator state held by each worker process
+_worker_state = {}
+
+
+# sensitivity_controller.py - Function 001: Returns the configured value of a sensitivity parameter
+# Interactions: shared.utilities.to_float
+def get_parameter_value(static_stages, name):
+    if name not in SENSITIVITY_PARAMETERS:
+        raise ValueError(f"Unknown sensitivity parameter '{name}'; choose from {list(SENSITIVITY_PARAMETERS)}")
+    if SENSITIVITY_PARAMETERS[name][0] == "constant":
+        return float(static_stages["context"]["constants"][name])
+    return to_float(static_stages["inp_var"].get(name), 0)
+
+
+# sensitivity_controller.py - Function 001A: Returns the bounds of each analysed parameter around its configured value
+# Interactions: get_parameter_value, numpy
+def get_parameter_bounds(static_stages, parameters, bounds=None, relative_range=DEFAULT_RELATIVE_RANGE):
+    bounds = bounds or {}
+    lows, highs = [], []
+    for name in parameters:
+        base = get_parameter_value(static_stages, name)
+        if name in bounds:
+            low, high = bounds[name]
+        else:
+            if base == 0:
+                raise ValueError(f"'{name}' is 0, so it needs explicit bounds")
+            low, high = sorted([base * (1 - relative_range), base * (1 + relative_range)])
+            limit_low, limit_high = PARAMETER_LIMITS.get(name, (-np.inf, np.inf))
+            low, high = max(low, limit_low), min(high, limit_high)
+        lows.append(float(low))
+        highs.append(float(high))
+    return lows, highs
+
+
+# sensitivity_controller.py - Function 002: Creates the evaluator state shared by the points of one process
+# Interactions: collections.OrderedDict
+def create_evaluator(static_stages, year_type, parameters):
+    return {
+        "static": static_stages,
+        "year_type": year_type,
+        "parameters": list(parameters),
+        "static_cache": OrderedDict(),
+    }
+
+
+# sensitivity_controller.py - Function 003: Returns a cached rain-independent stage set, building it on a miss
+# Interactions: None
+def _get_cached_stages(cache, key, build):
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    cache[key] = build()
+    while len(cache) > SENSITIVITY_CACHE_SIZE:
+        cache.popitem(last=False)
+    return cache[key]
+
+
+# sensitivity_controller.py - Function 004: Prepares one parameter point's stages from the first stage its parameters change
+# Interactions: _get_cached_stages, shared.run_context, orchestrator.main_controller.prepare_rain_independent_stages, orchestrator.main_controller.prepare_supply_independent_stages
+def prepare_point_stages(evaluator, values):
+    base = evaluator["static"]
+    point = dict(zip(evaluator["parameters"], (float(value) for value in values)))
+    constants = {**base["context"]["constants"],
+                 **{name: value for name, value in point.items() if SENSITIVITY_PARAMETERS[name][0] == "constant"}}
+    inputs = {name: value for name, value in point.items() if SENSITIVITY_PARAMETERS[name][0] == "input"}
+    prepare_key = tuple(value for name, value in point.items() if SENSITIVITY_PARAMETERS[name][1] == "prepare")
+
+    def prepare():
+        if not prepare_key:
+            return base
+        # Rain-independent stages keep their own run state, so they get a fresh context with this point's constants
+        context = create_run_context(base["inp_source"], base["master_path"], base["scenario_num"],
+                                     base["file_paths"], constants)
+        with activate_run_context(context):
+            return prepare_rain_independent_stages(base["inp_source"], base["master_path"], base["file_paths"],
+                                                   context, base["scenario_num"])
+
+    static_stages = _get_cached_stages(evaluator["static_cache"], prepare_key, prepare)
+    # Later stages read constants from the context and aquifer and efficiency inputs from inp_var
+    context = dict(static_stages["context"], constants=constants)
+    static_stages = dict(static_stages, context=context, inp_var={**static_stages["inp_var"], **inputs})
+    with activate_run_context(context):
+        balance_stages = prepare_supply_independent_stages(static_stages)
+    return static_stages, balance_stages
+
+
+# sensitivity_controller.py - Function 004A: Runs one parameter point and returns its summary metrics
+# Interactions: prepare_point_stages, summarize_outputs, shared.run_context.activate_run_context, orchestrator.main_controller.run_supply_dependent_stages, contextlib, io
+def evaluate_parameter_point(evaluator, values):
+    # Stage progress messages are silenced per point to keep the analysis log readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        static_stages, balance_stages = prepare_point_stages(evaluator, values)
+        with activate_run_context(static_stages["context"]):
+            outputs = run_supply_dependent_stages(static_stages, balance_stages, evaluator["year_type"])
+    return summarize_outputs(outputs, static_stages["all_crops"])
+
+
+# sensitivity_controller.py - Function 005: Runs a sequence of points in order so neighbouring points share stages
+# Interactions: evaluate_parameter_point
+def evaluate_point_sequence(evaluator, points):
+    return [evaluate_parameter_point(evaluator, values) for values in points]
+
+
+# sensitivity_controller.py - Function 006: Stores the evaluator in a worker process
+# Interactions: create_evaluator
+def _init_worker(static_stages, year_type, parameters):
+    _worker_state["evaluator"] = create_evaluator(static_stages, year_type, parameters)
+
+
+# sensitivity_controller.py - Function 007: Runs one point sequence inside a worker process
+# Interactions: evaluate_point_sequence
+def _evaluate_worker_sequence(points):
+    return evaluate_point_sequence(_worker_state["evaluator"], points)
+
+
+# sensitivity_controller.py - Function 008: Runs Morris screening or Sobol analysis and returns the samples and ranked indices
+# Interactions: get_parameter_bounds, create_evaluator, evaluate_point_sequence, _init_worker, _evaluate_worker_sequence, shared.sensitivity_analysis, orchestrator.main_controller, shared.data_readers.get_file_paths, shared.run_context.activate_run_context, concurrent.futures, numpy, pandas
+def run_sensitivity_analysis(inp_source, master_path, year_type, context=None, scenario_num=0, method="morris",
+                             n_samples=10, parameters=None, bounds=None, relative_range=DEFAULT_RELATIVE_RANGE,
+                             levels=DEFAULT_MORRIS_LEVELS, seed=None, workers=1):
+    print("FUNCTION 35: run_sensitivity_analysis() - Running global sensitivity analysis")
+    if method not in ("morris", "sobol"):
+        raise ValueError(f"Sensitivity method must be 'morris' or 'sobol', got '{method}'")
+    parameters = list(SENSITIVITY_PARAMETERS) if parameters is None else list(parameters)
+    if context is None:
+        context = create_scenario_context(inp_source, master_path, scenario_num)
+    with activate_run_context(context):
+        file_paths = get_file_paths(inp_source, master_path)
+        static_stages = prepare_rain_independent_stages(inp_source, master_path, file_paths, context, scenario_num)
+    lows, highs = get_parameter_bounds(static_stages, parameters, bounds, relative_range)
+
+    # Morris trajectories and Saltelli blocks are both sequences of points sharing most parameter values
+    if method == "morris":
+        unit_points, order, delta = sample_morris_trajectories(len(parameters), n_samples, levels, seed)
+    else:
+        unit_points = sample_saltelli_blocks(len(parameters), n_samples, seed)
+    points = scale_unit_samples(unit_points, lows, highs)
+    print(f"Running {points.shape[0] * points.shape[1]} {method} points over {len(parameters)} parameters")
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(static_stages, year_type, parameters)) as executor:
+            sequence_results = list(executor.map(_evaluate_worker_sequence, points))
+    else:
+        evaluator = create_evaluator(static_stages, year_type, parameters)
+        sequence_results = [evaluate_point_sequence(evaluator, sequence) for sequence in points]
+
+    metrics = list(sequence_results[0][0]) if sequence_results else []
+    metric_indices = {}
+    for metric in metrics:
+        results = np.array([[point_result[metric] for point_result in sequence] for sequence in sequence_results],
+                           dtype=np.float64)
+        metric_indices[metric] = (calc_morris_indices(order, results, delta) if method == "morris"
+                                  else calc_sobol_indices(results))
+    df_indices = build_ranked_index_frame(metric_indices, parameters, "mu_star" if method == "morris" else "ST")
+
+    df_samples = pd.DataFrame(points.reshape(-1, len(parameters)), columns=parameters)
+    df_samples.insert(0, "Point", np.tile(np.arange(points.shape[1]), points.shape[0]))
+    df_samples.insert(0, "Trajectory" if method == "morris" else "Block", np.repeat(np.arange(points.shape[0]),
+                                                                                    points.shape[1]))
+    df_samples = pd.concat([df_samples, pd.DataFrame([point_result for sequence in sequence_results
+                                                      for point_result in sequence])], axis=1)
+    return {
+        f"sensitivity_{method}_samples.csv": df_samples,
+        f"sensitivity_{method}_indices.csv": df_indices,
+    }
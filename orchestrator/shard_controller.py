@@ -0,0 +1,155 @@
+"""
+Sharded batch controller for drought proofing tool
+
+This module contains functions for splitting a large site batch across processes or machines:
+- A shard plan that crosses sites with scenarios and splits them into shard manifests
+- A shard worker that runs one shard with the multi-site batch and marks it complete
+- Shard status read from the shard summaries, so failed or missing shards can be re-run
+- A merge step that combines the shard summaries into the consolidated batch summary
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Splits thousands of sites x scenarios into shards that independent workers (local processes or nodes sharing a filesystem) run idempotently, then merges their results into one result store
+# ========================================
+
+import os
+import numpy as np
+import pandas as pd
+from orchestrator.batch_controller import SITE_FILE_KEYS, CLIMATE_TABLE_KEYS, write_table_atomic, run_site_batch
+
+
+# Layout of a batch folder: shard manifests and summaries, site outputs and the merged tables
+SHARD_FOLDER = "shards"
+SHARD_INDEX_FILE = "shards.csv"
+SITES_FOLDER = "Sites"
+
+
+# shard_controller.py - Function 001: Returns the manifest and summary paths of one shard
+# Interactions: os
+def get_shard_paths(batch_dir, shard):
+    shard_dir = os.path.join(batch_dir, SHARD_FOLDER)
+    return {
+        "manifest": os.path.join(shard_dir, f"shard_{int(shard):03d}.csv"),
+        "summary": os.path.join(shard_dir, f"shard_{int(shard):03d}_summary.csv"),
+        "ledger": os.path.join(shard_dir, f"shard_{int(shard):03d}_ledger.jsonl"),
+    }
+
+
+# shard_controller.py - Function 002: Reads a shard summary; a missing summary means the shard has not finished
+# Interactions: pandas, os
+def read_shard_summary(batch_dir, shard):
+    summary_path = get_shard_paths(batch_dir, shard)["summary"]
+    return pd.read_csv(summary_path) if os.path.exists(summary_path) else None
+
+
+# shard_controller.py - Function 003: Splits a site manifest, crossed with scenarios, into shard manifests
+# Interactions: get_shard_paths, orchestrator.batch_controller.write_table_atomic, numpy, pandas, os
+def create_shard_plan(manifest_path, batch_dir, n_shards, scenarios=None, scenario_num=0):
+    print("FUNCTION 38: create_shard_plan() - Splitting batch into shards")
+    df_sites = pd.read_csv(manifest_path, dtype=str).fillna("")
+    if "Site" not in df_sites.columns:
+        raise ValueError(f"Site manifest {manifest_path} has no 'Site' column")
+    if df_sites.empty:
+        raise ValueError(f"Site manifest {manifest_path} lists no sites")
+    if int(n_shards) < 1:
+        raise ValueError(f"Number of shards must be at least 1, got {n_shards}")
+    # Shard manifests live in the batch folder, so site files are given as absolute paths
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    for key in SITE_FILE_KEYS:
+        if key in df_sites.columns:
+            df_sites[key] = [os.path.join(manifest_dir, path) if path else "" for path in df_sites[key]]
+    if scenarios is not None:
+        if "Scenario" in df_sites.columns:
+            raise ValueError(f"Site manifest {manifest_path} already has a 'Scenario' column")
+        df_sites = df_sites.merge(pd.DataFrame({"Scenario": [str(int(s)) for s in scenarios]}), how="cross")
+    elif "Scenario" not in df_sites.columns:
+        df_sites["Scenario"] = str(scenario_num)
+    df_sites["Scenario"] = df_sites["Scenario"].replace("", str(scenario_num))
+    # Units on the same climate stay next to each other, so most shards parse each climate series once
+    climate_columns = [key for key in CLIMATE_TABLE_KEYS if key in df_sites.columns]
+    if climate_columns:
+        df_sites = df_sites.sort_values(climate_columns, kind="stable")
+
+    shard_rows = np.array_split(np.arange(len(df_sites)), min(int(n_shards), len(df_sites)))
+    index = []
+    for shard, rows in enumerate(shard_rows):
+        paths = get_shard_paths(batch_dir, shard)
+        df_shard = df_sites.iloc[rows]
+        # A shard whose units changed loses its summary so it runs again; unchanged shards keep their results
+        unchanged = (os.path.exists(paths["manifest"])
+                     and pd.read_csv(paths["manifest"], dtype=str).fillna("").equals(df_shard.reset_index(drop=True)))
+        if not unchanged:
+            write_table_atomic(df_shard, paths["manifest"])
+            if os.path.exists(paths["summary"]):
+                os.remove(paths["summary"])
+        index.append({"Shard": shard, "Manifest": os.path.relpath(paths["manifest"], batch_dir),
+                      "Units": len(rows)})
+    # Shards left over from a larger earlier plan are removed
+    shard = len(shard_rows)
+    while os.path.exists(get_shard_paths(batch_dir, shard)["manifest"]):
+        for path in get_shard_paths(batch_dir, shard).values():
+            if os.path.exists(path):
+                os.remove(path)
+        shard += 1
+    df_index = pd.DataFrame(index)
+    write_table_atomic(df_index, os.path.join(batch_dir, SHARD_INDEX_FILE))
+    print(f"Split {len(df_sites)} site-scenario units into {len(df_index)} shards in {batch_dir}")
+    return df_index
+
+
+# shard_controller.py - Function 004: Returns the status of every shard of a plan
+# Interactions: read_shard_summary, pandas, os
+def read_shard_status(batch_dir):
+    index_path = os.path.join(batch_dir, SHARD_INDEX_FILE)
+    if not os.path.exists(index_path):
+        raise ValueError(f"No shard plan in {batch_dir}; create one with create_shard_plan first")
+    df_status = pd.read_csv(index_path)
+    statuses = []
+    for shard in df_status["Shard"]:
+        df_summary = read_shard_summary(batch_dir, shard)
+        if df_summary is None:
+            statuses.append("pending")
+        else:
+            failed = int((df_summary["Status"] != "completed").sum())
+            statuses.append(f"failed units: {failed}" if failed else "completed")
+    df_status["Status"] = statuses
+    return df_status
+
+
+# shard_controller.py - Function 005: Runs one shard and writes its summary; finished shards are skipped
+# Interactions: get_shard_paths, read_shard_summary, orchestrator.batch_controller.run_site_batch, os
+def run_shard(batch_dir, shard, master_path, year_type="calendar", workers=1, force=False, checkpoint_stages=False):
+    print(f"FUNCTION 39: run_shard() - Running shard {shard}")
+    paths = get_shard_paths(batch_dir, shard)
+    if not os.path.exists(paths["manifest"]):
+        raise ValueError(f"Shard {shard} is not part of the plan in {batch_dir}")
+    df_summary = read_shard_summary(batch_dir, shard)
+    if not force and df_summary is not None and (df_summary["Status"] == "completed").all():
+        print(f"Shard {shard} already completed, skipping")
+        return {os.path.basename(paths["summary"]): df_summary}
+    # Every unit writes to its own site and scenario folder, so re-running a shard overwrites only its own outputs;
+    # units the shard's ledger records as completed are skipped unless the shard is forced
+    results = run_site_batch(paths["manifest"], master_path, year_type, workers=workers,
+                             output_dir=os.path.join(batch_dir, SITES_FOLDER), summary_path=paths["summary"],
+                             resume=not force, checkpoint_stages=checkpoint_stages, ledger_path=paths["ledger"])
+    return {os.path.basename(paths["summary"]): results["batch_summary.csv"]}
+
+
+# shard_controller.py - Function 006: Merges the shard summaries into the consolidated batch summary
+# Interactions: read_shard_status, read_shard_summary, orchestrator.batch_controller.write_table_atomic, pandas, os
+def merge_shard_results(batch_dir):
+    print("FUNCTION 40: merge_shard_results() - Merging shard results")
+    df_status = read_shard_status(batch_dir)
+    summaries = [read_shard_summary(batch_dir, shard) for shard in df_status["Shard"]]
+    summaries = [df_summary for df_summary in summaries if df_summary is not None]
+    df_merged = pd.concat(summaries, ignore_index=True) if summaries else pd.DataFrame(columns=["Site", "Scenario",
+                                                                                                "Status"])
+    # Merging only reads the shard summaries, so it can be repeated as shards finish
+    write_table_atomic(df_merged, os.path.join(batch_dir, "batch_summary.csv"))
+    write_table_atomic(df_status, os.path.join(batch_dir, "shard_status.csv"))
+    rerun = df_status.loc[df_status["Status"] != "completed", "Shard"].tolist()
+    print(f"Merged {len(summaries)}/{len(df_status)} shards ({len(df_merged)} units)"
+          + (f"; re-run shards {rerun}" if rerun else ""))
+    return {"batch_summary.csv": df_merged, "shard_status.csv": df_status}
@@ -9,11 +9,11 @@ Water balance coordination functions for drought proofing tool
 # ========================================
 
 import numpy as np
-from shared.utilities import to_float, mm_to_m3, m3_to_mm, safe_subtract, convert_dtypes
+from shared.utilities import to_float, mm_to_m3, m3_to_mm, convert_dtypes
 from shared.data_readers import irrigation_data_input
 from aquifer_storage_bucket.processing.storage_tracking import calc_storage_residualgw
 from surface_water_bucket.outflux.evaporation import calc_potential_et
-from shared import config_constants
+from shared.run_context import get_constant
 from surface_water_bucket.influx.water_supply import calc_canal_supply
 from soil_storage_bucket.outflux.irrigation_demand import get_iwr_after_canal
 from aquifer_storage_bucket.influx.recharge_calculations import calc_potential_recharge
@@ -29,7 +29,7 @@ from soil_storage_bucket.outflux.evapotranspiration import calc_final_et, calc_f
 
 # water_balance_coordinator.py - Function 001: Processes water management including storage and irrigation
 # Interactions: shared.data_readers.irrigation_data_input, aquifer_storage_bucket.processing.storage_tracking.calc_storage_residualgw, shared.utilities.mm_to_m3, shared.utilities.to_float, surface_water_bucket.outflux.evaporation.calc_potential_et, surface_water_bucket.influx.water_supply.calc_canal_supply, soil_storage_bucket.outflux.irrigation_demand.get_iwr_after_canal, aquifer_storage_bucket.influx.recharge_calculations.calc_potential_recharge, aquifer_storage_bucket.outflux.domestic_demand.calc_domestic_need, aquifer_storage_bucket.outflux.domestic_demand.calc_other_need, aquifer_storage_bucket.outflux.domestic_demand.calc_gw_need, surface_water_bucket.outflux.water_demand.calc_sw_need, surface_water_bucket.outflux.water_abstraction.calc_sw_abstracted, surface_water_bucket.processing.water_balance.calc_value_after_subtracting_domestic_sw_use, calc_storage, shared.utilities.m3_to_mm, outputs.water_metrics.calc_per_irr_water_req_fulfilled, outputs.water_metrics.calc_cwr_met
-def process_water_management(df_mm, all_crops, surface_areas, added_recharges, water_resource_list, inp_aquifer_para, irrigation):
+def process_water_management(df_mm, all_crops, surface_areas, added_recharges, water_resource_list, inp_aquifer_para, irrigation, model_calendar):
     (population, domestic_water_use, other, other_water_use,
      groundwater_dependent, sw_storage_capacity_created, added_recharge_capacity, storage_limit) = water_resource_list
     df_ir = irrigation_data_input(irrigation, df_mm)
@@ -39,7 +39,7 @@ def process_water_management(df_mm, all_crops, surface_areas, added_recharges, w
     total_surface_area_farm = surface_areas["farm"]
     # Perform calculations
     df_mm = calc_potential_et(total_surface_area_farm, df_mm)
-    df_mm = calc_canal_supply(df_ir, df_mm)
+    df_mm = calc_canal_supply(df_ir, df_mm, model_calendar)
     df_mm = get_iwr_after_canal(df_mm)
     df_mm = calc_potential_recharge(
         added_recharges["farm"],
@@ -86,139 +86,72 @@ def process_final_wb(df, all_crops=None, df_cc=None, df_crop=None):
 
 
 # water_balance_coordinator.py - Function 003: Calculates complex water storage dynamics and abstractions
-# Interactions: shared.utilities.to_float, shared.utilities.safe_subtract, numpy
+# Interactions: shared.utilities.to_float, shared.run_context.get_constant, numpy
 def calc_storage(df_mm, sw_storage_capacity_created, added_recharge_capacity, storage_limit):
-    denominator = df_mm["Potential_recharge"] + df_mm["Potential_ET"] + df_mm["IWR_after_canal"]
-    denominator[denominator == 0] = np.inf
-    df_mm.loc[0, "Value after Rejected Recharge"] = to_float(config_constants.Previous_Month_Rejected_Recharge, 0) + df_mm.loc[
-        0, "Qom(m^3)"]
-    df_mm.loc[0, "Storage"] = min(sw_storage_capacity_created,
-                                  df_mm.loc[0, "Value after Rejected Recharge"] +
-                                  to_float(config_constants.Previous_Month_storage, 0) -
-                                  df_mm.loc[0, "SW_abstracted"])
-    df_mm.loc[0, "all_req_met"] = np.where(
-        df_mm.loc[0, "Potential_recharge"] + df_mm.loc[0, "Potential_ET"] +
-        df_mm.loc[0, "IWR_after_canal"] > df_mm.loc[0, "Storage"], 0, 1
-    )
-    conditions = df_mm.loc[0, "all_req_met"] == 0
-    if conditions:
-        # Apply calculations when all_req_met is 0
-        df_mm.loc[0, "Actual_Recharge"] = (
-                (df_mm.loc[0, "Storage"] / denominator[0]) * df_mm.loc[0, "Potential_recharge"]
-        )
-        df_mm.loc[0, "Actual_ET"] = (
-                (df_mm.loc[0, "Storage"] / denominator[0]) * df_mm.loc[0, "Potential_ET"]
-        )
-        df_mm.loc[0, "Actual_IWR"] = (
-                (df_mm.loc[0, "Storage"] / denominator[0]) * df_mm.loc[0, "IWR_after_canal"]
-        )
-    else:
-        # Apply calculations when all_req_met is not 0
-        df_mm.loc[0, "Actual_Recharge"] = df_mm.loc[0, "Potential_recharge"]
-        df_mm.loc[0, "Actual_ET"] = df_mm.loc[0, "Potential_ET"]
-        df_mm.loc[0, "Actual_IWR"] = df_mm.loc[0, "IWR_after_canal"]
-    df_mm.loc[0, "Runoff_captured"] = df_mm.loc[0, "Storage"] - to_float(config_constants.Previous_Month_storage, 0)
-    df_mm.loc[0, "Runoff_left_after_storage"] = df_mm.loc[0, "value_after_subtracting_domestic_SW_use"] - df_mm.loc[
-        0, "Runoff_captured"]
-    df_mm.loc[0, "Runoff in GW recharge str"] = added_recharge_capacity if (df_mm.loc[
-                                                                                0, "Runoff_left_after_storage"] >
-                                                                            added_recharge_capacity) else \
-        df_mm.loc[0, "Runoff_left_after_storage"]
-    df_mm.loc[0, "added_monthly_recharge"] = df_mm.loc[0, "Actual_Recharge"] + df_mm.loc[0, "Runoff in GW recharge str"]
-    df_mm.loc[0, "Cumulative_storage_monthly"] = (
-            df_mm.loc[0, "Residual_storage"] +
-            df_mm.loc[0, "added_monthly_recharge"] +
-            df_mm.loc[0, "Accumulated_natural_recharge"]
-    )
-    df_mm.loc[0, "GW_abstracted"] = np.minimum(df_mm.loc[0, "Cumulative_storage_monthly"], df_mm.loc[0, "GW_need"])
-    df_mm.loc[0, "Cumulative_left_after_domestic_abstraction"] = max(0, df_mm.loc[0, "Cumulative_storage_monthly"] -
-                                                                     df_mm.loc[0, "GW_abstracted"])
-    conditions = [
-        df_mm.loc[0, "Irr_water_need"] == 0,
-        df_mm.loc[0, "Actual_IWR"] >= df_mm.loc[0, "Irr_water_need"],
-        df_mm.loc[0, "Irr_water_need"] - df_mm.loc[0, "Actual_IWR"] <= df_mm.loc[
-            0, "Cumulative_left_after_domestic_abstraction"]
-    ]
-    choices = [0, 0, df_mm.loc[0, "Irr_water_need"] - df_mm.loc[0, "Actual_IWR"]]
-    df_mm.loc[0, "GW_extracted"] = np.select(conditions, choices,
-                                             default=df_mm.loc[0, "Cumulative_left_after_domestic_abstraction"])
-    df_mm.loc[0, "Cumulative_left_after_crop_abstraction"] = safe_subtract(
-        df_mm.loc[0, "Cumulative_left_after_domestic_abstraction"], df_mm.loc[0, "GW_extracted"])
-    df_mm.loc[0, "Rejected_recharge"] = df_mm.loc[0, "Cumulative_left_after_crop_abstraction"] - storage_limit if \
-        df_mm.loc[0, "Cumulative_left_after_crop_abstraction"] > storage_limit else 0
-    df_mm.loc[0, "GW_left_after_rejected_recharge"] = (
-            df_mm.loc[0, "Cumulative_left_after_crop_abstraction"] -
-            df_mm.loc[0, "Rejected_recharge"]
-    )
-    df_mm.loc[0, "Captured Runoff in m³"] = df_mm.loc[0, "Runoff_captured"] + df_mm.loc[0, "Runoff in GW recharge str"]
-    # Loop through the rows to calculate the values
-    for i in range(1, len(df_mm)):
-        df_mm.loc[i, "Value after Rejected Recharge"] = df_mm.loc[i - 1, "Rejected_recharge"] + df_mm.loc[i, "Qom(m^3)"]
-        df_mm.loc[i, "Residual_storage"] = df_mm.loc[i - 1, "GW_left_after_rejected_recharge"]
-        df_mm.loc[i, "Storage"] = min(sw_storage_capacity_created,
-                                      df_mm.loc[i - 1, "Storage"] -
-                                      df_mm.loc[i - 1, "Actual_Recharge"] -
-                                      df_mm.loc[i - 1, "Actual_ET"] -
-                                      df_mm.loc[i - 1, "Actual_IWR"] +
-                                      df_mm.loc[i, "Value after Rejected Recharge"] -
-                                      df_mm.loc[i, "SW_abstracted"])
-        df_mm.loc[i, "all_req_met"] = np.where(
-            df_mm.loc[i, "Potential_recharge"] + df_mm.loc[i, "Potential_ET"] +
-            df_mm.loc[i, "IWR_after_canal"] > df_mm.loc[i, "Storage"], 0, 1
-        )
-        conditions = df_mm.loc[i, "all_req_met"] == 0
-        if conditions:
-            # Apply calculations when all_req_met is i
-            df_mm.loc[i, "Actual_Recharge"] = (
-                    (df_mm.loc[i, "Storage"] / denominator[i]) * df_mm.loc[i, "Potential_recharge"]
-            )
-            df_mm.loc[i, "Actual_ET"] = (
-                    (df_mm.loc[i, "Storage"] / denominator[i]) * df_mm.loc[i, "Potential_ET"]
-            )
-            df_mm.loc[i, "Actual_IWR"] = (
-                    (df_mm.loc[i, "Storage"] / denominator[i]) * df_mm.loc[i, "IWR_after_canal"]
-            )
+    qom = df_mm["Qom(m^3)"].tolist()
+    sw_abstracted = df_mm["SW_abstracted"].tolist()
+    potential_recharge = df_mm["Potential_recharge"].tolist()
+    potential_et = df_mm["Potential_ET"].tolist()
+    iwr_after_canal = df_mm["IWR_after_canal"].tolist()
+    sw_after_domestic = df_mm["value_after_subtracting_domestic_SW_use"].tolist()
+    natural_recharge = df_mm["Accumulated_natural_recharge"].tolist()
+    gw_need = df_mm["GW_need"].tolist()
+    irr_water_need = df_mm["Irr_water_need"].tolist()
+    residual_storage = df_mm["Residual_storage"].tolist()
+    demand = (df_mm["Potential_recharge"] + df_mm["Potential_ET"] + df_mm["IWR_after_canal"]).tolist()
+    denominator = [np.inf if value == 0 else value for value in demand]
+
+    n_months = len(df_mm)
+    storage_cols = ["Value after Rejected Recharge", "Storage", "all_req_met", "Actual_Recharge", "Actual_ET",
+                    "Actual_IWR", "Runoff_captured", "Runoff_left_after_storage", "Runoff in GW recharge str",
+                    "added_monthly_recharge", "Cumulative_storage_monthly", "GW_abstracted",
+                    "Cumulative_left_after_domestic_abstraction", "GW_extracted",
+                    "Cumulative_left_after_crop_abstraction", "Rejected_recharge", "GW_left_after_rejected_recharge",
+                    "Captured Runoff in m³"]
+    out = {col: [0.0] * n_months for col in storage_cols}
+
+    # The month-to-month recursion runs on plain floats; each month starts from the previous month's leftovers
+    prev_rejected = to_float(get_constant("Previous_Month_Rejected_Recharge"), 0)
+    carried_storage = to_float(get_constant("Previous_Month_storage"), 0)
+    for i in range(n_months):
+        if i > 0:
+            residual_storage[i] = out["GW_left_after_rejected_recharge"][i - 1]
+        after_rejected = prev_rejected + qom[i]
+        storage = min(sw_storage_capacity_created, carried_storage + after_rejected - sw_abstracted[i])
+        all_req_met = 0 if demand[i] > storage else 1
+        if all_req_met == 0:
+            actual_recharge = (storage / denominator[i]) * potential_recharge[i]
+            actual_et = (storage / denominator[i]) * potential_et[i]
+            actual_iwr = (storage / denominator[i]) * iwr_after_canal[i]
+        else:
+            actual_recharge = potential_recharge[i]
+            actual_et = potential_et[i]
+            actual_iwr = iwr_after_canal[i]
+        runoff_captured = storage - carried_storage
+        runoff_left = sw_after_domestic[i] - runoff_captured
+        runoff_in_gw = added_recharge_capacity if runoff_left > added_recharge_capacity else runoff_left
+        added_monthly = actual_recharge + runoff_in_gw
+        cumulative = residual_storage[i] + added_monthly + natural_recharge[i]
+        gw_abstracted = np.minimum(cumulative, gw_need[i])
+        left_after_domestic = max(0, cumulative - gw_abstracted)
+        if irr_water_need[i] == 0 or actual_iwr >= irr_water_need[i]:
+            gw_extracted = 0
+        elif irr_water_need[i] - actual_iwr <= left_after_domestic:
+            gw_extracted = irr_water_need[i] - actual_iwr
         else:
-            # Apply calculations when all_req_met is not i
-            df_mm.loc[i, "Actual_Recharge"] = df_mm.loc[i, "Potential_recharge"]
-            df_mm.loc[i, "Actual_ET"] = df_mm.loc[i, "Potential_ET"]
-            df_mm.loc[i, "Actual_IWR"] = df_mm.loc[i, "IWR_after_canal"]
-        df_mm.loc[i, "Runoff_captured"] = df_mm.loc[i, "Storage"] - (
-                df_mm.loc[i - 1, "Storage"] - df_mm.loc[i - 1, "Actual_Recharge"] -
-                df_mm.loc[i - 1, "Actual_ET"] - df_mm.loc[i - 1, "Actual_IWR"])
-        df_mm.loc[i, "Runoff_left_after_storage"] = df_mm.loc[i, "value_after_subtracting_domestic_SW_use"] - df_mm.loc[
-            i, "Runoff_captured"]
-        df_mm.loc[i, "Runoff in GW recharge str"] = added_recharge_capacity if (df_mm.loc[
-                                                                                    i, "Runoff_left_after_storage"] >
-                                                                                added_recharge_capacity) else \
-            df_mm.loc[i, "Runoff_left_after_storage"]
-        df_mm.loc[i, "added_monthly_recharge"] = df_mm.loc[i, "Actual_Recharge"] + df_mm.loc[
-            i, "Runoff in GW recharge str"]
-        df_mm.loc[i, "Cumulative_storage_monthly"] = (
-                df_mm.loc[i, "Residual_storage"] +
-                df_mm.loc[i, "added_monthly_recharge"] +
-                df_mm.loc[i, "Accumulated_natural_recharge"]
-        )
-        df_mm.loc[i, "GW_abstracted"] = np.minimum(df_mm.loc[i, "Cumulative_storage_monthly"], df_mm.loc[i, "GW_need"])
-        df_mm.loc[i, "Cumulative_left_after_domestic_abstraction"] = max(0, df_mm.loc[i, "Cumulative_storage_monthly"] -
-                                                                         df_mm.loc[i, "GW_abstracted"])
-        conditions1 = [
-            df_mm.loc[i, "Irr_water_need"] == 0,
-            df_mm.loc[i, "Actual_IWR"] >= df_mm.loc[i, "Irr_water_need"],
-            df_mm.loc[i, "Irr_water_need"] - df_mm.loc[i, "Actual_IWR"] <= df_mm.loc[
-                i, "Cumulative_left_after_domestic_abstraction"]
-        ]
-        choices1 = [0, 0, df_mm.loc[i, "Irr_water_need"] - df_mm.loc[i, "Actual_IWR"]]
-        df_mm.loc[i, "GW_extracted"] = np.select(conditions1, choices1,
-                                                 default=df_mm.loc[i, "Cumulative_left_after_domestic_abstraction"])
-        df_mm.loc[i, "Cumulative_left_after_crop_abstraction"] = safe_subtract(
-            df_mm.loc[i, "Cumulative_left_after_domestic_abstraction"], df_mm.loc[i, "GW_extracted"])
-        df_mm.loc[i, "Rejected_recharge"] = df_mm.loc[i, "Cumulative_left_after_crop_abstraction"] - storage_limit if \
-            df_mm.loc[i, "Cumulative_left_after_crop_abstraction"] > storage_limit else 0
-        df_mm.loc[i, "GW_left_after_rejected_recharge"] = (
-                df_mm.loc[i, "Cumulative_left_after_crop_abstraction"] -
-                df_mm.loc[i, "Rejected_recharge"]
-        )
-        df_mm.loc[i, "Captured Runoff in m³"] = df_mm.loc[i, "Runoff_captured"] + df_mm.loc[
-            i, "Runoff in GW recharge str"]
-    return df_mm
\ No newline at end of file
+            gw_extracted = left_after_domestic
+        left_after_crop = left_after_domestic - gw_extracted
+        rejected = left_after_crop - storage_limit if left_after_crop > storage_limit else 0
+        month_values = [after_rejected, storage, all_req_met, actual_recharge, actual_et, actual_iwr,
+                        runoff_captured, runoff_left, runoff_in_gw, added_monthly, cumulative, gw_abstracted,
+                        left_after_domestic, gw_extracted, left_after_crop, rejected, left_after_crop - rejected,
+                        runoff_captured + runoff_in_gw]
+        for col, value in zip(storage_cols, month_values):
+            out[col][i] = value
+        prev_rejected = rejected
+        carried_storage = storage - actual_recharge - actual_et - actual_iwr
+
+    df_mm["Residual_storage"] = np.asarray(residual_storage, dtype=np.float64)
+    for col in storage_cols:
+        df_mm[col] = np.asarray(out[col], dtype=np.float64)
+    return df_mm
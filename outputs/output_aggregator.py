@@ -18,11 +18,14 @@ import numpy as np
 from . import water_metrics
 from . import yield_calculations
 from . import drought_metrics
+from shared.model_calendar import get_water_year, resample_yearly
+from shared.utilities import assign_columns
+from outputs.yield_engine import calc_area_weighted_averages
 
 
 # output_aggregator.py - Function 001: Resamples monthly data to yearly aggregates
-# Interactions: pandas
-def get_resample_yr_optimized(df_mm, crops):
+# Interactions: shared.model_calendar.resample_yearly
+def get_resample_yr_optimized(df_mm, crops, model_calendar):
     print("FUNCTION 51: get_resample_yr_optimized() - Resampling yearly data")
     # List of columns to resample
     cols_to_resample = [f"ETci_{crop}" for crop in crops] + \
@@ -32,54 +35,18 @@ def get_resample_yr_optimized(df_mm, crops):
                        [f"AE_soil_{crop}" for crop in crops] + \
                        [f"IWR_{crop}" for crop in crops] + \
                        ["ET_Biological"]
-    # Resample the specified columns
-    df_yr = df_mm[["Date"] + cols_to_resample].set_index("Date").resample("Y").sum().reset_index()
+    # Sum the specified columns per calendar year
+    df_yr = resample_yearly(model_calendar, df_mm, cols_to_resample)
     return df_yr
 
 
 # output_aggregator.py - Function 002: Calculates weighted averages for yield and water metrics
-# Interactions: pandas
+# Interactions: outputs.yield_engine.calc_area_weighted_averages, shared.utilities.assign_columns
 def calculate_weighted_averages(df_cc, df_yr, all_crops, yield_columns, other_columns):
     print("FUNCTION 54: calculate_weighted_averages() - Calculating weighted averages")
-    # Initialize drought proofing components
-    total_weighted_rainfed_yield = pd.Series(0, index=df_yr.index)
-    total_weighted_irrigated_yield = pd.Series(0, index=df_yr.index)
-    total_rainfed_area = df_cc["Rainfed_Area"].sum()
-    total_irrigated_area = df_cc["Irr_Area"].sum()
-
-    # Calculate weighted averages for yield-related metrics
-    for output_column, (yield_template, area_column) in yield_columns.items():
-        total_weighted_yield = pd.Series(0, index=df_yr.index)
-        total_area = df_cc[area_column].sum()
-
-        for crop in all_crops:
-            yield_col = yield_template.format(crop=crop)
-            if yield_col in df_yr.columns:
-                area = df_cc.at[crop, area_column]
-                total_weighted_yield += df_yr[yield_col] * area
-                if area_column == "Rainfed_Area":
-                    total_weighted_rainfed_yield += df_yr[yield_col] * area
-                elif area_column == "Irr_Area":
-                    total_weighted_irrigated_yield += df_yr[yield_col] * area
-
-        df_yr[output_column] = ((total_weighted_yield / total_area) * 100) if total_area > 0 else 0
-
-    # Calculate weighted averages for other metrics (e.g., CWR, CWA)
-    for output_column, col_template in other_columns.items():
-        df_yr[output_column] = pd.Series(0, index=df_yr.index)
-        for crop in all_crops:
-            metric_col = col_template.format(crop=crop)
-            if metric_col in df_yr.columns:
-                area = df_cc.at[crop, "Area"]
-                df_yr[output_column] += df_yr[metric_col] * area
-
-        total_area = df_cc["Area"].sum()
-        df_yr[output_column] /= total_area if total_area > 0 else 1
-
-    # # Calculate the "Drought Proofing" metric
-    df_yr["Drought Proofing"] = (total_weighted_rainfed_yield + total_weighted_irrigated_yield) / (
-                total_rainfed_area + total_irrigated_area)
-    return df_yr
+    # Calendar-year yield averages are reported as percentages
+    averages = calc_area_weighted_averages(df_yr, df_cc, all_crops, yield_columns, other_columns, yield_scale=100)
+    return assign_columns(df_yr, averages)
 
 
 # output_aggregator.py - Function 003: Processes year data based on calendar or crop year
@@ -108,8 +75,8 @@ def process_year_data(df_yr, df_crop_yr, all_crops, year_type):
 
 
 # output_aggregator.py - Function 004: Processes water year data for crop or calendar year
-# Interactions: get_sowing_month, pandas
-def process_water_year_data(df_mm, df_cp, crops, year_type="crop"):
+# Interactions: get_sowing_month, shared.model_calendar.get_water_year, pandas
+def process_water_year_data(df_mm, df_cp, crops, model_calendar, year_type="crop"):
     # Prepare df_wb_mm with renamed columns - keep both water balance ET and biological ET
     df_wb_mm = df_mm[["Date", "Rain", "Final_Runoff", "Final_Recharge", "Final_ET", "ET_Biological"]].copy()
     df_wb_mm.columns = ["Date", "Rain(mm)", "Runoff(mm)", "Recharge(mm)", "ET_WaterBalance(mm)", "ET_Biological(mm)"]
@@ -117,13 +84,11 @@ def process_water_year_data(df_mm, df_cp, crops, year_type="crop"):
     result_month = get_sowing_month(df_cp)
     if result_month is None or result_month == "":
         result_month = "Jun"  # Default to June if no month found
-    result_month_num = pd.to_datetime(f"{result_month} 1, 2000").month
 
     if year_type.strip().lower() == "calendar":
-        water_year = df_mm["Date"].dt.year
+        water_year = get_water_year(model_calendar, 1)
     else:
-        water_year = df_mm["Date"].dt.year.where(df_mm["Date"].dt.month >= result_month_num,
-                                                 df_mm["Date"].dt.year - 1)
+        water_year = get_water_year(model_calendar, result_month)
 
     df_mm = df_mm.assign(water_year=water_year)
     df_wb_mm = df_wb_mm.assign(water_year=water_year)
@@ -147,46 +112,10 @@ def process_water_year_data(df_mm, df_cp, crops, year_type="crop"):
 
 
 # output_aggregator.py - Function 005: Calculates weighted averages for water year metrics
-# Interactions: pandas
+# Interactions: outputs.yield_engine.calc_area_weighted_averages, shared.utilities.assign_columns
 def calc_weighted_avg(df_cc, df_crop_yr, all_crops, yield_columns, other_columns):
-    # Initialize drought proofing components
-    total_weighted_rainfed_yield = pd.Series(0, index=df_crop_yr.index)
-    total_weighted_irrigated_yield = pd.Series(0, index=df_crop_yr.index)
-    total_rainfed_area = df_cc["Rainfed_Area"].sum()
-    total_irrigated_area = df_cc["Irr_Area"].sum()
-    # Calculate weighted averages for yield-related metrics
-    for output_column, (yield_template, area_column) in yield_columns.items():
-        total_weighted_yield = pd.Series(0, index=df_crop_yr.index)
-        total_area = df_cc[area_column].sum()
-
-        for crop in all_crops:
-            yield_col = yield_template.format(crop=crop)
-            if yield_col in df_crop_yr.columns:
-                area = df_cc.at[crop, area_column]
-                total_weighted_yield += df_crop_yr[yield_col] * area
-                if area_column == "Rainfed_Area":
-                    total_weighted_rainfed_yield += df_crop_yr[yield_col] * area
-                elif area_column == "Irr_Area":
-                    total_weighted_irrigated_yield += df_crop_yr[yield_col] * area
-
-        df_crop_yr[output_column] = (total_weighted_yield / total_area) if total_area > 0 else 0
-
-    # Calculate weighted averages for other metrics (e.g., CWR, CWA)
-    for output_column, col_template in other_columns.items():
-        df_crop_yr[output_column] = pd.Series(0, index=df_crop_yr.index)
-        for crop in all_crops:
-            metric_col = col_template.format(crop=crop)
-            if metric_col in df_crop_yr.columns:
-                area = df_cc.at[crop, "Area"]
-                df_crop_yr[output_column] += df_crop_yr[metric_col] * area
-
-        total_area = df_cc["Area"].sum()
-        df_crop_yr[output_column] /= total_area if total_area > 0 else 1
-
-    # # Calculate the "Drought Proofing" metric
-    df_crop_yr["Drought Proofing"] = (total_weighted_rainfed_yield + total_weighted_irrigated_yield) / (
-                total_rainfed_area + total_irrigated_area)
-    return df_crop_yr
+    averages = calc_area_weighted_averages(df_crop_yr, df_cc, all_crops, yield_columns, other_columns)
+    return assign_columns(df_crop_yr, averages)
 
 
 # output_aggregator.py - Function 006: Gets earliest sowing month from crop plan
@@ -0,0 +1,189 @@
+"""
+Matrix yield engine for drought proofing tool outputs
+
+This module contains functions for computing yearly yield outputs for all crops at once:
+- Per-crop area, Ky, efficiency and potential yield vectors
+- Years x crops matrices of the yearly water totals
+- Yield, water requirement, production and water productivity metrics by broadcasting
+- Area-weighted averages across crops as matrix-vector products
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Computes yield and water productivity metrics on years x crops arrays so calendar-year and crop-year outputs share one code path
+# ========================================
+import numpy as np
+from shared.model_state import get_label_matrix
+
+
+# Yearly water totals (mm) read per crop; AE_crop, AE_soil and IWR are only needed for the calendar-year metrics
+YIELD_TOTALS = ["ETci", "Irr_CWR_met", "Rainfed_CWR_met", "AE_crop", "AE_soil", "IWR"]
+CROP_YEAR_TOTALS = ["ETci", "Irr_CWR_met", "Rainfed_CWR_met"]
+
+
+# yield_engine.py - Function 001: Builds the per-crop area, Ky, efficiency and potential yield vectors
+# Interactions: numpy
+def get_crop_vectors(df_cc, crops):
+    crops = list(crops)
+
+    def column(name):
+        if name not in df_cc.columns:
+            return np.zeros(len(crops), dtype=np.float64)
+        return df_cc.loc[crops, name].to_numpy(dtype=np.float64)
+
+    return {
+        "irr_area": column("Irr_Area"),
+        "rainfed_area": column("Rainfed_Area"),
+        "area": column("Area"),
+        "ky": column("Ky"),
+        "final_eff": column("Final_eff"),
+        "potential_yield": column("Yield (tonne/ha)") * 1000,
+    }
+
+
+# yield_engine.py - Function 002: Stacks the yearly "{var}_{crop}" totals into years x crops matrices
+# Interactions: shared.model_state.get_label_matrix, numpy
+def get_year_totals(df_year, crops, variables):
+    return {var: get_label_matrix(df_year, var, crops, dtype=np.float64) for var in variables}
+
+
+# yield_engine.py - Function 003: Computes the yield metrics of every crop and year by broadcasting
+# Interactions: numpy
+def calc_yield_metrics(totals, crop_vectors, year_type="calendar"):
+    year_type = year_type.strip().lower()
+    if year_type not in ("calendar", "crop"):
+        raise ValueError("Invalid year_type. Please choose either 'calendar' or 'crop'.")
+    etci = totals["ETci"]
+    irr_cwr = totals["Irr_CWR_met"]
+    rainfed_cwr = totals["Rainfed_CWR_met"]
+    irr_area = crop_vectors["irr_area"]
+    rainfed_area = crop_vectors["rainfed_area"]
+    total_area = crop_vectors["area"]
+    ky_value = crop_vectors["ky"]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        irr_met = irr_cwr / etci
+        rainfed_met = rainfed_cwr / etci
+        if year_type == "crop":
+            # Crop-year shares are capped at full requirement and yields are bounded to [0, 1]
+            irr_met = np.minimum(irr_met, 1)
+            rainfed_met = np.minimum(rainfed_met, 1)
+            pct_irr = np.where(irr_area == 0, 0, irr_met)
+            pct_rainfed = np.where(rainfed_area == 0, 0, rainfed_met)
+            irr_yield = np.where(irr_area == 0, 0, np.clip(1 - ky_value * (1 - pct_irr), 0, 1))
+            rainfed_yield = np.where(rainfed_area == 0, 0, np.clip(1 - ky_value * (1 - pct_rainfed), 0, 1))
+        else:
+            pct_irr = np.where(irr_area == 0, 0, irr_met)
+            pct_rainfed = np.where(rainfed_area == 0, 0, rainfed_met)
+            irr_yield = np.where(irr_area == 0, 0, np.maximum(1 - ky_value * (1 - irr_met), 0))
+            rainfed_yield = np.where(rainfed_area == 0, 0, np.maximum(1 - ky_value * (1 - rainfed_met), 0))
+
+        metrics = {
+            "%Irr_CWR_met_{crop}": pct_irr,
+            "%Rainfed_CWR_met_{crop}": pct_rainfed,
+            "%Combined_CWR_met_{crop}": (pct_irr * irr_area + pct_rainfed * rainfed_area) / total_area,
+            "Irr_yield_{crop}": irr_yield,
+            "Rainfed_yield_{crop}": rainfed_yield,
+            "Avg_yield_{crop}": np.where(total_area == 0, 0,
+                                         (irr_yield * irr_area + rainfed_yield * rainfed_area) / total_area),
+        }
+        if year_type == "crop":
+            return metrics
+
+        # Calendar-year water requirement, production and water productivity metrics
+        avg_yield = metrics["Avg_yield_{crop}"]
+        potential_yield = np.broadcast_to(crop_vectors["potential_yield"], etci.shape).copy()
+        irr_cwr_ha = etci * 10
+        irr_cwr_m3 = etci * irr_area * 10
+        irr_cwa_ha = irr_cwr * 10
+        irr_cwa_m3 = irr_cwr * irr_area * 10
+        rainfed_cwr_ha = etci * 10
+        rainfed_cwr_m3 = etci * 10 * rainfed_area
+        rainfed_cwa_ha = rainfed_cwr * 10
+        rainfed_cwa_m3 = rainfed_cwr * 10 * rainfed_area
+        combined_cwr_ha = (irr_cwr_ha * irr_area + rainfed_cwr_ha * rainfed_area) / total_area
+        combined_cwa_ha = (irr_cwa_ha * irr_area + rainfed_cwa_ha * rainfed_area) / total_area
+        potential_irr = (potential_yield * irr_area) / 1000
+        potential_rainfed = (potential_yield * rainfed_area) / 1000
+        potential_combined = (potential_yield * total_area) / 1000
+        ae_crop_soil = totals["AE_crop"] + totals["AE_soil"]
+        iwr_met = np.where(irr_area == 0, 0, irr_met)
+        yield_irr = irr_yield * potential_yield
+        yield_rainfed = rainfed_yield * potential_yield
+        water_use_total = ae_crop_soil + ((totals["IWR"] * iwr_met) / crop_vectors["final_eff"])
+
+        metrics.update({
+            "IWR_met_{crop}": iwr_met,
+            "Irr_CWR_{crop}(cu.m/ha)": irr_cwr_ha,
+            "Irr_CWR_{crop}(cu.m)": irr_cwr_m3,
+            "Irr_CWA_{crop}(cu.m/ha)": irr_cwa_ha,
+            "Irr_CWA_{crop}(cu.m)": irr_cwa_m3,
+            "Rainfed_CWR_{crop}(cu.m/ha)": rainfed_cwr_ha,
+            "Rainfed_CWR_{crop}(cu.m)": rainfed_cwr_m3,
+            "Rainfed_CWA_{crop}(cu.m/ha)": rainfed_cwa_ha,
+            "Rainfed_CWA_{crop}(cu.m)": rainfed_cwa_m3,
+            "Combined CWR_{crop}(cu.m/ha)": combined_cwr_ha,
+            "Combined CWR_{crop}(cu.m)": (irr_cwr_m3 * irr_area + rainfed_cwr_m3 * rainfed_area) / total_area,
+            "Combined CWA_{crop}(cu.m/ha)": combined_cwa_ha,
+            "Combined CWA_{crop}(cu.m)": (irr_cwa_m3 * irr_area + rainfed_cwa_m3 * rainfed_area) / total_area,
+            "Potential_Yield_{crop} (Kg/ha)": potential_yield,
+            "Potential_Irr_Production_{crop}(tonnes)": potential_irr,
+            "Total_Irr_Production_{crop}": potential_irr * irr_yield,
+            "Potential_Rf_Production_{crop}(tonnes)": potential_rainfed,
+            "Total_Rf_Production_{crop}": potential_rainfed * rainfed_yield,
+            "Potential_combined_Production_{crop}(tonnes)": potential_combined,
+            "Total_combined_Production_{crop}": potential_combined * avg_yield,
+            "Potential_WP_{crop} (kg/cu.m)": potential_yield / combined_cwr_ha,
+            "Combined_WP_{crop} (kg/cu.m)": (avg_yield * potential_yield) / combined_cwa_ha,
+            "AE_crop_soil_{crop}(mm)": ae_crop_soil,
+            "Yield_Irr_{crop} (kg/ha)": yield_irr,
+            "Yield_rf_{crop} (kg/ha)": yield_rainfed,
+            "Actual_Rainfed_WP_{crop} (kg/cu.m)": yield_rainfed / (rainfed_cwr * 10),
+            "Water_use_total_{crop} [ETA + IWR/eff]": water_use_total,
+            "Actual Irrigated WP (kg/ha)_{crop}": yield_irr / (water_use_total * 10),
+        })
+    return metrics
+
+
+# yield_engine.py - Function 004: Converts years x crops metric matrices to wide columns, one block of metrics per crop
+# Interactions: None
+def metrics_to_columns(metrics, crops):
+    return {template.format(crop=crop): values[:, j]
+            for j, crop in enumerate(crops) for template, values in metrics.items()}
+
+
+# yield_engine.py - Function 005: Computes area-weighted averages across crops as matrix-vector products
+# Interactions: numpy
+def calc_area_weighted_averages(df_year, df_cc, crops, yield_columns, other_columns, yield_scale=1):
+    crops = list(crops)
+    n_years = len(df_year)
+
+    def weighted_sum(template, area_column):
+        # Crops whose column is missing carry no weight
+        columns = [template.format(crop=crop) for crop in crops]
+        present = np.array([col in df_year.columns for col in columns], dtype=bool)
+        if not present.any():
+            return np.zeros(n_years, dtype=np.float64)
+        values = df_year[[col for col, keep in zip(columns, present) if keep]].to_numpy(dtype=np.float64)
+        areas = df_cc.loc[crops, area_column].to_numpy(dtype=np.float64)[present]
+        return values @ areas
+
+    averages = {}
+    weighted_by_area = {"Rainfed_Area": np.zeros(n_years), "Irr_Area": np.zeros(n_years)}
+    for output_column, (yield_template, area_column) in yield_columns.items():
+        total_weighted_yield = weighted_sum(yield_template, area_column)
+        if area_column in weighted_by_area:
+            weighted_by_area[area_column] = weighted_by_area[area_column] + total_weighted_yield
+        total_area = df_cc[area_column].sum()
+        averages[output_column] = ((total_weighted_yield / total_area) * yield_scale if total_area > 0
+                                   else np.zeros(n_years))
+
+    total_area = df_cc["Area"].sum()
+    for output_column, col_template in other_columns.items():
+        averages[output_column] = weighted_sum(col_template, "Area") / (total_area if total_area > 0 else 1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        averages["Drought Proofing"] = (weighted_by_area["Rainfed_Area"] + weighted_by_area["Irr_Area"]) / (
+            df_cc["Rainfed_Area"].sum() + df_cc["Irr_Area"].sum())
+    return averages
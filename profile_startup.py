@@ -0,0 +1,97 @@
+"""
+Start-up profile for drought proofing tool command line
+
+This module contains functions for timing the command line paths that do not run the model:
+- Wall-clock start-up of each path over repeated runs, checked against the start-up budget
+- Slowest imports of each path from python -X importtime
+- The full model import chain as a reference
+
+Usage:
+    python3 profile_startup.py            # 5 runs per path
+    python3 profile_startup.py --runs 10
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Benchmarks interpreter start-up and import time of the CLI paths that return without running the model
+# ========================================
+
+import os
+import sys
+import time
+import statistics
+import subprocess
+
+
+# Start-up budget (ms) for CLI paths that do not run the model
+STARTUP_BUDGET_MS = 200
+# CLI paths held to the budget, as arguments after the interpreter
+CLI_PATHS = {
+    "run.py --help": ["run.py", "--help"],
+    "run.py --list": ["run.py", "--list"],
+    "run.py invalid scenario": ["run.py", "x"],
+    "converter.py usage": ["converter.py"],
+    "converter.py invalid scenario": ["converter.py", "9"],
+}
+# Paths reported for reference only
+REFERENCE_PATHS = {
+    "interpreter only": ["-c", "pass"],
+    "model import": ["-c", "import orchestrator.main_controller"],
+}
+
+
+# profile_startup.py - Function 001: Times one CLI path over repeated runs in fresh interpreters
+# Interactions: subprocess, time, os, sys
+def time_cli_path(args, runs=5):
+    root = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=root, capture_output=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+# profile_startup.py - Function 002: Returns the slowest imports of one CLI path by cumulative import time
+# Interactions: subprocess, os, sys
+def read_import_profile(args, top=5):
+    root = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=root, capture_output=True, text=True)
+    imports = []
+    # Lines read "import time: self [us] | cumulative [us] | package"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting depth is kept in the name's indentation, so only top-level imports are ranked
+        if name.startswith(" ") and not name.startswith("  "):
+            imports.append((int(cumulative) / 1000, name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+# profile_startup.py - Function 003: Profiles every CLI path and reports it against the start-up budget
+# Interactions: time_cli_path, read_import_profile, statistics
+def profile_startup(runs=5, top=5):
+    medians = {}
+    over_budget = []
+    for label, args in {**CLI_PATHS, **REFERENCE_PATHS}.items():
+        median = statistics.median(time_cli_path(args, runs))
+        medians[label] = median
+        if label in CLI_PATHS:
+            status = "ok" if median <= STARTUP_BUDGET_MS else "OVER BUDGET"
+            if median > STARTUP_BUDGET_MS:
+                over_budget.append(label)
+        else:
+            status = "reference"
+        print(f"{label:<32} {median:8.1f} ms  {status}")
+        for cumulative_ms, name in read_import_profile(args, top):
+            print(f"    {cumulative_ms:8.1f} ms  import {name}")
+    print(f"{len(CLI_PATHS) - len(over_budget)}/{len(CLI_PATHS)} CLI paths within {STARTUP_BUDGET_MS} ms")
+    return medians, over_budget
+
+
+if __name__ == "__main__":
+    run_count = int(sys.argv[sys.argv.index("--runs") + 1]) if "--runs" in sys.argv else 5
+    _, slow_paths = profile_startup(run_count)
+    sys.exit(1 if slow_paths else 0)
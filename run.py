@@ -2,7 +2,7 @@
 Drought Proofing Tool - Main Runner Script
 
 Usage:
-    python3 run.py [scenario_number]
+    python3 run.py [scenario_number] [one mode option with its options]
 
 Examples:
     python3 run.py     # Runs baseline scenario (0)
@@ -10,6 +10,40 @@ Examples:
     python3 run.py 2   # Runs scenario 2
     python3 run.py 3   # Runs scenario 3
 
+Rainfall ensemble (percentile bands over bootstrapped rainfall years):
+    python3 run.py 0 --ensemble 100          # 100 members, one process
+    python3 run.py 0 --ensemble 1000 --workers 8
+    python3 run.py 0 --ensemble 500 --weather generator --seed 7   # synthetic weather members
+
+Intervention sizing optimizer (NPV vs drought proofing Pareto front, optional capital budget):
+    python3 run.py 0 --optimize 2000 --bounds Farm_Pond_Vol=0:200000,Check_Dam_Vol=0:200000 --budget 50000000
+
+Global sensitivity analysis (ranked Morris or Sobol indices of soil, runoff, aquifer and irrigation parameters):
+    python3 run.py 0 --sensitivity morris --samples 10
+    python3 run.py 0 --sensitivity sobol --samples 64 --workers 8 --seed 1
+
+Calibration against observed monthly series (Date/value CSVs; NSE or RMSE, derivative-free search):
+    python3 run.py 0 --calibrate Water_Table_Depth=obs/water_level.csv --evaluations 100
+    python3 run.py 0 --calibrate 'Qom(m^3)=obs/runoff.csv' --objective rmse --parameters Builtup_cn2,Forest_cn2
+
+Multi-site batch (one row per site in a site manifest; per-site outputs and a cross-site summary):
+    python3 run.py 0 --batch sites.csv --workers 8
+    python3 run.py 0 --batch sites.csv --output /data/batch_outputs
+    python3 run.py 0 --batch sites.csv --checkpoint-stages yes   # also checkpoint stages within each site
+    python3 run.py 0 --batch sites.csv --resume no               # rerun sites the run ledger has as completed
+
+Sharded batch (plan shards, run each shard in its own process or node, then merge):
+    python3 run.py 0 --shard-plan sites.csv --shards 16 --batch-dir /data/batch --scenarios 0,1,2
+    python3 run.py 0 --shard-run /data/batch --shard 3 --workers 4
+    python3 run.py 0 --shard-merge /data/batch
+
+Local model service (warm inputs, HTTP/JSON on localhost):
+    python3 run.py 0 --serve 8765 --workers 2
+
+Help and scenario listing (return without loading the model):
+    python3 run.py --help
+    python3 run.py --list
+
 Running Multiple Scenarios in Parallel:
     # Open separate terminals and run:
     python3 run.py 1 &   # Scenario 1 in background
@@ -22,34 +56,92 @@ Running Multiple Scenarios in Parallel:
 # ========================================
 
 import os
+import re
 import sys
-from orchestrator.main_controller import run_dr_pf_routines, save_dataframes_scenario
-
-# Get scenario number from command line argument, default to 0 (baseline)
-if len(sys.argv) > 1:
-    try:
-        scenario = int(sys.argv[1])
-    except ValueError:
-        print("Error: Scenario must be a number (0, 1, 2, or 3)")
-        print("Usage: python3 run.py [scenario_number]")
-        print("Examples:")
-        print("  python3 run.py     # Runs baseline scenario (0)")
-        print("  python3 run.py 1   # Runs scenario 1")
-        print("  python3 run.py 2   # Runs scenario 2")
-        print("  python3 run.py 3   # Runs scenario 3")
-        sys.exit(1)
-else:
-    scenario = 0  # Default to baseline scenario
+import argparse
+
+# The model modules (pandas, numpy and every bucket) are imported below only once a run is certain,
+# so --help, --list and argument errors return without loading them
 
-counter = [0]
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("scenario", nargs="?", type=int, default=0, help="scenario number, 0 for the baseline")
+# One run mode per command line; a plain scenario run when none is given
+modes = parser.add_mutually_exclusive_group()
+modes.add_argument("--list", action="store_true", help="list the scenarios that have intervention files")
+modes.add_argument("--ensemble", type=int, metavar="N", help="rainfall ensemble of N members")
+modes.add_argument("--optimize", type=int, metavar="N", help="intervention sizing search over N candidates")
+modes.add_argument("--sensitivity", choices=["morris", "sobol"], help="global sensitivity analysis method")
+modes.add_argument("--calibrate", metavar="SERIES=PATH,...", help="calibrate against observed monthly series")
+modes.add_argument("--batch", metavar="MANIFEST", help="run every site of a site manifest")
+modes.add_argument("--shard-plan", metavar="MANIFEST", help="split a site manifest into shards")
+modes.add_argument("--shard-run", metavar="DIR", help="run one shard of a planned batch")
+modes.add_argument("--shard-merge", metavar="DIR", help="merge the shard results of a planned batch")
+modes.add_argument("--serve", type=int, metavar="PORT", help="answer intervention what-if queries on localhost")
+options = parser.add_argument_group("mode options")
+options.add_argument("--workers", type=int, help="worker processes (threads for --serve)")
+options.add_argument("--seed", type=int, help="random seed of --ensemble, --optimize and --sensitivity")
+options.add_argument("--weather", choices=["bootstrap", "generator"], default="bootstrap",
+                     help="--ensemble members from bootstrapped years or the weather generator")
+options.add_argument("--bounds", metavar="NAME=LOW:HIGH,...", help="--optimize search ranges")
+options.add_argument("--budget", type=float, help="--optimize capital budget")
+options.add_argument("--samples", type=int, default=10, help="--sensitivity trajectories or Saltelli blocks")
+options.add_argument("--objective", choices=["nse", "rmse"], default="nse", help="--calibrate objective")
+options.add_argument("--evaluations", type=int, default=100, help="--calibrate model evaluations")
+options.add_argument("--parameters", metavar="P,...", help="--calibrate parameters")
+options.add_argument("--output", metavar="DIR", help="--batch output folder")
+options.add_argument("--resume", choices=["yes", "no"], default="yes", help="--batch skips completed sites")
+options.add_argument("--checkpoint-stages", choices=["yes", "no"], default="no",
+                     help="--batch and --shard-run also checkpoint stages within each site")
+options.add_argument("--shards", type=int, help="--shard-plan number of shards")
+options.add_argument("--batch-dir", metavar="DIR", help="--shard-plan batch folder")
+options.add_argument("--scenarios", metavar="S,...", help="--shard-plan scenarios of every site")
+options.add_argument("--shard", type=int, metavar="K", help="--shard-run shard number")
+args = parser.parse_args()
+
+# Options that only one mode reads are refused elsewhere instead of being silently ignored
+mode_options = {
+    "bounds": ["optimize"], "budget": ["optimize"], "samples": ["sensitivity"], "objective": ["calibrate"],
+    "evaluations": ["calibrate"], "parameters": ["calibrate"], "weather": ["ensemble"],
+    "output": ["batch"], "resume": ["batch"], "checkpoint_stages": ["batch", "shard_run"],
+    "shards": ["shard_plan"], "batch_dir": ["shard_plan"], "scenarios": ["shard_plan"], "shard": ["shard_run"],
+    "seed": ["ensemble", "optimize", "sensitivity"],
+    "workers": ["ensemble", "optimize", "sensitivity", "batch", "shard_run", "serve"],
+}
+for option, option_modes in mode_options.items():
+    option_set = getattr(args, option) != parser.get_default(option)
+    if option_set and all(getattr(args, mode) is None for mode in option_modes):
+        parser.error(f"--{option.replace('_', '-')} only applies to "
+                     f"{', '.join('--' + mode.replace('_', '-') for mode in option_modes)}")
+if args.optimize is not None and not args.bounds:
+    parser.error("--optimize needs --bounds")
+if args.shard_plan is not None and (args.shards is None or args.batch_dir is None):
+    parser.error("--shard-plan needs --shards and --batch-dir")
+if args.shard_run is not None and args.shard is None:
+    parser.error("--shard-run needs --shard")
+
+# List the scenarios that have intervention files in csv_inputs
+if args.list:
+    csv_dir = os.path.join(os.getcwd(), "Datasets", "Inputs", "csv_inputs")
+    csv_files = sorted(os.listdir(csv_dir)) if os.path.isdir(csv_dir) else []
+    print("Available scenarios:")
+    if "interventions_baseline.csv" in csv_files:
+        print("  0  Baseline (interventions_baseline.csv)")
+    scenario_files = {}
+    for name in csv_files:
+        match = re.fullmatch(r"interventions_scenario_(\d+)(_correct)?\.csv", name)
+        if match:
+            scenario_files.setdefault(int(match.group(1)), []).append(name)
+    for scenario_no, names in sorted(scenario_files.items()):
+        print(f"  {scenario_no}  Scenario {scenario_no} ({', '.join(names)})")
+    sys.exit(0)
+
+scenario = args.scenario
 base_path = os.getcwd()
 
 print(f"Running scenario {scenario}...")
 
 # Auto-convert user-friendly "correct" files to system key-value files
 if scenario > 0:  # Only for intervention scenarios, not baseline
-    import subprocess
-    import os
     correct_file = f"Datasets/Inputs/csv_inputs/interventions_scenario_{scenario}_correct.csv"
     keyvalue_file = f"Datasets/Inputs/csv_inputs/interventions_scenario_{scenario}.csv"
     
@@ -57,24 +149,85 @@ if scenario > 0:  # Only for intervention scenarios, not baseline
     if os.path.exists(correct_file):
         print(f"Auto-converting interventions_scenario_{scenario}_correct.csv...")
         try:
-            # Run converter for this specific scenario
-            result = subprocess.run(['python', 'converter.py', str(scenario)], 
-                                  capture_output=True, text=True, cwd=base_path)
-            if result.returncode == 0:
-                print(f"✅ Successfully converted scenario {scenario}")
-            else:
-                print(f"⚠️  Converter warning: {result.stderr}")
-                print("Proceeding with existing key-value file...")
+            # Convert in this process; a converter subprocess would pay the pandas start-up a second time
+            from converter import convert_scenario
+            convert_scenario(scenario)
         except Exception as e:
             print(f"⚠️  Auto-conversion failed: {e}")
             print("Proceeding with existing key-value file...")
     else:
         print(f"No correct file found, using existing key-value file")
 
-# Copy the appropriate scenario intervention file to interventions.csv
-from orchestrator.main_controller import copy_scenario_intervention_file
-copy_scenario_intervention_file(scenario, base_path)
+# A model run is certain from here, so the model modules are loaded now
+from orchestrator.main_controller import run_dr_pf_routines, save_dataframes_scenario, create_scenario_context
+from shared.run_context import activate_run_context
+
+# Optional service mode: --serve PORT [--workers W] answers intervention what-if queries until interrupted
+if args.serve is not None:
+    from orchestrator.model_service import serve_model
+    serve_model(base_path, port=args.serve, scenario_num=scenario, workers=args.workers or 2)
+    sys.exit(0)
+
+# Optional batch mode: --batch MANIFEST [--workers W] [--output DIR] [--resume yes|no] [--checkpoint-stages yes|no]
+# runs every site of a site manifest, skipping sites the run ledger already has as completed
+if args.batch is not None:
+    from orchestrator.batch_controller import run_site_batch
+    run_site_batch(args.batch, base_path, 'calendar', scenario, workers=args.workers or 1, output_dir=args.output,
+                   resume=args.resume == "yes", checkpoint_stages=args.checkpoint_stages == "yes")
+    sys.exit(0)
 
-results = run_dr_pf_routines('csv', base_path, 'calendar', counter, scenario)
-saved_files = save_dataframes_scenario(scenario, base_path, results, 'csv')
-print(f"Completed! {len(saved_files)} files saved")
\ No newline at end of file
+# Optional sharded batch steps: --shard-plan MANIFEST --shards N --batch-dir DIR [--scenarios S,...],
+# --shard-run DIR --shard K [--workers W] [--checkpoint-stages yes|no] and --shard-merge DIR
+if args.shard_plan is not None or args.shard_run is not None or args.shard_merge is not None:
+    from orchestrator.shard_controller import create_shard_plan, run_shard, merge_shard_results
+    if args.shard_plan is not None:
+        create_shard_plan(args.shard_plan, args.batch_dir, args.shards,
+                          [int(s) for s in args.scenarios.split(",")] if args.scenarios else None, scenario)
+    elif args.shard_run is not None:
+        run_shard(args.shard_run, args.shard, base_path, 'calendar', workers=args.workers or 1,
+                  checkpoint_stages=args.checkpoint_stages == "yes")
+    else:
+        merge_shard_results(args.shard_merge)
+    sys.exit(0)
+
+# Constants, input caches and run state for this scenario live on its run context, which reads
+# interventions_scenario_N.csv directly; service, batch and shard runs build their own contexts
+context = create_scenario_context('csv', base_path, scenario)
+
+# Optional rainfall ensemble mode: --ensemble N [--workers W] [--seed S] [--weather bootstrap|generator]
+if args.ensemble is not None:
+    from orchestrator.ensemble_controller import run_rainfall_ensemble
+    results = run_rainfall_ensemble('csv', base_path, context, scenario, n_members=args.ensemble,
+                                    seed=args.seed, workers=args.workers or 1,
+                                    weather_generator=args.weather == "generator")
+# Optional optimizer mode: --optimize N --bounds NAME=LOW:HIGH,... [--budget B] [--seed S] [--workers W]
+elif args.optimize is not None:
+    from orchestrator.intervention_optimizer import optimize_interventions
+    bounds = {}
+    for bound in args.bounds.split(","):
+        if bound:
+            name, limits = bound.split("=")
+            low, high = limits.split(":")
+            bounds[name] = (float(low), float(high))
+    results = optimize_interventions(base_path, bounds, n_candidates=args.optimize, seed=args.seed,
+                                     budget=args.budget, scenario_num=scenario, workers=args.workers or 1)
+# Optional sensitivity mode: --sensitivity morris|sobol [--samples N] [--workers W] [--seed S]
+elif args.sensitivity is not None:
+    from orchestrator.sensitivity_controller import run_sensitivity_analysis
+    results = run_sensitivity_analysis('csv', base_path, 'calendar', context, scenario, method=args.sensitivity,
+                                       n_samples=args.samples, seed=args.seed, workers=args.workers or 1)
+# Optional calibration mode: --calibrate SERIES=PATH,... [--objective nse|rmse] [--evaluations N] [--parameters P,...]
+elif args.calibrate is not None:
+    from orchestrator.calibration_controller import calibrate_parameters
+    observations = dict(series.split("=", 1) for series in args.calibrate.split(",") if series)
+    results = calibrate_parameters('csv', base_path, observations, context, scenario,
+                                   parameters=args.parameters.split(",") if args.parameters else None,
+                                   objective=args.objective, max_evaluations=args.evaluations)
+else:
+    from shared.dtype_schema import report_frame_memory
+    results = run_dr_pf_routines('csv', base_path, 'calendar', context, scenario)
+    # The memory report is printed once per command line run, not on every in-memory evaluation
+    report_frame_memory({name: results[f"{name}.csv"] for name in ["df_dd", "df_crop", "df_mm"]})
+with activate_run_context(context):
+    saved_files = save_dataframes_scenario(scenario, base_path, results, 'csv')
+print(f"Completed! {len(saved_files)} files saved")
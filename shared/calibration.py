@@ -0,0 +1,139 @@
+"""
+Calibration for drought proofing tool
+
+This module contains functions for fitting model parameters to observed series:
+- Observed monthly series read from a Date/value CSV
+- Simulated and observed values paired on common months
+- Nash-Sutcliffe efficiency and root mean square error
+- Bounded Nelder-Mead search that needs no derivatives
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Scores simulated monthly series against observations (NSE, RMSE) and searches parameter bounds with a derivative-free Nelder-Mead simplex
+# ========================================
+
+import numpy as np
+import pandas as pd
+
+
+# Objectives accepted by the calibration, each turned into a loss that is minimised
+CALIBRATION_OBJECTIVES = ["nse", "rmse"]
+# Size of the starting simplex as a fraction of each parameter's range
+INITIAL_SIMPLEX_STEP = 0.1
+
+
+# calibration.py - Function 001: Reads an observed series from a Date/value CSV as monthly means
+# Interactions: pandas
+def read_observed_series(file_path, value_column=None, date_column="Date"):
+    df_obs = pd.read_csv(file_path)
+    if date_column not in df_obs.columns:
+        raise ValueError(f"Observed series {file_path} has no '{date_column}' column")
+    if value_column is None:
+        other_columns = [col for col in df_obs.columns if col != date_column]
+        if len(other_columns) != 1:
+            raise ValueError(f"Observed series {file_path} has several value columns; name the one to use")
+        value_column = other_columns[0]
+    values = pd.to_numeric(df_obs[value_column], errors="coerce")
+    months = pd.to_datetime(df_obs[date_column]).dt.to_period("M")
+    # Daily or repeated readings are averaged so every month has one observation
+    return values.groupby(months).mean().dropna()
+
+
+# calibration.py - Function 002: Pairs simulated monthly values with the observations of the same months
+# Interactions: pandas, numpy
+def pair_with_observed(sim_dates, sim_values, observed):
+    simulated = pd.Series(np.asarray(sim_values, dtype=np.float64),
+                          index=pd.DatetimeIndex(sim_dates).to_period("M"))
+    common = observed.index.intersection(simulated.index)
+    if len(common) == 0:
+        raise ValueError("Observed series shares no months with the model run")
+    return simulated.loc[common].to_numpy(), observed.loc[common].to_numpy(dtype=np.float64)
+
+
+# calibration.py - Function 003: Calculates the Nash-Sutcliffe efficiency of simulated against observed values
+# Interactions: numpy
+def calc_nse(simulated, observed):
+    variance = np.sum((observed - np.mean(observed)) ** 2)
+    if variance == 0:
+        raise ValueError("NSE needs observations that vary")
+    return 1 - np.sum((simulated - observed) ** 2) / variance
+
+
+# calibration.py - Function 004: Calculates the root mean square error of simulated against observed values
+# Interactions: numpy
+def calc_rmse(simulated, observed):
+    return float(np.sqrt(np.mean((simulated - observed) ** 2)))
+
+
+# calibration.py - Function 005: Returns the loss of one objective; 1 - NSE so both objectives are minimised
+# Interactions: calc_nse, calc_rmse
+def calc_objective_loss(simulated, observed, objective):
+    if objective == "nse":
+        return 1 - calc_nse(simulated, observed)
+    if objective == "rmse":
+        return calc_rmse(simulated, observed)
+    raise ValueError(f"Objective must be one of {CALIBRATION_OBJECTIVES}, got '{objective}'")
+
+
+# calibration.py - Function 006: Minimises a function within bounds with the Nelder-Mead simplex
+# Interactions: numpy
+def minimize_nelder_mead(loss_function, x0, lows, highs, max_evaluations=100, tolerance=1e-4):
+    if int(max_evaluations) < 1:
+        raise ValueError(f"Calibration needs at least one evaluation, got {max_evaluations}")
+    lows = np.asarray(lows, dtype=np.float64)
+    highs = np.asarray(highs, dtype=np.float64)
+    span = np.where(highs > lows, highs - lows, 1.0)
+    evaluations = []
+
+    # The simplex moves on the unit cube so every parameter gets the same step sizes; points are clipped to the bounds
+    def evaluate(unit_point):
+        unit_point = np.clip(unit_point, 0, 1)
+        # The budget is checked before every single evaluation; points past it are not run and rank last
+        if len(evaluations) >= max_evaluations:
+            return unit_point, np.inf
+        point = lows + unit_point * span
+        loss = float(loss_function(point))
+        # Failed or undefined trials rank last
+        loss = loss if np.isfinite(loss) else np.inf
+        evaluations.append((point, loss))
+        return unit_point, loss
+
+    n_params = len(lows)
+    start = (np.asarray(x0, dtype=np.float64) - lows) / span
+    simplex = [evaluate(start)]
+    for i in range(n_params):
+        vertex = simplex[0][0].copy()
+        vertex[i] += INITIAL_SIMPLEX_STEP if vertex[i] + INITIAL_SIMPLEX_STEP <= 1 else -INITIAL_SIMPLEX_STEP
+        simplex.append(evaluate(vertex))
+
+    while len(evaluations) < max_evaluations:
+        simplex.sort(key=lambda vertex: vertex[1])
+        losses = np.array([vertex[1] for vertex in simplex])
+        points = np.array([vertex[0] for vertex in simplex])
+        if np.max(np.abs(points[1:] - points[0])) < tolerance and losses[-1] - losses[0] < tolerance:
+            break
+        centroid = points[:-1].mean(axis=0)
+        reflected = evaluate(centroid + (centroid - points[-1]))
+        if reflected[1] < losses[0]:
+            expanded = evaluate(centroid + 2 * (centroid - points[-1]))
+            simplex[-1] = expanded if expanded[1] < reflected[1] else reflected
+        elif reflected[1] < losses[-2]:
+            simplex[-1] = reflected
+        else:
+            # Contract towards the better of the worst vertex and its reflection
+            worst = reflected if reflected[1] < losses[-1] else simplex[-1]
+            contracted = evaluate(centroid + 0.5 * (worst[0] - centroid))
+            if contracted[1] < worst[1]:
+                simplex[-1] = contracted
+            else:
+                # Shrink every vertex towards the best one
+                simplex = [simplex[0]] + [evaluate(points[0] + 0.5 * (point - points[0])) for point in points[1:]]
+
+    best = min(range(len(evaluations)), key=lambda i: evaluations[i][1])
+    return {
+        "x": evaluations[best][0],
+        "loss": evaluations[best][1],
+        "evaluations": evaluations,
+    }
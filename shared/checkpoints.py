@@ -0,0 +1,124 @@
+"""
+Run checkpoints for drought proofing tool
+
+This module contains functions for resuming long batch runs:
+- Input hashes of a unit's input files, so changed inputs are never taken as finished
+- A model hash of the resolved constants and model source, so edited configuration or code is never resumed
+- An append-only run ledger of the completed (site, scenario, input hash) units
+- Per-stage checkpoints of the prepared and balance stage frames of a unit in progress
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Records finished batch units in a run ledger and keeps stage checkpoints of units in progress so a batch that dies midway resumes where it stopped
+# ========================================
+
+import os
+import json
+import glob
+import pickle
+import hashlib
+
+
+# Packages whose source decides a unit's results; an edit to any of them invalidates the ledger and checkpoints
+MODEL_CODE_PACKAGES = ["shared", "orchestrator", "surface_water_bucket", "soil_storage_bucket",
+                       "aquifer_storage_bucket", "outputs"]
+# Folder holding the model packages
+MODEL_CODE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# checkpoints.py - Function 001: Calculates the hash of a unit's input files and run settings
+# Interactions: hashlib
+def calc_input_hash(file_paths, extra=(), digests=None):
+    # Shared files (climate, databases) are hashed once per batch through the digests cache
+    digests = {} if digests is None else digests
+    unit_hash = hashlib.sha256()
+    for key in sorted(file_paths):
+        path = file_paths[key]
+        if not path or not os.path.exists(path):
+            continue
+        if path not in digests:
+            with open(path, "rb") as file:
+                digests[path] = hashlib.sha256(file.read()).hexdigest()
+        unit_hash.update(f"{key}={digests[path]};".encode())
+    for value in extra:
+        unit_hash.update(f"{value};".encode())
+    return unit_hash.hexdigest()[:16]
+
+
+# checkpoints.py - Function 001A: Calculates the hash of the resolved model constants and the model source files
+# Interactions: hashlib, glob, os
+def calc_model_hash(constants, code_root=MODEL_CODE_ROOT):
+    model_hash = hashlib.sha256()
+    for name in sorted(constants):
+        model_hash.update(f"{name}={constants[name]!r};".encode())
+    for package in MODEL_CODE_PACKAGES:
+        for path in sorted(glob.glob(os.path.join(code_root, package, "**", "*.py"), recursive=True)):
+            with open(path, "rb") as file:
+                model_hash.update(f"{os.path.relpath(path, code_root)}=".encode() + file.read())
+    return model_hash.hexdigest()[:16]
+
+
+# checkpoints.py - Function 002: Reads the completed units of a run ledger, the latest entry of each unit winning
+# Interactions: json, os
+def read_run_ledger(ledger_path):
+    completed = {}
+    if not os.path.exists(ledger_path):
+        return completed
+    with open(ledger_path) as ledger:
+        for line in ledger:
+            # A line cut short by a crash is ignored; its unit simply runs again
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            completed[(entry["Site"], int(entry["Scenario"]))] = entry
+    return completed
+
+
+# checkpoints.py - Function 003: Appends one completed unit to the run ledger
+# Interactions: json, os
+def append_ledger_entry(ledger_path, entry):
+    os.makedirs(os.path.dirname(os.path.abspath(ledger_path)), exist_ok=True)
+    # One line per write in append mode, so several worker processes can share the ledger
+    with open(ledger_path, "a") as ledger:
+        ledger.write(json.dumps(entry) + "\n")
+        ledger.flush()
+        os.fsync(ledger.fileno())
+
+
+# checkpoints.py - Function 004: Saves the frames of one completed stage of a unit
+# Interactions: pickle, os
+def save_stage_checkpoint(checkpoint_dir, stage, input_hash, stages):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    checkpoint_path = os.path.join(checkpoint_dir, f"{stage}.pkl")
+    temp_path = f"{checkpoint_path}.tmp"
+    with open(temp_path, "wb") as file:
+        pickle.dump({"input_hash": input_hash, "stages": stages}, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, checkpoint_path)
+
+
+# checkpoints.py - Function 005: Loads a stage checkpoint, or None when it is missing or from other inputs
+# Interactions: pickle, os
+def load_stage_checkpoint(checkpoint_dir, stage, input_hash):
+    checkpoint_path = os.path.join(checkpoint_dir, f"{stage}.pkl")
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, "rb") as file:
+        checkpoint = pickle.load(file)
+    return checkpoint["stages"] if checkpoint["input_hash"] == input_hash else None
+
+
+# checkpoints.py - Function 006: Removes the stage checkpoints of a finished unit
+# Interactions: glob, os
+def clear_stage_checkpoints(checkpoint_dir, checkpoint_root):
+    for checkpoint_path in glob.glob(os.path.join(checkpoint_dir, "*.pkl")):
+        os.remove(checkpoint_path)
+    # Empty unit and site folders are removed up to the first folder still in use, never above the checkpoint root
+    checkpoint_root = os.path.abspath(checkpoint_root)
+    folder = os.path.abspath(checkpoint_dir)
+    while (folder != checkpoint_root and os.path.commonpath([folder, checkpoint_root]) == checkpoint_root
+           and os.path.isdir(folder) and not os.listdir(folder)):
+        os.rmdir(folder)
+        folder = os.path.dirname(folder)
@@ -0,0 +1,125 @@
+"""
+Indexed crop database for drought proofing tool
+
+This module contains functions for holding the crop database as typed arrays:
+- Crop id index built once from the crop database rows
+- Numeric crop parameters pre-parsed to float arrays indexed by crop id
+- Growth stage lengths pre-rounded to whole days
+- Text crop attributes (cover type, treatment type) indexed by crop id
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Parses the crop database once into crop-id indexed arrays so stages look up crop parameters without filtering or re-parsing strings
+# ========================================
+
+import math
+import numpy as np
+import pandas as pd
+
+
+# Numeric crop parameters parsed to float arrays (stage lengths, Kc values, root depths, p, Ky, yield, price)
+CROP_NUMERIC_FIELDS = [
+    "Total Growth Days",
+    "L_ini_ratio", "L_dev_ratio", "L_mid_ratio", "L_late_ratio",
+    "L_ini_days", "L_dev_days", "L_mid_days", "L_late_days",
+    "kc_ini", "kc_dev", "kc_mid", "kc_end",
+    "Ky Values", "Min root depth", "Max root depth", "Depletion fraction - p",
+    "Yield (tonne/ha)", "Price (Rs/tonne)",
+]
+
+# Text crop attributes kept as object arrays
+CROP_TEXT_FIELDS = ["Cover Type", "Treatment Type", "Crop Type", "Crop Sown Type", "HSC"]
+
+# Growth stage length columns that are rounded to whole days
+CROP_STAGE_FIELDS = ["L_ini_days", "L_dev_days", "L_mid_days", "L_late_days"]
+
+
+# crop_database.py - Function 001: Rounds a stage length to whole days, rounding up only above half a day
+# Interactions: math
+def round_stage_days(days):
+    if (days % 1) > 0.5:
+        return math.ceil(days)
+    return int(days)
+
+
+# crop_database.py - Function 002: Builds the crop-id indexed database from the crop database DataFrame
+# Interactions: round_stage_days, pandas, numpy
+def build_crop_database(crop_df):
+    # The first row for a crop wins, as with the original row filters
+    crop_rows = crop_df.drop_duplicates("Crops").reset_index(drop=True)
+    crops = crop_rows["Crops"].tolist()
+    crop_db = {
+        "crops": crops,
+        "ids": {crop: i for i, crop in enumerate(crops)},
+        "params": {},
+        "raw": {},
+        "text": {},
+        "stage_days": {},
+    }
+    for field in CROP_NUMERIC_FIELDS:
+        if field in crop_rows.columns:
+            crop_db["raw"][field] = crop_rows[field].to_numpy(dtype=object)
+            crop_db["params"][field] = pd.to_numeric(crop_rows[field], errors="coerce").to_numpy(dtype=np.float64)
+    for field in CROP_TEXT_FIELDS:
+        if field in crop_rows.columns:
+            crop_db["text"][field] = crop_rows[field].to_numpy(dtype=object)
+    for field in CROP_STAGE_FIELDS:
+        if field in crop_db["params"]:
+            # -1 marks a stage length that could not be parsed; it is reported when the crop is used
+            crop_db["stage_days"][field] = np.array(
+                [round_stage_days(days) if not np.isnan(days) else -1 for days in crop_db["params"][field]],
+                dtype=np.int64)
+    return crop_db
+
+
+# crop_database.py - Function 003: Returns the crop id for a crop name
+# Interactions: None
+def get_crop_id(crop_db, crop):
+    crop_id = crop_db["ids"].get(crop)
+    if crop_id is None:
+        raise ValueError(f"Selected crop {crop} not found in crop_df")
+    return crop_id
+
+
+# crop_database.py - Function 004: Checks whether a crop is present in the crop database
+# Interactions: None
+def has_crop(crop_db, crop):
+    return crop in crop_db["ids"]
+
+
+# crop_database.py - Function 005: Returns the crop name for a crop id
+# Interactions: None
+def get_crop_name(crop_db, crop_id):
+    return crop_db["crops"][crop_id]
+
+
+# crop_database.py - Function 006: Returns a parsed numeric parameter for a crop id
+# Interactions: None
+def get_crop_param(crop_db, crop_id, field):
+    if field not in crop_db["params"]:
+        raise ValueError(f"Column {field} not found in crop database")
+    value = crop_db["params"][field][crop_id]
+    if np.isnan(value):
+        raise ValueError(f"Invalid {field} value: {crop_db['raw'][field][crop_id]}")
+    return float(value)
+
+
+# crop_database.py - Function 007: Returns a text attribute for a crop id
+# Interactions: None
+def get_crop_text(crop_db, crop_id, field):
+    if field not in crop_db["text"]:
+        return None
+    return crop_db["text"][field][crop_id]
+
+
+# crop_database.py - Function 008: Returns the rounded length in days of one growth stage for a crop id
+# Interactions: None
+def get_stage_days(crop_db, crop_id, stage_column):
+    if stage_column not in crop_db["stage_days"]:
+        raise ValueError(f"Column {stage_column} not found in crop database")
+    days = int(crop_db["stage_days"][stage_column][crop_id])
+    if days < 0:
+        raise ValueError(f"Invalid {stage_column} value: {crop_db['raw'][stage_column][crop_id]}")
+    return days
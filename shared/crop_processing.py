@@ -14,7 +14,9 @@ This module contains functions for processing crop-related data:
 
 import pandas as pd
 import numpy as np
-from shared.utilities import safe_crop_conversion, safe_float_conversion, convert_season_data_to_df, convert_columns_to_numeric, to_float
+from shared.utilities import safe_crop_conversion, safe_float_conversion, convert_season_data_to_df, convert_columns_to_numeric, to_float, assign_columns
+from shared.crop_database import get_crop_id, get_crop_param
+from shared.model_calendar import get_sowing_start_days
 from orchestrator.input_collector import collect_inp_variables, collect_int_variables
 from soil_storage_bucket.outflux.evapotranspiration import apply_eva_red, calc_red_soil_evap
 from soil_storage_bucket.processing.crop_coefficients import process_crops
@@ -342,65 +344,44 @@ def combine_and_normalize_attributes(var_attribute_names,inp_source,master_path,
 
 
 # crop_processing.py - Function 005: Applies irrigation efficiency values based on intervention areas
-# Interactions: orchestrator.input_collector.collect_int_variables, shared.utilities.to_float
-def apply_efficiency(row, default_eff_val,inp_source,master_path):
-    int_var = collect_int_variables(inp_source,master_path)
+# Interactions: shared.utilities.to_float, pandas, numpy
+def apply_efficiency(df_cc, default_eff_val, int_var):
+    # (efficiency column, area column, intervention variable); int_var is collected once by the caller
+    efficiency_specs = [
+        ("Eff_Drip", "Drip_Area", "Eff_Drip_irrigation"),
+        ("Eff_Sprinkler", "Sprinkler_Area", "Eff_Sprinkler_irrigation"),
+        ("Eff_Land_Levelling", "Land_Levelling_Area", "Eff_Land_Levelling"),
+        ("Eff_DSR", "DSR_Area", "Eff_Direct_Seeded_Rice"),
+        ("Eff_AWD", "AWD_Area", "Eff_Alternate_Wetting_And_Dry"),
+        ("Eff_SRI", "SRI_Area", "Eff_SRI"),
+        ("Eff_Ridge_Furrow", "Ridge_Furrow_Area", "Eff_Ridge_Furrow_Irrigation"),
+        ("Eff_Deficit", "Deficit_Area", "Eff_Deficit_Irrigation"),
+        ("Eff_BBF", "BBF_Area", "Eff_BBF")
+    ]
     # Apply efficiency values with defaults if area is greater than 0
-    row["Eff_Drip"] = (to_float(int_var["Eff_Drip_irrigation"], default_eff_val["Eff_Drip"]) if to_float(
-        row["Drip_Area"]) > 0 else default_eff_val["Eff_Drip"])/100
-    
-    row["Eff_Sprinkler"] = (to_float(int_var["Eff_Sprinkler_irrigation"],default_eff_val["Eff_Sprinkler"]
-                                    ) if to_float(row["Sprinkler_Area"]) > 0 else default_eff_val["Eff_Sprinkler"])/100
-        
-    row["Eff_Land_Levelling"] = (to_float(int_var["Eff_Land_Levelling"],
-                                                    default_eff_val["Eff_Land_Levelling"]) if to_float(
-        row["Land_Levelling_Area"]) > 0 else default_eff_val["Eff_Land_Levelling"])/100
-                                                        
-    row["Eff_DSR"] = (to_float(int_var["Eff_Direct_Seeded_Rice"], default_eff_val["Eff_DSR"]) if to_float(
-        row["DSR_Area"]) > 0 else default_eff_val["Eff_DSR"])/100
-    
-    row["Eff_AWD"] = (to_float(int_var["Eff_Alternate_Wetting_And_Dry"],
-                                         default_eff_val["Eff_AWD"]) if to_float(
-        row["AWD_Area"]) > 0 else default_eff_val["Eff_AWD"])/100
-                                             
-    row["Eff_SRI"] = (to_float(int_var["Eff_SRI"], default_eff_val["Eff_SRI"]) if to_float(
-        row["SRI_Area"]) > 0 else default_eff_val["Eff_SRI"])/100
-    
-    row["Eff_Ridge_Furrow"] = (to_float(int_var["Eff_Ridge_Furrow_Irrigation"],
-                                                  default_eff_val["Eff_Ridge_Furrow"]) if to_float(
-        row["Ridge_Furrow_Area"]) > 0 else default_eff_val["Eff_Ridge_Furrow"])/100
-                                                      
-    row["Eff_Deficit"] = (to_float(int_var["Eff_Deficit_Irrigation"],
-                                             default_eff_val["Eff_Deficit"]) if to_float(
-        row["Deficit_Area"]) > 0 else default_eff_val["Eff_Deficit"])/100
-                                                 
-    row["Eff_BBF"] = (to_float(int_var["Eff_BBF"], default_eff_val["Eff_BBF"]) if to_float(
-        row["BBF_Area"]) > 0 else default_eff_val["Eff_BBF"])/100
-    return row
+    for eff_col, area_col, int_key in efficiency_specs:
+        default_val = default_eff_val[eff_col]
+        with_intervention = pd.to_numeric(df_cc[area_col], errors="coerce") > 0
+        df_cc[eff_col] = np.where(with_intervention, to_float(int_var[int_key], default_val), default_val) / 100
+    return df_cc
 
 
 # crop_processing.py - Function 006: Retrieves yield response factor and economic data for crops
-# Interactions: numpy, pandas
-def get_ky_value(all_crops, crop_df, df_cc):
+# Interactions: shared.crop_database.get_crop_id, shared.crop_database.get_crop_param, numpy
+def get_ky_value(all_crops, crop_db, df_cc):
     print("FUNCTION 32: get_ky_value() - Getting Ky values for yield calculation")
     df_cc["Ky"] = np.float32(0)  # Set Ky column to float32
     df_cc["Yield (tonne/ha)"] = np.float32(0)
     df_cc["Price (Rs/tonne)"] = np.int32(0)
 
     for crop in all_crops:
-        crop_row = crop_df[crop_df["Crops"] == crop]
-        if crop_row.empty:
-            raise ValueError(f"Selected crop {crop} not found in crop_df")
-
-        ky_value = crop_row["Ky Values"].values[0]
-        pt_yield = crop_row["Yield (tonne/ha)"].values[0]
-        price = crop_row["Price (Rs/tonne)"].values[0]
+        crop_id = get_crop_id(crop_db, crop)
 
         # Store the Ky value in df_cc corresponding to the crop
         if crop in df_cc.index:
-            df_cc.at[crop, "Ky"] = np.float32(ky_value)
-            df_cc.at[crop, "Yield (tonne/ha)"] = np.float32(pt_yield)
-            df_cc.at[crop, "Price (Rs/tonne)"] = np.int32(price)
+            df_cc.at[crop, "Ky"] = np.float32(get_crop_param(crop_db, crop_id, "Ky Values"))
+            df_cc.at[crop, "Yield (tonne/ha)"] = np.float32(get_crop_param(crop_db, crop_id, "Yield (tonne/ha)"))
+            df_cc.at[crop, "Price (Rs/tonne)"] = np.int32(get_crop_param(crop_db, crop_id, "Price (Rs/tonne)"))
         else:
             raise ValueError(f"Selected crop {crop} not found in df_cc index")
     return df_cc
@@ -420,27 +401,25 @@ def get_return_flow(crop):
 
 
 # crop_processing.py - Function 008: Calculates weighted return flow based on water source dependencies
-# Interactions: get_return_flow, orchestrator.input_collector.collect_inp_variables, shared.utilities.to_float
-def apply_return_flow(row,inp_source,master_path):
-    crop = row.name
-    gw_rf, sw_rf = get_return_flow(crop)
-    row["GW_rf"] = gw_rf
-    row["SW_rf"] = sw_rf
-    inp_vars = collect_inp_variables(inp_source,master_path)
+# Interactions: get_return_flow, shared.utilities.to_float, numpy
+def apply_return_flow(df_cc, inp_vars):
+    return_flows = np.array([get_return_flow(crop) for crop in df_cc.index], dtype=float).reshape(-1, 2)
+    df_cc["GW_rf"] = return_flows[:, 0]
+    df_cc["SW_rf"] = return_flows[:, 1]
 
     try:
-        row["Over_all_rf"] = ((gw_rf * to_float(inp_vars["Groundwater_Dependent"], 0)) + (
-                sw_rf * to_float(inp_vars["Surface_Water_Dependent"], 0))) / 100
-
+        gw_dependent = to_float(inp_vars["Groundwater_Dependent"], 0)
+        sw_dependent = to_float(inp_vars["Surface_Water_Dependent"], 0)
+        df_cc["Over_all_rf"] = ((df_cc["GW_rf"] * gw_dependent) + (df_cc["SW_rf"] * sw_dependent)) / 100
     except Exception as e:
-        print(f"Error calculating overall return flow for crop {crop}: {e}")
-        row["Over_all_rf"] = 0  # Default value in case of error
-    return row
+        print(f"Error calculating overall return flow: {e}")
+        df_cc["Over_all_rf"] = 0  # Default value in case of error
+    return df_cc
 
 
 # crop_processing.py - Function 009: Processes crop details including efficiency and return flow values
-# Interactions: combine_and_normalize_attributes, soil_storage_bucket.outflux.evapotranspiration.apply_eva_red, apply_efficiency, soil_storage_bucket.outflux.evapotranspiration.calc_red_soil_evap, get_ky_value, apply_return_flow, shared.utilities.convert_columns_to_numeric, pandas
-def crop_details(attribute_names, all_crops, crop_df,inp_source,master_path, scenario_num=0):
+# Interactions: combine_and_normalize_attributes, orchestrator.input_collector.collect_inp_variables, orchestrator.input_collector.collect_int_variables, soil_storage_bucket.outflux.evapotranspiration.apply_eva_red, apply_efficiency, soil_storage_bucket.outflux.evapotranspiration.calc_red_soil_evap, get_ky_value, apply_return_flow, shared.utilities.convert_columns_to_numeric, pandas
+def crop_details(attribute_names, all_crops, crop_db,inp_source,master_path, scenario_num=0):
     all_attributes = combine_and_normalize_attributes(attribute_names,inp_source,master_path, scenario_num)
     df_cc = pd.DataFrame(all_attributes)
 
@@ -464,13 +443,14 @@ def crop_details(attribute_names, all_crops, crop_df,inp_source,master_path, sce
     df_cc["SW_rf"] = 0.20  # Default non-paddy surface water return flow
     df_cc["Over_all_rf"] = 0.17  # Default overall return flow
 
-    df_cc = df_cc.apply(apply_eva_red, axis=1, 
-                        args=(default_eva_red_values,inp_source, master_path))
-    df_cc = df_cc.apply(apply_efficiency, axis=1, 
-                    args=(default_efficiency_values, inp_source, master_path))
-    df_cc = df_cc.apply(calc_red_soil_evap, axis=1)
-    df_cc = get_ky_value(all_crops, crop_df, df_cc)
-    df_cc = df_cc.apply(lambda row: apply_return_flow(row, inp_source, master_path), axis=1)
+    # One snapshot of the input and intervention variables serves every column-wise pass below
+    inp_var = collect_inp_variables(inp_source, master_path)
+    int_var = collect_int_variables(inp_source, master_path, scenario_num)
+    df_cc = apply_eva_red(df_cc, default_eva_red_values, int_var)
+    df_cc = apply_efficiency(df_cc, default_efficiency_values, int_var)
+    df_cc = calc_red_soil_evap(df_cc)
+    df_cc = get_ky_value(all_crops, crop_db, df_cc)
+    df_cc = apply_return_flow(df_cc, inp_var)
     df_cc = convert_columns_to_numeric(df_cc, numeric_columns)
     columns_to_check = [
         "Drip_Area", "Sprinkler_Area", "Land_Levelling_Area", "DSR_Area",
@@ -480,133 +460,80 @@ def crop_details(attribute_names, all_crops, crop_df,inp_source,master_path, sce
     ]
     for column in columns_to_check:
         df_cc[column] = pd.to_numeric(df_cc[column], errors='coerce')
-    for index, row in df_cc.iterrows():
-        for column in columns_to_check:
-            if row["Area"] < row[column]:
-                error_message = f"Error: Crop {index}'s Total Area is less than {column}"
-                print(error_message)
-                raise ValueError(error_message)  # Raise an exception to stop the code
+    # Crops x interventions matrix of area violations, checked in one comparison
+    area_exceeded = df_cc[columns_to_check].gt(df_cc["Area"], axis=0).to_numpy()
+    if area_exceeded.any():
+        row_idx, col_idx = np.argwhere(area_exceeded)[0]
+        error_message = f"Error: Crop {df_cc.index[row_idx]}'s Total Area is less than {columns_to_check[col_idx]}"
+        print(error_message)
+        raise ValueError(error_message)  # Raise an exception to stop the code
 
     return df_cc
 
 
 # crop_processing.py - Function 010: Processes seasonal crop data and growth parameters
 # Interactions: soil_storage_bucket.processing.crop_coefficients.process_crops, process_yearly_rg_days
-def process_seasonal_crops(df_crop, crop_df, df_cp, season):
+def process_seasonal_crops(df_crop, crop_db, df_cp, season, model_calendar):
     for season_name, crops, sowing_month, sowing_week, crop_type, crop_sown_type in season:
-        df_crop = process_crops(df_crop, crop_df, crops, sowing_month, sowing_week, df_cp)
-        df_crop = process_yearly_rg_days(df_crop, crop_df, crops, sowing_month, sowing_week)
+        df_crop = process_crops(df_crop, crop_db, crops, sowing_month, sowing_week, df_cp, model_calendar)
+        df_crop = process_yearly_rg_days(df_crop, crop_db, crops, sowing_month, sowing_week, model_calendar)
     return df_crop
 
 
 # crop_processing.py - Function 011: Retrieves total growth days for a specific crop from crop database
-# Interactions: pandas
-def get_total_growth_days(crop_df, selected_crop):
-    crop_row = crop_df[crop_df["Crops"] == selected_crop]
-    if crop_row.empty:
-        raise ValueError(f"Selected crop {selected_crop} not found in crop_df")
+# Interactions: shared.crop_database.get_crop_id, shared.crop_database.get_crop_param
+def get_total_growth_days(crop_db, selected_crop):
+    crop_id = get_crop_id(crop_db, selected_crop)
     try:
-        return float(crop_row["Total Growth Days"].values[0])
+        return get_crop_param(crop_db, crop_id, "Total Growth Days")
     except ValueError:
         raise ValueError(f"Invalid total growth days value for crop {selected_crop}")
 
 
-# crop_processing.py - Function 012: Calculates crop sowing start date based on year, month, and week
-# Interactions: pandas
-def find_start_date(year, sowing_month_num, sowing_week):
-    start_date = pd.to_datetime(f"{year}-{sowing_month_num}-01") + pd.Timedelta(days=(int(sowing_week) - 1) * 7)
-    return start_date
-
-
-# crop_processing.py - Function 013: Calculates remaining growth days for initial year of crop cycle
-# Interactions: get_total_growth_days, find_start_date, pandas, numpy
-def calc_rg_days_ini(df, crop_df, selected_crop, sowing_month, sowing_week):
-    sowing_month_num = pd.to_datetime(f"{sowing_month} 1, 2000").month
-    total_growth_days = get_total_growth_days(crop_df, selected_crop)
-    rg_days_col_name = f"RG_days_{selected_crop}"
-
-    # Calculate start dates for all entries in the DataFrame
-    df["start_date"] = df["Date"].dt.year.apply(find_start_date, args=(sowing_month_num, sowing_week))
-    
-    # Calculate end dates for crop growth period
-    df["end_date"] = df["start_date"] + pd.Timedelta(days=total_growth_days)
-
-    # Calculate remaining growth days for the initial year - FIXED: Added end_date condition
-    df[rg_days_col_name] = np.where(
-        (df["Date"] >= df["start_date"]) & (df["Date"] < df["end_date"]),
-        np.maximum(0, total_growth_days - (df["Date"] - df["start_date"]).dt.days - 1),
+# crop_processing.py - Function 014: Calculates remaining growth days from integer day numbers for all years
+# Interactions: numpy
+def calc_remaining_days(day_num, is_first_year, start_this, start_prev, total_growth_days):
+    # Initial year: only the season sown in that year counts
+    days_since_sowing = day_num - start_this
+    rg_days_ini = np.where(
+        (days_since_sowing >= 0) & (days_since_sowing < total_growth_days),
+        np.maximum(0, total_growth_days - days_since_sowing - 1),
         0
     )
-
-    # Drop the temporary columns
-    df.drop(["start_date", "end_date"], axis=1, inplace=True)
-    return df
-
-
-# crop_processing.py - Function 014: Calculates remaining growth days for subsequent years of crop cycle
-# Interactions: get_total_growth_days, find_start_date, pandas
-def calc_remaining_days(df, crop_df, selected_crop, sowing_month, sowing_week):
-    sowing_month_num = pd.to_datetime(f"{sowing_month} 1, 2000").month
-    total_growth_days = get_total_growth_days(crop_df, selected_crop)
-    rg_days_col_name = f"RG_days_{selected_crop}"
-
-    # Use the exact same logic as original - row by row calculation
-    def find_start_date_row(row):
-        start_date = pd.to_datetime(f"{row['Date'].year}-{sowing_month_num}-01") + pd.Timedelta(
-            days=(int(sowing_week) - 1) * 7)
-        return start_date if start_date <= row["Date"] else start_date - pd.DateOffset(years=1)
-
-    df["start_date"] = df.apply(find_start_date_row, axis=1)
-    df[rg_days_col_name] = (df["start_date"] + pd.Timedelta(days=total_growth_days) - df["Date"] - pd.Timedelta(
-        days=1)).dt.days.clip(lower=0)
-    df.drop("start_date", axis=1, inplace=True)
-
-    return df
+    # Subsequent years: before this year's sowing date the season sown the year before is still running
+    season_start = np.where(start_this <= day_num, start_this, start_prev)
+    rg_days_rem = np.maximum(np.floor(season_start + total_growth_days - day_num - 1), 0)
+    return np.where(is_first_year, rg_days_ini, rg_days_rem)
 
 
 # crop_processing.py - Function 015: Processes remaining growth days for all years in dataset
-# Interactions: calc_rg_days_ini, calc_remaining_days, pandas
-def process_yearly_rg_days(df, crop_df, crops, months, weeks):
+# Interactions: get_total_growth_days, shared.model_calendar.get_sowing_start_days, calc_remaining_days, shared.utilities.assign_columns, numpy
+def process_yearly_rg_days(df, crop_db, crops, months, weeks, model_calendar):
     print("FUNCTION 19: process_yearly_rg_days() - Processing yearly remaining growth days")
-    first_year = df["Date"].dt.year.min()
-    first_year_df = df[df["Date"].dt.year == first_year].copy()
-    remaining_years_df = df[df["Date"].dt.year != first_year].copy()
-
-    # Initialize RG_days columns to 0 for all crops in remaining years
-    for crop in crops:
-        if crop:
-            rg_days_col_name = f"RG_days_{crop}"
-            if rg_days_col_name not in remaining_years_df.columns:
-                remaining_years_df[rg_days_col_name] = 0
-            else:
-                remaining_years_df[rg_days_col_name] = 0  # Reset to 0
-
-    # Process first year crops
-    for crop, month, week in zip(crops, months, weeks):
-        if crop and month and week:
-            first_year_df = calc_rg_days_ini(first_year_df, crop_df, crop, month, week)
+    day_num = model_calendar["day_number"]
+    is_first_year = model_calendar["is_first_year"]
 
-    # Process remaining years crops
+    rg_days = {}
     for crop, month, week in zip(crops, months, weeks):
         if crop and month and week:
-            remaining_years_df = calc_remaining_days(remaining_years_df, crop_df, crop, month, week)
-
-    # Combine the dataframes
-    df_combined = pd.concat([first_year_df, remaining_years_df]).sort_values("Date").reset_index(drop=True)
-    return df_combined
-
-
+            total_growth_days = get_total_growth_days(crop_db, crop)
+            start_this, start_prev = get_sowing_start_days(model_calendar, month, week)
+            rg_days[f"RG_days_{crop}"] = calc_remaining_days(day_num, is_first_year, start_this, start_prev,
+                                                             total_growth_days)
+    # Crops without a sowing month/week are reset to 0 after the first year
+    for crop in crops:
+        rg_days_col_name = f"RG_days_{crop}"
+        if crop and rg_days_col_name not in rg_days:
+            first_year_val = df[rg_days_col_name].to_numpy() if rg_days_col_name in df.columns else np.nan
+            rg_days[rg_days_col_name] = np.where(is_first_year, first_year_val, 0)
 
-
-# crop_processing.py - Function 016: Determines sown area based on remaining growth days
-# Interactions: None
-def calc_sown_area(remaining_growth_day, area):
-    return area if remaining_growth_day > 0 else 0
+    return assign_columns(df, rg_days)
 
 
 # crop_processing.py - Function 017: Processes sown area calculations for all crops in crop pattern
-# Interactions: calc_sown_area
+# Interactions: shared.utilities.assign_columns, numpy
 def process_sown_area(df, df_cp):
+    sown_areas = {}
     # Iterate over the crops in the "Crop" column of df_cp
     for selected_crop in df_cp["Crop"].unique():
         # Skip if the crop is empty or None
@@ -617,8 +544,9 @@ def process_sown_area(df, df_cp):
         if len(area) == 0:
             raise ValueError(f"No area found for crop '{selected_crop}' in df_cp.")
         area = float(area[0])  # Convert area to float for consistency
-        df[f"{selected_crop}_Sown_Area"] = df[f"RG_days_{selected_crop}"].apply(lambda x: calc_sown_area(x, area))
-    return df
+        # Crops with remaining growth days are sown over their whole area
+        sown_areas[f"{selected_crop}_Sown_Area"] = np.where(df[f"RG_days_{selected_crop}"].to_numpy() > 0, area, 0.0)
+    return assign_columns(df, sown_areas)
 
 
 # crop_processing.py - Function 018: Calculates net sown area aggregated by plot from crop calendar
@@ -698,10 +626,3 @@ def get_sowing_month(df_cp):
 # Interactions: None
 def calc_dormant(sown_area):
     return "N" if sown_area > 0 else "Y"
-
-
-# Helper function: Calculates start date for crop cycle based on sowing parameters
-def find_start_date_row(row, sowing_month_num, sowing_week):
-    start_date = pd.to_datetime(f"{row['Date'].year}-{sowing_month_num}-01") + pd.Timedelta(
-        days=(int(sowing_week) - 1) * 7)
-    return start_date if start_date <= row["Date"] else start_date - pd.DateOffset(years=1)
\ No newline at end of file
@@ -16,20 +16,18 @@ This module contains functions for data reading and caching:
 import pandas as pd
 import numpy as np
 import os
-import functools
-from shared.utilities import to_float, resample, calc_days_in_month
+from shared.utilities import to_float, resample, find_variable_row
+from shared.crop_database import has_crop, get_crop_id, get_crop_text
+from shared.run_context import get_context_file_paths, read_run_csv, read_run_table, clear_run_caches
 # Removed circular import: from orchestrator.input_collector import collect_inp_variables
 # Functions that need collect_inp_variables will have it passed as parameter
 # Removed circular import - calc_etom will be imported locally where needed
 
-# Cache for file paths
-_file_paths_cache = {}
-
 
 # data_readers.py - Function 001: Reads and formats crop database from CSV file
-# Interactions: pandas
+# Interactions: shared.run_context.read_run_table, pandas
 def get_crop_data(crop_db):
-    crop_df = pd.read_csv(crop_db, header=None)
+    crop_df = read_run_table(crop_db, header=None)
     crop_df = crop_df.drop(index=0)
     crop_df.columns = crop_df.iloc[0]
     crop_df = crop_df.drop(index=1).reset_index(drop=True)
@@ -37,13 +35,13 @@ def get_crop_data(crop_db):
 
 
 # data_readers.py - Function 002: Retrieves solar radiation data for specific latitude
-# Interactions: pandas
+# Interactions: shared.run_context.read_run_table, pandas
 def get_radiation_db(radiation_db, latitude):
     # Check if latitude is a list and convert it to a string
     if isinstance(latitude, list) and len(latitude) > 0:
         latitude = latitude[0]
     # Read the radiation database CSV file
-    df_rd_db = pd.read_csv(radiation_db)
+    df_rd_db = read_run_table(radiation_db)
     df_rd_db.set_index("Lat", inplace=True)
     # Filter the data for the desired latitude
     filtered_data = df_rd_db.loc[latitude]
@@ -54,9 +52,9 @@ def get_radiation_db(radiation_db, latitude):
 
 
 # data_readers.py - Function 003: Reads precipitation data and calculates 5-day rolling rainfall
-# Interactions: pandas
+# Interactions: shared.run_context.read_run_table, pandas
 def get_pcp_value(daily_data):
-    df_dd = pd.read_csv(daily_data)
+    df_dd = read_run_table(daily_data)
     df_dd.columns = ["Date", "Pi"]
     df_dd["Date"] = pd.to_datetime(df_dd["Date"], format="%m/%d/%Y")
     df_dd["last_5_days_Rain"] = df_dd["Pi"].rolling(window=5, min_periods=1).sum()
@@ -126,53 +124,50 @@ def get_seasons_data(inp_source,master_path):
 
 
 # data_readers.py - Function 008: Processes monthly climate and precipitation data
-# Interactions: soil_storage_bucket.outflux.evapotranspiration.calc_etom, shared.utilities.resample, shared.utilities.calc_days_in_month
-def process_monthly_data(df_dd, file_paths,inp_source,master_path):
+# Interactions: soil_storage_bucket.outflux.evapotranspiration.calc_etom, shared.utilities.resample
+def process_monthly_data(df_dd, file_paths,inp_source,master_path, model_calendar):
     print("FUNCTION 29: process_monthly_data() - Processing monthly climate data")
     # Import calc_etom locally to avoid circular import
     from soil_storage_bucket.outflux.evapotranspiration import calc_etom
     monthly_data = file_paths["monthly_data"]
-    df_mm = resample(df_dd, monthly_data, "Date", "Pi").rename(columns={"Pi": "Rain"})
-    df_mm["Days"] = df_mm["Date"].map(lambda x: calc_days_in_month(x.year, x.month))
-    df_mm = calc_etom(df_mm,file_paths,inp_source,master_path)
+    df_mm = resample(df_dd, monthly_data, "Date", "Pi", model_calendar=model_calendar).rename(columns={"Pi": "Rain"})
+    df_mm["Days"] = model_calendar["months"]["days"]
+    df_mm = calc_etom(df_mm,file_paths,inp_source,master_path, model_calendar)
     return df_mm
 
 
 # data_readers.py - Function 009: Retrieves cover type and treatment type for crops from database
-# Interactions: pandas
-def get_cover_type(df_cc, crop_df):
+# Interactions: shared.crop_database.has_crop, shared.crop_database.get_crop_id, shared.crop_database.get_crop_text
+def get_cover_type(df_cc, crop_db):
     for crop in df_cc.index:
-        row = crop_df[crop_df["Crops"] == crop]
-        if not row.empty:
-            # Extract the relevant data from the found row in crop_df
-            df_cc.loc[crop, "Cover Type"] = row["Cover Type"].values[0]
-            df_cc.loc[crop, "Treatment Type"] = row["Treatment Type"].values[0]
+        if has_crop(crop_db, crop):
+            # Extract the relevant data from the crop database arrays
+            crop_id = get_crop_id(crop_db, crop)
+            df_cc.loc[crop, "Cover Type"] = get_crop_text(crop_db, crop_id, "Cover Type")
+            df_cc.loc[crop, "Treatment Type"] = get_crop_text(crop_db, crop_id, "Treatment Type")
         else:
-            # Handle case where crop is not found in crop_df (optional)
+            # Handle case where crop is not found in crop database (optional)
             df_cc.loc[crop, "Cover Type"] = None
             df_cc.loc[crop, "Treatment Type"] = None
     return df_cc
 
 
-# data_readers.py - Function 010: Clears the file paths cache for testing or configuration changes
-# Interactions: None
+# data_readers.py - Function 010: Clears the active run's cached inputs for testing or configuration changes
+# Interactions: shared.run_context.clear_run_caches
 def clear_file_paths_cache():
-    """Clear the file paths cache - useful for testing or changing configurations"""
-    global _file_paths_cache
-    _file_paths_cache.clear()
+    """Clear the active run's input caches - useful for testing or changing configurations"""
+    clear_run_caches()
     print("File paths cache cleared")
 
 
-# data_readers.py - Function 011: Returns cached file paths for datasets based on input source and master path
-# Interactions: os
+# data_readers.py - Function 011: Returns file paths for datasets based on input source and master path
+# Interactions: shared.run_context.get_context_file_paths, os
 def get_file_paths(inp_source,master_path):
-    # Create cache key from parameters
-    cache_key = f"{inp_source}_{master_path}"
-    
-    # Return cached result if available
-    if cache_key in _file_paths_cache:
-        return _file_paths_cache[cache_key]
-    
+    # The active run context may point inputs at scenario-specific files
+    context_paths = get_context_file_paths(inp_source, master_path)
+    if context_paths is not None:
+        return context_paths
+
     fixed_subdir = r"Datasets"
     csv_subdir = os.path.join(fixed_subdir, "Inputs","csv_inputs")
     db_subdir = os.path.join(fixed_subdir, "Inputs","static_inputs")
@@ -199,20 +194,14 @@ def get_file_paths(inp_source,master_path):
         paths["supply_interventions"] = None
         paths["demand_interventions"] = None
         paths["soil_interventions"] = None
-    # Cache the result before returning
-    _file_paths_cache[cache_key] = paths
-    
     return paths
 
 
 # data_readers.py - Function 012: Cached CSV reader to avoid repeated disk I/O operations
-# Interactions: pandas, os, functools
-@functools.lru_cache(maxsize=64)
+# Interactions: shared.run_context.read_run_csv
 def _read_cached_csv(file_path):
-    """Cache CSV reading to avoid repeated disk I/O"""
-    if file_path and os.path.exists(file_path):
-        return pd.read_csv(file_path, header=None)
-    return pd.DataFrame()
+    """Cache CSV reading per run to avoid repeated disk I/O"""
+    return read_run_csv(file_path)
 
 
 # data_readers.py - Function 012A: Reads supply intervention data from new tabular CSV format
@@ -456,7 +445,7 @@ def get_soil_intervention_value(intervention_name, parameter, scenario_num, mast
 
 
 # data_readers.py - Function 013: Handles value retrieval from CSV or manual sources for variables
-# Interactions: get_file_paths, _read_cached_csv, pandas
+# Interactions: get_file_paths, _read_cached_csv, shared.utilities.find_variable_row, pandas
 def handle_value_retrieval(inp_data_source, variables, master_path, var_name, index, is_crops=False, is_area=False):
     
     file_paths = get_file_paths(inp_data_source, master_path)
@@ -470,38 +459,34 @@ def handle_value_retrieval(inp_data_source, variables, master_path, var_name, in
             # Retrieve from inp_df
             if is_area or is_crops:
                 # Iterate over all rows of inp_df to find var_name
-                for row in range(inp_df.shape[0]):  # Iterate over rows
-                    if inp_df.iloc[row, 0] == var_name:  # Check if first column matches var_name
-                        for col in range(1, inp_df.shape[1]):  # Iterate over columns starting from 1
-                            value = inp_df.iloc[row, col]
+                row = find_variable_row(inp_df, var_name)  # First row whose first column matches var_name
+                if row is not None:
+                    for col in range(1, inp_df.shape[1]):  # Iterate over columns starting from 1
+                        value = inp_df.iloc[row, col]
+                        if pd.isna(value):
+                            variable_value.append("")  # Append empty string if column is NaN
+                        else:
+                            variable_value.append(value)  # Append the actual value, including 0
+                # If variable_value is empty, try to get values from interv_inp_df
+                if not variable_value:
+                    row = find_variable_row(interv_inp_df, var_name)  # Same logic for interv_inp_df
+                    if row is not None:
+                        for col in range(1, interv_inp_df.shape[1]):
+                            value = interv_inp_df.iloc[row, col]
                             if pd.isna(value):
                                 variable_value.append("")  # Append empty string if column is NaN
                             else:
                                 variable_value.append(value)  # Append the actual value, including 0
-                        break  # Exit the loop once found
-                # If variable_value is empty, try to get values from interv_inp_df
-                if not variable_value:
-                    for row in range(interv_inp_df.shape[0]):  # Same logic for interv_inp_df
-                        if interv_inp_df.iloc[row, 0] == var_name:
-                            for col in range(1, interv_inp_df.shape[1]):
-                                value = interv_inp_df.iloc[row, col]
-                                if pd.isna(value):
-                                    variable_value.append("")  # Append empty string if column is NaN
-                                else:
-                                    variable_value.append(value)  # Append the actual value, including 0
-                            break  # Exit the loop once found
             else:
                 # Retrieve a single value from inp_df based on var_name
-                for row in range(inp_df.shape[0]):
-                    if inp_df.iloc[row, 0] == var_name:
-                        variable_value = inp_df.iloc[row, 1]  # Get value from the next column
-                        break
+                row = find_variable_row(inp_df, var_name)
+                if row is not None:
+                    variable_value = inp_df.iloc[row, 1]  # Get value from the next column
                 # Check if value is still empty, then check interv_inp_df
                 if not variable_value:
-                    for row in range(interv_inp_df.shape[0]):
-                        if interv_inp_df.iloc[row, 0] == var_name:
-                            variable_value = interv_inp_df.iloc[row, 1]  # Get value from interv_inp_df
-                            break
+                    row = find_variable_row(interv_inp_df, var_name)
+                    if row is not None:
+                        variable_value = interv_inp_df.iloc[row, 1]  # Get value from interv_inp_df
                 # Raise an error only if variable_value is None, not 0 or empty string
                 if variable_value is None:
                     raise KeyError(f"Variable {var_name} not found in both inp_df and interv_inp_df.")
@@ -721,9 +706,9 @@ def get_season_data(inp_source,master_path):
 
 
 # data_readers.py - Function 023: Reads irrigation data and merges with monthly dataframe
-# Interactions: pandas
+# Interactions: shared.run_context.read_run_table, pandas
 def irrigation_data_input(df_ir_path, df_mm):
-    df_ir = pd.read_csv(df_ir_path)
+    df_ir = read_run_table(df_ir_path)
     df_ir["Date"] = df_mm["Date"]
     columns = ["Date"] + [col for col in df_ir.columns if col != "Date"]
     df_ir = df_ir[columns]
@@ -0,0 +1,129 @@
+"""
+Dtype schema for drought proofing tool dataframes
+
+This module contains the declared dtype policy for the model dataframes:
+- Column rules for fluxes (float32), condition codes (int8) and flags (category)
+- Constant columns stored as scalar metadata instead of full-length vectors
+- Schema enforcement at stage boundaries
+- Per-frame memory footprint reporting
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Declares and enforces a memory-lean dtype schema for df_dd, df_crop, df_mm and reports per-frame memory usage
+# ========================================
+
+import re
+import numpy as np
+import pandas as pd
+
+
+# Column rules checked in order; the first matching pattern decides the dtype.
+# Numeric columns that match no rule fall back to "float32" (fluxes, depths, coefficients).
+DTYPE_SCHEMA = [
+    (r"^Date$", None),
+    (r"^Year$", None),
+    # Running storage totals in cu.m reach 1e7, beyond float32's whole-unit precision
+    (r"^(Cumulative_|Accumulated_)", "float64"),
+    (r"^GW_abstracted$", "float64"),
+    (r"^Ks_(soil|crop)_cond_", "int8"),
+    (r"^AMC$", "int8"),
+    (r"^Dormant$", "category"),
+    (r"^Plot_", "category"),
+]
+
+# Columns that hold a single value for the whole run (areas, depths); kept as scalars when constant
+SCALAR_COLUMNS = [
+    r"^Ze$",
+    r"^Builtup_area$",
+    r"^Waterbodies_area$",
+    r"^Pasture$",
+    r"^Forest$",
+    r"^Fallow Area Recharge$",
+    r"_NSA$",
+]
+
+
+# dtype_schema.py - Function 001: Returns the declared dtype for a column name
+# Interactions: re
+def get_schema_dtype(col, default="float32"):
+    for pattern, dtype in DTYPE_SCHEMA:
+        if re.search(pattern, str(col)):
+            return dtype
+    return default
+
+
+# dtype_schema.py - Function 002: Checks whether a column is declared as scalar metadata
+# Interactions: re
+def is_scalar_column(col):
+    return any(re.search(pattern, str(col)) for pattern in SCALAR_COLUMNS)
+
+
+# dtype_schema.py - Function 003: Casts one column to a small integer dtype when it holds whole numbers only
+# Interactions: pandas, numpy
+def _to_int_code(series, dtype):
+    values = pd.to_numeric(series, errors="coerce")
+    if values.isna().any() or not np.all(np.mod(values, 1) == 0):
+        # Leave codes with gaps or fractions as float32 so no information is lost
+        return values.astype("float32")
+    return values.astype(dtype)
+
+
+# dtype_schema.py - Function 004: Stores a constant numeric column as a single scalar fill value
+# Interactions: pandas, numpy
+def _to_scalar_column(series):
+    values = series.to_numpy(dtype=np.float32)
+    if len(values) == 0 or not np.all(values == values[0]):
+        return series.astype("float32")
+    # A sparse column whose fill value is the constant keeps no per-row storage but reads like a normal column
+    return pd.arrays.SparseArray(values, fill_value=values[0])
+
+
+# dtype_schema.py - Function 005: Enforces the dtype schema on a dataframe at a stage boundary
+# Interactions: get_schema_dtype, is_scalar_column, _to_int_code, _to_scalar_column, pandas
+def apply_dtype_schema(df, compact_scalars=False):
+    new_cols = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.SparseDtype):
+            continue
+        dtype = get_schema_dtype(col)
+        if dtype is None:
+            continue
+        if dtype == "category":
+            if series.dtype == object:
+                new_cols[col] = series.astype("category")
+        elif not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            continue
+        elif dtype.startswith("int"):
+            if series.dtype != dtype:
+                new_cols[col] = _to_int_code(series, dtype)
+        elif compact_scalars and is_scalar_column(col):
+            new_cols[col] = _to_scalar_column(series)
+        elif series.dtype != dtype:
+            new_cols[col] = series.astype(dtype)
+    # Replacing existing columns does not add blocks, so the frame is not fragmented
+    for col, values in new_cols.items():
+        df[col] = values
+    return df
+
+
+# dtype_schema.py - Function 006: Returns the memory footprint of a dataframe in megabytes
+# Interactions: pandas
+def get_frame_memory_mb(df):
+    return df.memory_usage(index=True, deep=True).sum() / (1024 ** 2)
+
+
+# dtype_schema.py - Function 007: Prints the memory footprint of each dataframe in a dictionary
+# Interactions: get_frame_memory_mb
+def report_frame_memory(frames):
+    total = 0
+    print("Dataframe memory footprint:")
+    for name, df in frames.items():
+        if isinstance(df, pd.DataFrame):
+            size_mb = get_frame_memory_mb(df)
+            total += size_mb
+            print(f"  {name}: {df.shape[0]} rows x {df.shape[1]} cols, {size_mb:.2f} MB")
+    print(f"  Total: {total:.2f} MB")
+    return total
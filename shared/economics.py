@@ -5,6 +5,7 @@ This module contains functions for economic analysis:
 - Intervention cost calculations
 - Economic life and maintenance costs
 - Net Present Value calculations
+- Batched economics over portfolios x interest rates x time periods
 
 @author: Dr. Jagadeesh, Consultant, IWMI
 """
@@ -36,8 +37,9 @@ def calculate_number_of_units(current_economic_life, inp_life_spans):
 
 # economics.py - Function 002: Collects and structures supply-side intervention data including costs and specifications
 # Interactions: orchestrator.input_collector.collect_int_variables, shared.utilities.to_float, calculate_number_of_units
-def get_supplyside_int_data(economic_list,inp_source,master_path, scenario_num=0):
-    user_input_vars = collect_int_variables(inp_source,master_path, scenario_num)
+def get_supplyside_int_data(economic_list,inp_source,master_path, scenario_num=0, user_input_vars=None):
+    if user_input_vars is None:
+        user_input_vars = collect_int_variables(inp_source,master_path, scenario_num)
     interventions = [
         "Farm_Pond", "Farm_Pond_Lined", "Check_Dam", "Infiltration_Pond", "Injection_Wells"
     ]
@@ -60,8 +62,9 @@ def get_supplyside_int_data(economic_list,inp_source,master_path, scenario_num=0
 
 # economics.py - Function 003: Collects and structures demand-side intervention data from crop calendar areas
 # Interactions: orchestrator.input_collector.collect_int_variables, shared.utilities.to_float, calculate_number_of_units
-def get_demandside_int_data(df_cc, economic_list,inp_source,master_path, scenario_num=0):
-    user_input_vars = collect_int_variables(inp_source,master_path, scenario_num)
+def get_demandside_int_data(df_cc, economic_list,inp_source,master_path, scenario_num=0, user_input_vars=None):
+    if user_input_vars is None:
+        user_input_vars = collect_int_variables(inp_source,master_path, scenario_num)
     interventions = ["Drip_Irr", "Sprinkler_Irr", "Land_Levelling", "Direct_Seeded_Rice",
                      "Alternate_Wetting_And_Dry", "SRI",
                      "Ridge_Furrow_Irrigation", "Deficit_Irrigation"]
@@ -95,8 +98,9 @@ def get_demandside_int_data(df_cc, economic_list,inp_source,master_path, scenari
 
 # economics.py - Function 004: Collects and structures soil moisture intervention data from crop calendar areas
 # Interactions: orchestrator.input_collector.collect_int_variables, shared.utilities.to_float, calculate_number_of_units
-def get_soil_moistureside_int_data(df_cc, economic_list,inp_source,master_path, scenario_num=0):
-    user_input_vars = collect_int_variables(inp_source,master_path, scenario_num)
+def get_soil_moistureside_int_data(df_cc, economic_list,inp_source,master_path, scenario_num=0, user_input_vars=None):
+    if user_input_vars is None:
+        user_input_vars = collect_int_variables(inp_source,master_path, scenario_num)
     interventions = ["Cover_Crops", "Mulching", "BBF", "Bund",
                      "Tillage", "Tank_Desilting"]
 
@@ -171,45 +175,121 @@ def calc_npv(maintenance_cost, equalized_annual_cost, interest_rate, time_period
 
 
 # economics.py - Function 010: Calculates economic parameters for interventions
-# Interactions: calc_cost, calculate_eac, calculate_maintenance_cost, calc_npv, pandas, numpy
+# Interactions: calc_economics_arrays, pandas, numpy
 def calc_int_economics(combined_intervention_data, economic_list):
     df_int = pd.DataFrame(combined_intervention_data)
 
     # Replace empty lists with NaN for cleaner data using map instead of applymap
     df_int = df_int.map(lambda x: np.nan if isinstance(x, list) and len(x) == 0 else x)
 
-    df_int["Capital Cost"] = df_int.apply(
-        lambda row: calc_cost(row["Volume (Cu.m)/Area"], row["Cost (Rs/Cu.m)"]),
-        axis=1
-    )
-    df_int["Total Capital Cost"] = df_int.apply(
-        lambda row: calc_cost(row["Capital Cost"], row["Number of Units"]),
-        axis=1)
-
-    df_int["Equalized Annual Cost"] = df_int.apply(
-        lambda row: calculate_eac(row["Total Capital Cost"], economic_list[0], economic_list[1]),
-        axis=1
-    )
-
-    df_int = calculate_maintenance_cost(df_int, economic_list[1])
-
-    df_int["NPV"] = df_int.apply(
-        lambda row: calc_npv(row["Maintenance Cost"], row["Equalized Annual Cost"], economic_list[0], economic_list[1]),
-        axis=1
+    # One portfolio at one interest rate and time period is the smallest batch of the array engine
+    economics = calc_economics_arrays(
+        df_int["Volume (Cu.m)/Area"], df_int["Cost (Rs/Cu.m)"], df_int["Life Span (years)"],
+        df_int["Maintenance (%)"], [economic_list[0]], [economic_list[1]],
+        num_units=df_int["Number of Units"]
     )
+    df_int["Capital Cost"] = economics["Capital Cost"][0, 0, 0]
+    df_int["Total Capital Cost"] = economics["Total Capital Cost"][0, 0, 0]
+    df_int["Equalized Annual Cost"] = economics["Equalized Annual Cost"][0, 0, 0]
+    df_int["Maintenance Cost"] = economics["Maintenance Cost"][0, 0, 0]
+    df_int["NPV"] = economics["NPV"][0, 0, 0]
     return df_int
 
 
 # economics.py - Function 011: Calculates comprehensive intervention economics
-# Interactions: get_supplyside_int_data, get_demandside_int_data, get_soil_moistureside_int_data, create_intervention_data, calc_int_economics
+# Interactions: orchestrator.input_collector.collect_int_variables, get_supplyside_int_data, get_demandside_int_data, get_soil_moistureside_int_data, create_intervention_data, calc_int_economics
 def calculate_intervention_economics(economic_list, df_cc,inp_source,master_path, scenario_num=0):
     print("FUNCTION 21: calculate_intervention_economics() - Calculating intervention economics")
-    supply_side_int = get_supplyside_int_data(economic_list,inp_source,master_path, scenario_num)
-    demand_side_int = get_demandside_int_data(df_cc, economic_list,inp_source,master_path, scenario_num)
-    soil_moisture_int = get_soil_moistureside_int_data(df_cc, economic_list,inp_source,master_path, scenario_num)
+    # Intervention variables are collected once and shared by the three groups
+    user_input_vars = collect_int_variables(inp_source, master_path, scenario_num)
+    supply_side_int = get_supplyside_int_data(economic_list,inp_source,master_path, scenario_num, user_input_vars)
+    demand_side_int = get_demandside_int_data(df_cc, economic_list,inp_source,master_path, scenario_num,
+                                              user_input_vars)
+    soil_moisture_int = get_soil_moistureside_int_data(df_cc, economic_list,inp_source,master_path, scenario_num,
+                                                       user_input_vars)
     combined_intervention_data = create_intervention_data(supply_side_int, demand_side_int, soil_moisture_int)
     df_int = calc_int_economics(combined_intervention_data, economic_list)
     return df_int
 
 
+# economics.py - Function 012: Calculates the number of units for every time period and life span by broadcasting
+# Interactions: numpy
+def calc_number_of_units_array(time_periods, life_spans):
+    time_periods = np.asarray(time_periods, dtype=np.float64)
+    life_spans = np.asarray(life_spans, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        num_units = np.where(time_periods - life_spans <= 0, 1, np.ceil(time_periods / life_spans))
+    # A zero life span means the intervention is not costed, as in calculate_number_of_units
+    num_units = np.where((life_spans == 0) | np.isnan(num_units) | np.isinf(num_units), 0, num_units)
+    return num_units
+
+
+# economics.py - Function 013: Evaluates capital cost, EAC, maintenance and NPV for portfolios x interest rates x time periods
+# Interactions: calc_number_of_units_array, numpy
+def calc_economics_arrays(volumes, unit_costs, life_spans, maintenance_pct, interest_rates, time_periods,
+                          num_units=None):
+    # volumes: interventions or portfolios x interventions; results are portfolios x rates x periods x interventions
+    volumes = np.atleast_2d(np.asarray(volumes, dtype=np.float64))
+    unit_costs = np.asarray(unit_costs, dtype=np.float64)
+    life_spans = np.asarray(life_spans, dtype=np.float64)
+    maintenance_pct = np.asarray(maintenance_pct, dtype=np.float64)
+    interest_rates = np.asarray(interest_rates, dtype=np.float64).reshape(-1)
+    time_periods = np.asarray(time_periods, dtype=np.float64).reshape(-1)
+    if np.any(interest_rates == 0):
+        raise ValueError("Interest rate cannot be 0 to avoid division by zero.")
+    if np.any(time_periods == 0):
+        raise ValueError("Time period cannot be 0 to avoid division by zero.")
+
+    rate = (interest_rates / 100)[None, :, None, None]
+    period = time_periods[None, None, :, None]
+    if num_units is None:
+        num_units = calc_number_of_units_array(period, life_spans)
+    else:
+        num_units = np.asarray(num_units, dtype=np.float64)
+
+    capital_cost = (volumes * unit_costs)[:, None, None, :]
+    total_capital_cost = capital_cost * num_units
+    eac = (total_capital_cost * rate) / (1 - (1 + rate) ** (-period))
+    maintenance_cost = eac * (maintenance_pct / 100) * period
+    npv = maintenance_cost + (1 - (1 / ((1 + rate) ** period))) * (eac / rate)
+
+    shape = (volumes.shape[0], len(interest_rates), len(time_periods), volumes.shape[1])
+    return {
+        "Capital Cost": np.broadcast_to(capital_cost, shape),
+        "Total Capital Cost": np.broadcast_to(total_capital_cost, shape),
+        "Equalized Annual Cost": np.broadcast_to(eac, shape),
+        "Maintenance Cost": np.broadcast_to(maintenance_cost, shape),
+        "NPV": np.broadcast_to(npv, shape),
+    }
+
 
+# economics.py - Function 014: Builds an economic sensitivity table of portfolio totals over interest rates and time periods
+# Interactions: calc_economics_arrays, pandas, numpy
+def calc_economic_sensitivity(combined_intervention_data, interest_rates, time_periods, portfolios=None):
+    df_int = pd.DataFrame(combined_intervention_data)
+    # Each portfolio is a vector of intervention volumes; the collected volumes are the default portfolio
+    if portfolios is None:
+        portfolios = df_int["Volume (Cu.m)/Area"].to_numpy(dtype=np.float64)[None, :]
+    portfolios = np.atleast_2d(np.asarray(portfolios, dtype=np.float64))
+    if portfolios.shape[1] != len(df_int):
+        raise ValueError(f"Portfolios have {portfolios.shape[1]} interventions but {len(df_int)} were collected")
+
+    economics = calc_economics_arrays(
+        portfolios, df_int["Cost (Rs/Cu.m)"], df_int["Life Span (years)"], df_int["Maintenance (%)"],
+        interest_rates, time_periods
+    )
+    interest_rates = np.asarray(interest_rates, dtype=np.float64).reshape(-1)
+    time_periods = np.asarray(time_periods, dtype=np.float64).reshape(-1)
+    portfolio_idx, rate_idx, period_idx = np.meshgrid(
+        np.arange(portfolios.shape[0]), np.arange(len(interest_rates)), np.arange(len(time_periods)),
+        indexing="ij"
+    )
+    df_sensitivity = pd.DataFrame({
+        "Portfolio": portfolio_idx.ravel(),
+        "Interest Rate": interest_rates[rate_idx.ravel()],
+        "Time Period": time_periods[period_idx.ravel()],
+    })
+    # Portfolio totals are summed over the intervention axis
+    for column in ["Total Capital Cost", "Equalized Annual Cost", "Maintenance Cost", "NPV"]:
+        df_sensitivity[column] = economics[column].sum(axis=3).ravel()
+    return df_sensitivity
@@ -18,22 +18,17 @@ These functions were moved from shared/data_readers.py to break circular imports
 
 import pandas as pd
 import os
-import functools
-from shared.utilities import to_float
+from shared.utilities import to_float, find_variable_row
+from shared.run_context import get_context_file_paths, read_run_csv
 
-# Cache for file paths
-_file_paths_cache = {}
 
-
-# input_utilities.py - Function 001: Returns cached file paths for datasets based on input source and master path
-# Interactions: os
+# input_utilities.py - Function 001: Returns file paths for datasets based on input source and master path
+# Interactions: shared.run_context.get_context_file_paths, os
 def get_file_paths(inp_source,master_path):
-    # Create cache key from parameters
-    cache_key = f"{inp_source}_{master_path}"
-
-    # Return cached result if available
-    if cache_key in _file_paths_cache:
-        return _file_paths_cache[cache_key]
+    # The active run context may point inputs at scenario-specific files
+    context_paths = get_context_file_paths(inp_source, master_path)
+    if context_paths is not None:
+        return context_paths
 
     fixed_subdir = r"Datasets"
     csv_subdir = os.path.join(fixed_subdir, "Inputs","csv_inputs")
@@ -54,24 +49,18 @@ def get_file_paths(inp_source,master_path):
     else:
         paths["input_baseline"] = None
         paths["input_interventions"] = None
-    # Cache the result before returning
-    _file_paths_cache[cache_key] = paths
-
     return paths
 
 
 # input_utilities.py - Function 002: Cached CSV reader to avoid repeated disk I/O operations
-# Interactions: pandas, os, functools
-@functools.lru_cache(maxsize=64)
+# Interactions: shared.run_context.read_run_csv
 def _read_cached_csv(file_path):
-    """Cache CSV reading to avoid repeated disk I/O"""
-    if file_path and os.path.exists(file_path):
-        return pd.read_csv(file_path, header=None)
-    return pd.DataFrame()
+    """Cache CSV reading per run to avoid repeated disk I/O"""
+    return read_run_csv(file_path)
 
 
 # input_utilities.py - Function 003: Handles value retrieval from CSV or manual sources for variables
-# Interactions: get_file_paths, _read_cached_csv, pandas
+# Interactions: get_file_paths, _read_cached_csv, shared.utilities.find_variable_row, pandas
 def handle_value_retrieval(inp_data_source, variables, master_path, var_name, index, is_crops=False, is_area=False):
 
     file_paths = get_file_paths(inp_data_source, master_path)
@@ -85,38 +74,34 @@ def handle_value_retrieval(inp_data_source, variables, master_path, var_name, in
             # Retrieve from inp_df
             if is_area or is_crops:
                 # Iterate over all rows of inp_df to find var_name
-                for row in range(inp_df.shape[0]):  # Iterate over rows
-                    if inp_df.iloc[row, 0] == var_name:  # Check if first column matches var_name
-                        for col in range(1, inp_df.shape[1]):  # Iterate over columns starting from 1
-                            value = inp_df.iloc[row, col]
+                row = find_variable_row(inp_df, var_name)  # First row whose first column matches var_name
+                if row is not None:
+                    for col in range(1, inp_df.shape[1]):  # Iterate over columns starting from 1
+                        value = inp_df.iloc[row, col]
+                        if pd.isna(value):
+                            variable_value.append("")  # Append empty string if column is NaN
+                        else:
+                            variable_value.append(value)  # Append the actual value, including 0
+                # If variable_value is empty, try to get values from interv_inp_df
+                if not variable_value:
+                    row = find_variable_row(interv_inp_df, var_name)  # Same logic for interv_inp_df
+                    if row is not None:
+                        for col in range(1, interv_inp_df.shape[1]):
+                            value = interv_inp_df.iloc[row, col]
                             if pd.isna(value):
                                 variable_value.append("")  # Append empty string if column is NaN
                             else:
                                 variable_value.append(value)  # Append the actual value, including 0
-                        break  # Exit the loop once found
-                # If variable_value is empty, try to get values from interv_inp_df
-                if not variable_value:
-                    for row in range(interv_inp_df.shape[0]):  # Same logic for interv_inp_df
-                        if interv_inp_df.iloc[row, 0] == var_name:
-                            for col in range(1, interv_inp_df.shape[1]):
-                                value = interv_inp_df.iloc[row, col]
-                                if pd.isna(value):
-                                    variable_value.append("")  # Append empty string if column is NaN
-                                else:
-                                    variable_value.append(value)  # Append the actual value, including 0
-                            break  # Exit the loop once found
             else:
                 # Retrieve a single value from inp_df based on var_name
-                for row in range(inp_df.shape[0]):
-                    if inp_df.iloc[row, 0] == var_name:
-                        variable_value = inp_df.iloc[row, 1]  # Get value from the next column
-                        break
+                row = find_variable_row(inp_df, var_name)
+                if row is not None:
+                    variable_value = inp_df.iloc[row, 1]  # Get value from the next column
                 # Check if value is still empty, then check interv_inp_df
                 if not variable_value:
-                    for row in range(interv_inp_df.shape[0]):
-                        if interv_inp_df.iloc[row, 0] == var_name:
-                            variable_value = interv_inp_df.iloc[row, 1]  # Get value from interv_inp_df
-                            break
+                    row = find_variable_row(interv_inp_df, var_name)
+                    if row is not None:
+                        variable_value = interv_inp_df.iloc[row, 1]  # Get value from interv_inp_df
                 # Raise an error only if variable_value is None, not 0 or empty string
                 if variable_value is None:
                     raise KeyError(f"Variable {var_name} not found in both inp_df and interv_inp_df.")
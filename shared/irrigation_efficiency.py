@@ -13,7 +13,8 @@ This module contains functions for calculating irrigation efficiency:
 # ========================================
 import pandas as pd
 import numpy as np
-from shared.utilities import to_float, get_percentage, safe_divide
+from shared.utilities import to_float, get_percentage, safe_divide, assign_columns
+from shared.model_state import get_label_matrix
 
 
 # irrigation_efficiency.py - Function 001: Calculates weighted irrigation efficiency from surface and groundwater sources
@@ -36,7 +37,7 @@ def calc_irr_eff(area_eff_list,inp_lulc_val_list):
 
 
 # irrigation_efficiency.py - Function 002: Calculates overall irrigation efficiency considering all intervention types
-# Interactions: shared.utilities.safe_divide, shared.utilities.to_float, shared.utilities.convert_dtypes, pandas, numpy
+# Interactions: shared.utilities.safe_divide, shared.utilities.to_float, shared.utilities.convert_dtypes, calc_crop_irrigation_need, shared.model_state.get_label_matrix, shared.utilities.assign_columns, pandas, numpy
 def calc_overall_eff(df_mm, df_cc, crops, irr_eff):
     print("FUNCTION 40: calc_overall_eff() - Calculating overall irrigation efficiency")
     # Calculate Area_with_Intervention
@@ -124,28 +125,21 @@ def calc_overall_eff(df_mm, df_cc, crops, irr_eff):
         }, index=df_cc.index)
     ], axis=1)
 
-    # Iterate over each crop and calculate respective irrigation efficiency
-    for crop in crops:
-        irr_area_col = f"Irr_Area_{crop}"
-        eff_col = f"Irrigation_eff_{crop}"
-        iwr_col = f"IWR_{crop}"
-        water_need_col = f"Irr_water_need_{crop}"
-        final_eff_col = "Final_eff"  # Assuming "Final_eff" is present in df_cc
-
-        # Ensure "Final_eff" is available in df_cc
-        if final_eff_col in df_cc.columns:
-            # Calculate irrigation efficiency for the crop
-            df_mm[eff_col] = df_mm.apply(
-                lambda row: df_cc.loc[crop, final_eff_col] if row[irr_area_col] > 0 else 0,
-                axis=1
-            ).astype(float)
-
-        # Ensure columns exist in DataFrames
-        if iwr_col in df_mm.columns and irr_area_col in df_mm.columns and eff_col in df_mm.columns:
-            # Calculate irrigation water need for the crop
-            df_mm[water_need_col] = safe_divide(
-                (df_mm[iwr_col] / 1000) * df_mm[irr_area_col] * 10000, df_mm[eff_col]
-            )
+    # Months x crops irrigation efficiency and water need for every crop at once
+    crops = list(dict.fromkeys(crops))
+    irr_area = get_label_matrix(df_mm, "Irr_Area", crops, dtype=np.float64)
+    has_iwr = [f"IWR_{crop}" in df_mm.columns for crop in crops]
+    iwr = np.column_stack([
+        df_mm[f"IWR_{crop}"].to_numpy() if present else np.zeros(len(df_mm)) for crop, present in zip(crops, has_iwr)
+    ]) if crops else np.zeros((len(df_mm), 0))
+    irr_eff_matrix, water_need = calc_crop_irrigation_need(irr_area, iwr, df_cc.loc[crops, "Final_eff"])
+
+    crop_columns = {}
+    for j, crop in enumerate(crops):
+        crop_columns[f"Irrigation_eff_{crop}"] = irr_eff_matrix[:, j]
+        if has_iwr[j]:
+            crop_columns[f"Irr_water_need_{crop}"] = water_need[:, j]
+    df_mm = assign_columns(df_mm, crop_columns)
 
     # Sum all crop irrigation water needs across the dataset
     df_mm["Irr_water_need"] = df_mm.filter(like="Irr_water_need_").sum(axis=1)
@@ -162,4 +156,14 @@ def calc_overall_eff(df_mm, df_cc, crops, irr_eff):
     from shared.utilities import convert_dtypes
     df_cc = convert_dtypes(df_cc)
 
-    return df_cc, df_mm
\ No newline at end of file
+    return df_cc, df_mm
+
+
+# irrigation_efficiency.py - Function 003: Calculates months x crops irrigation efficiency and irrigation water need
+# Interactions: shared.utilities.safe_divide, numpy
+def calc_crop_irrigation_need(irr_area, iwr, final_eff):
+    # A crop's final efficiency applies only in months where it has irrigated area
+    irr_eff = np.where(irr_area > 0, np.asarray(final_eff, dtype=np.float64), 0.0)
+    # IWR is in mm over the irrigated area in ha; the need in cu.m is grossed up by the efficiency
+    water_need = safe_divide((iwr / 1000) * irr_area * 10000, irr_eff)
+    return irr_eff, water_need
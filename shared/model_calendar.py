@@ -0,0 +1,185 @@
+"""
+Model calendar for drought proofing tool
+
+This module contains functions for the run calendar shared by all stages:
+- Day axis facts (day number, year, month, day of year, days in month, month id)
+- Month axis facts (month-end labels, year, month, days in month)
+- Water-year derivation for any start month
+- Sowing date lookups per calendar year
+- Monthly and yearly aggregation through the precomputed month and year ids
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Builds the daily/monthly calendar once from df_dd["Date"] so stages look up months, sowing dates and water years instead of re-deriving them
+# ========================================
+
+import numpy as np
+import pandas as pd
+
+
+# Month names and abbreviations accepted for sowing and water-year start months
+MONTH_NUMBERS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6,
+    "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7, "aug": 8,
+    "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+
+# model_calendar.py - Function 001: Converts a month name or abbreviation to its month number
+# Interactions: pandas
+def get_month_number(month_name):
+    month_num = MONTH_NUMBERS.get(str(month_name).strip().lower())
+    if month_num is None:
+        # Fall back to the pandas parser for any other spelling it accepts
+        month_num = pd.to_datetime(f"{month_name} 1, 2000").month
+    return month_num
+
+
+# model_calendar.py - Function 002: Converts datetime64 values to the last day of their month
+# Interactions: numpy
+def _month_end(month_values):
+    month_values = np.asarray(month_values, dtype="datetime64[M]")
+    return ((month_values + 1).astype("datetime64[D]") - 1).astype("datetime64[ns]")
+
+
+# model_calendar.py - Function 003: Builds the run calendar from the daily dates
+# Interactions: _month_end, pandas, numpy
+def build_model_calendar(dates):
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    day_values = dates.values.astype("datetime64[D]")
+    month_values = dates.values.astype("datetime64[M]")
+    year = dates.year.to_numpy(dtype=np.int64)
+    month = dates.month.to_numpy(dtype=np.int64)
+
+    # Month ids run over every month between the first and last day, as a monthly resample does
+    first_month = month_values.min()
+    month_id = (month_values - first_month).astype(np.int64)
+    n_months = int(month_id.max()) + 1 if len(month_id) else 0
+    months = first_month + np.arange(n_months)
+    month_year = months.astype("datetime64[Y]").astype(np.int64) + 1970
+    month_num = months.astype(np.int64) % 12 + 1
+    month_days = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64)
+
+    model_calendar = {
+        "n_days": len(dates),
+        "dates": dates,
+        "day_number": day_values.astype(np.int64),
+        "year": year,
+        "month": month,
+        "day_of_year": dates.dayofyear.to_numpy(dtype=np.int64),
+        "days_in_month": month_days[month_id] if n_months else np.zeros(0, dtype=np.int64),
+        "month_id": month_id,
+        "is_first_year": year == year.min() if len(year) else np.zeros(0, dtype=bool),
+        "months": {
+            "n_months": n_months,
+            "dates": pd.DatetimeIndex(_month_end(months), name="Date"),
+            "year": month_year,
+            "month": month_num,
+            "days": month_days,
+        },
+        # Sowing start day numbers per (month, week), filled on first lookup
+        "sowing": {},
+    }
+    return model_calendar
+
+
+# model_calendar.py - Function 004: Returns the sowing start day number of each day's year and of the year before
+# Interactions: get_month_number, pandas, numpy
+def get_sowing_start_days(model_calendar, sowing_month, sowing_week):
+    key = (str(sowing_month), int(sowing_week))
+    if key not in model_calendar["sowing"]:
+        sowing_month_num = get_month_number(sowing_month)
+        # Only one start date per calendar year is needed; days pick theirs up through the year index
+        unique_years, year_idx = np.unique(model_calendar["year"], return_inverse=True)
+        start_dates = [pd.Timestamp(year=int(year), month=sowing_month_num, day=1) +
+                       pd.Timedelta(days=(int(sowing_week) - 1) * 7) for year in unique_years]
+        start_this = np.array([np.datetime64(d.date(), "D") for d in start_dates]).astype(np.int64)
+        start_prev = np.array([np.datetime64((d - pd.DateOffset(years=1)).date(), "D")
+                               for d in start_dates]).astype(np.int64)
+        model_calendar["sowing"][key] = (start_this, start_prev, year_idx)
+    start_this, start_prev, year_idx = model_calendar["sowing"][key]
+    return start_this[year_idx], start_prev[year_idx]
+
+
+# model_calendar.py - Function 005: Returns the distinct sowing start day numbers, one per calendar year
+# Interactions: get_sowing_start_days
+def get_sowing_starts(model_calendar, sowing_month, sowing_week):
+    get_sowing_start_days(model_calendar, sowing_month, sowing_week)
+    return model_calendar["sowing"][(str(sowing_month), int(sowing_week))][0]
+
+
+# model_calendar.py - Function 006: Returns the water year of each day or month for a given start month
+# Interactions: get_month_number, numpy
+def get_water_year(model_calendar, start_month=1, axis="month"):
+    start_month_num = start_month if isinstance(start_month, (int, np.integer)) else get_month_number(start_month)
+    facts = model_calendar["months"] if axis == "month" else model_calendar
+    return np.where(facts["month"] >= start_month_num, facts["year"], facts["year"] - 1)
+
+
+# model_calendar.py - Function 007: Sums a day-indexed array into month totals through the month ids
+# Interactions: numpy
+def sum_by_month(model_calendar, values):
+    values = np.asarray(values, dtype=np.float64)
+    # Missing days count as zero, as in a resampled sum
+    values = np.where(np.isnan(values), 0, values)
+    return np.bincount(model_calendar["month_id"], weights=values, minlength=model_calendar["months"]["n_months"])
+
+
+# model_calendar.py - Function 008: Aggregates daily columns to month-end rows keyed by "Date"
+# Interactions: sum_by_month, pandas, numpy
+def resample_monthly(model_calendar, df, columns, agg="sum"):
+    if len(df) != model_calendar["n_days"]:
+        raise ValueError(f"DataFrame has {len(df)} rows but the calendar holds {model_calendar['n_days']} days")
+    monthly = {"Date": model_calendar["months"]["dates"]}
+    for col in columns:
+        values = df[col].to_numpy()
+        if agg == "count_positive":
+            monthly[col] = np.bincount(model_calendar["month_id"], weights=(values > 0),
+                                       minlength=model_calendar["months"]["n_months"]).astype(np.int64)
+        elif agg == "sum":
+            totals = sum_by_month(model_calendar, values)
+            # Keep the column's own dtype, as a resampled sum does
+            if np.issubdtype(values.dtype, np.floating):
+                totals = totals.astype(values.dtype)
+            elif np.issubdtype(values.dtype, np.integer) or values.dtype == bool:
+                totals = np.rint(totals).astype(np.int64)
+            monthly[col] = totals
+        else:
+            raise ValueError(f"Unsupported calendar aggregation '{agg}'. Expected 'sum' or 'count_positive'")
+    return pd.DataFrame(monthly)
+
+
+# model_calendar.py - Function 009: Aggregates month-indexed columns to year-end rows keyed by "Date"
+# Interactions: get_year_end_dates, pandas, numpy
+def resample_yearly(model_calendar, df_mm, columns):
+    months = model_calendar["months"]
+    if len(df_mm) != months["n_months"]:
+        raise ValueError(f"DataFrame has {len(df_mm)} rows but the calendar holds {months['n_months']} months")
+    year_id = months["year"] - months["year"].min()
+    yearly = {"Date": get_year_end_dates(model_calendar)}
+    n_years = len(yearly["Date"])
+    for col in columns:
+        values = df_mm[col].to_numpy()
+        totals = np.bincount(year_id, weights=np.where(np.isnan(values.astype(np.float64)), 0, values),
+                             minlength=n_years)
+        yearly[col] = totals.astype(values.dtype) if np.issubdtype(values.dtype, np.floating) else totals
+    return pd.DataFrame(yearly)
+
+
+# model_calendar.py - Function 010: Returns the 0-based calendar month position of each month row
+# Interactions: None
+def get_month_position(model_calendar):
+    return model_calendar["months"]["month"] - 1
+
+
+# model_calendar.py - Function 011: Returns the year-end labels of every calendar year in the run
+# Interactions: pandas, numpy
+def get_year_end_dates(model_calendar):
+    month_year = model_calendar["months"]["year"]
+    first_year = month_year.min()
+    n_years = int(month_year.max() - first_year) + 1
+    year_ends = (np.arange(first_year + 1, first_year + n_years + 1) - 1970).astype("datetime64[Y]")
+    return pd.DatetimeIndex((year_ends.astype("datetime64[D]") - 1).astype("datetime64[ns]"), name="Date")
@@ -0,0 +1,151 @@
+"""
+Model state container for drought proofing tool
+
+This module contains functions for holding plot and crop indexed variables as dense arrays:
+- State creation with named day, plot, crop and variable axes, sized once from the declared variables
+- Packing wide "{var}_{plot}" / "{var}_{crop}" columns into arrays
+- Variable views that a stage reads and writes directly
+- Day x label matrices stacked straight from wide DataFrame columns
+- Unpacking arrays back to wide DataFrame columns when the stage hands its results back
+
+The state is local to one stage: stages still exchange the wide df_crop / df_dd frames, so a stage
+packs the columns its time loop needs, works on the arrays and writes its results back at its own
+boundary. Stages without a time loop read their matrices with get_label_matrix instead.
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Stores the plot/crop indexed variables of a stage as day x label x variable NumPy arrays and converts them to wide DataFrames at that stage's boundary
+# ========================================
+
+import numpy as np
+import pandas as pd
+
+
+# Default column template used to map a (variable, label) pair to a wide column name
+DEFAULT_COLUMN_TEMPLATE = "{var}_{label}"
+
+
+# model_state.py - Function 001: Creates an empty array-backed model state with named axes
+# Interactions: numpy
+def create_model_state(n_days, plots=None, crops=None, plot_vars=None, crop_vars=None, templates=None,
+                       dtype=np.float64):
+    plots = list(plots) if plots is not None else []
+    crops = list(crops) if crops is not None else []
+    plot_vars = list(plot_vars) if plot_vars is not None else []
+    crop_vars = list(crop_vars) if crop_vars is not None else []
+    state = {
+        "n_days": int(n_days),
+        "labels": {"plot": plots, "crop": crops},
+        "vars": {"plot": plot_vars, "crop": crop_vars},
+        # Column templates keyed by (axis, variable) for variables not named "{var}_{label}"
+        "templates": dict(templates) if templates is not None else {},
+        # Arrays are laid out day x label x variable and allocated once for all declared variables
+        "data": {
+            "plot": np.zeros((int(n_days), len(plots), len(plot_vars)), dtype=dtype),
+            "crop": np.zeros((int(n_days), len(crops), len(crop_vars)), dtype=dtype),
+        },
+    }
+    return state
+
+
+# model_state.py - Function 002: Validates an axis name and returns its variable list
+# Interactions: None
+def _get_axis_vars(state, axis):
+    if axis not in state["vars"]:
+        raise ValueError(f"Unknown state axis '{axis}'. Expected one of {list(state['vars'])}")
+    return state["vars"][axis]
+
+
+# model_state.py - Function 003: Returns a day x label view of one state variable
+# Interactions: _get_axis_vars
+def get_state_var(state, axis, var):
+    axis_vars = _get_axis_vars(state, axis)
+    if var not in axis_vars:
+        raise ValueError(f"Variable '{var}' was not declared on state axis '{axis}' when the state was created")
+    # Basic slicing returns a view, so writes go straight into the state array
+    return state["data"][axis][:, :, axis_vars.index(var)]
+
+
+# model_state.py - Function 004: Builds the wide column name for a state variable and axis label
+# Interactions: None
+def state_column_name(state, axis, var, label):
+    template = state["templates"].get((axis, var), DEFAULT_COLUMN_TEMPLATE)
+    return template.format(var=var, label=label)
+
+
+# model_state.py - Function 005: Packs wide "{var}_{label}" columns of a DataFrame into state variables
+# Interactions: get_state_var, state_column_name, numpy
+def pack_columns(state, df, axis, var_list, fill_value=0):
+    if len(df) != state["n_days"]:
+        raise ValueError(f"DataFrame has {len(df)} rows but the state holds {state['n_days']} days")
+    labels = state["labels"][axis]
+    for var in var_list:
+        view = get_state_var(state, axis, var)
+        for j, label in enumerate(labels):
+            col = state_column_name(state, axis, var, label)
+            if col in df.columns:
+                view[:, j] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=view.dtype)
+            else:
+                print(f"Warning: Column {col} not found, filling state variable with {fill_value}")
+                view[:, j] = fill_value
+    return state
+
+
+# model_state.py - Function 006: Unpacks state variables into a wide DataFrame at the stage boundary
+# Interactions: get_state_var, state_column_name, pandas
+def unpack_columns(state, axis, var_list, index=None, dtype=np.float32, label_major=False):
+    labels = state["labels"][axis]
+    if label_major:
+        pairs = [(var, j, label) for j, label in enumerate(labels) for var in var_list]
+    else:
+        pairs = [(var, j, label) for var in var_list for j, label in enumerate(labels)]
+    columns = {}
+    for var, j, label in pairs:
+        values = get_state_var(state, axis, var)[:, j]
+        columns[state_column_name(state, axis, var, label)] = values.astype(dtype) if dtype is not None else values
+    return pd.DataFrame(columns, index=index)
+
+
+# model_state.py - Function 007: Replaces or appends unpacked state columns on an existing wide DataFrame
+# Interactions: unpack_columns, pandas
+def write_state_to_frame(df, state, axis, var_list, dtype=np.float32, label_major=False):
+    df_state = unpack_columns(state, axis, var_list, index=df.index, dtype=dtype, label_major=label_major)
+    existing = [col for col in df_state.columns if col in df.columns]
+    for col in existing:
+        df[col] = df_state[col]
+    new_cols = df_state.drop(columns=existing)
+    if not new_cols.empty:
+        df = pd.concat([df, new_cols], axis=1)
+    return df
+
+
+# model_state.py - Function 008: Builds the crop x plot incidence matrix from the crop -> plot map
+# Interactions: numpy
+def get_crop_plot_incidence(valid_crops_df, crops=None, plots=None):
+    crops = list(dict.fromkeys(valid_crops_df["Crop"])) if crops is None else list(dict.fromkeys(crops))
+    plots = list(valid_crops_df["Plot"].unique()) if plots is None else list(plots)
+    crop_pos = {crop: i for i, crop in enumerate(crops)}
+    plot_pos = {plot: j for j, plot in enumerate(plots)}
+    incidence = np.zeros((len(crops), len(plots)), dtype=np.float64)
+    for crop, plot in zip(valid_crops_df["Crop"], valid_crops_df["Plot"]):
+        if crop in crop_pos and plot in plot_pos:
+            incidence[crop_pos[crop], plot_pos[plot]] += 1
+    return crops, plots, incidence
+
+
+# model_state.py - Function 009: Sums day x crop values into day x plot totals through the incidence matrix
+# Interactions: numpy
+def sum_crops_by_plot(crop_values, incidence):
+    return np.asarray(crop_values, dtype=np.float64) @ incidence
+
+
+# model_state.py - Function 010: Stacks wide "{var}_{label}" columns of a DataFrame into a day x label matrix
+# Interactions: numpy
+def get_label_matrix(df, var, labels, dtype=None, template=DEFAULT_COLUMN_TEMPLATE):
+    columns = [template.format(var=var, label=label) for label in labels]
+    if not columns:
+        return np.zeros((len(df), 0), dtype=dtype if dtype is not None else np.float64)
+    # Selecting all label columns at once copies one block instead of one Series per label
+    return df[columns].to_numpy(dtype=dtype)
@@ -0,0 +1,115 @@
+"""
+Rainfall ensemble generation for drought proofing tool
+
+This module contains functions for building rainfall realizations on the model calendar:
+- Block bootstrap of whole years from the observed daily rainfall
+- User-supplied member files in the pcp.csv layout
+- Daily 5-day antecedent rainfall and monthly rain totals for all members at once
+- Percentile bands of member results
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Generates members x days rainfall arrays aligned to the model calendar and summarises member results as percentile bands
+# ========================================
+
+import numpy as np
+import pandas as pd
+from shared.data_readers import get_pcp_value
+
+
+# Percentiles reported for every ensemble metric
+DEFAULT_PERCENTILES = [5, 25, 50, 75, 95]
+
+
+# rainfall_ensemble.py - Function 001: Returns the first day index and length of each calendar year
+# Interactions: numpy
+def _get_year_spans(model_calendar):
+    years, year_start, year_len = np.unique(model_calendar["year"], return_index=True, return_counts=True)
+    return years, year_start, year_len
+
+
+# rainfall_ensemble.py - Function 002: Builds rainfall members by block-bootstrapping whole years of the record
+# Interactions: _get_year_spans, numpy
+def bootstrap_rainfall_members(model_calendar, rainfall, n_members, block_years=1, seed=None):
+    rainfall = np.asarray(rainfall, dtype=np.float64)
+    if len(rainfall) != model_calendar["n_days"]:
+        raise ValueError(f"Rainfall has {len(rainfall)} days but the calendar holds {model_calendar['n_days']} days")
+    years, year_start, year_len = _get_year_spans(model_calendar)
+    n_years = len(years)
+    block_years = int(block_years)
+    if block_years < 1 or block_years > n_years:
+        raise ValueError(f"Block length must be between 1 and {n_years} years, got {block_years}")
+
+    # Each member draws runs of consecutive source years, keeping multi-year dry spells intact within a block
+    rng = np.random.default_rng(seed)
+    n_blocks = -(-n_years // block_years)
+    block_starts = rng.integers(0, n_years - block_years + 1, size=(int(n_members), n_blocks))
+    source_year = (np.repeat(block_starts, block_years, axis=1) +
+                   np.tile(np.arange(block_years), n_blocks))[:, :n_years]
+
+    # Days take the same day of year from their source year, clamped where the source year is shorter
+    day_year = np.searchsorted(years, model_calendar["year"])
+    day_offset = model_calendar["day_of_year"] - 1
+    member_year = source_year[:, day_year]
+    source_day = year_start[member_year] + np.minimum(day_offset, year_len[member_year] - 1)
+    return rainfall[source_day]
+
+
+# rainfall_ensemble.py - Function 003: Reads user-supplied rainfall member files laid out like pcp.csv
+# Interactions: shared.data_readers.get_pcp_value, numpy
+def read_rainfall_members(member_paths, model_calendar):
+    members = []
+    for path in member_paths:
+        df_member = get_pcp_value(path)
+        if len(df_member) != model_calendar["n_days"] or not np.array_equal(
+                df_member["Date"].values.astype("datetime64[D]"),
+                model_calendar["dates"].values.astype("datetime64[D]")):
+            raise ValueError(f"Rainfall member {path} does not cover the model dates")
+        members.append(df_member["Pi"].to_numpy(dtype=np.float64))
+    return np.vstack(members) if members else np.zeros((0, model_calendar["n_days"]))
+
+
+# rainfall_ensemble.py - Function 004: Calculates the trailing 5-day rainfall of every member day
+# Interactions: numpy
+def calc_last_5_days_rain(rainfall, window=5):
+    rainfall = np.atleast_2d(np.asarray(rainfall, dtype=np.float64))
+    totals = np.cumsum(np.nan_to_num(rainfall), axis=1)
+    # The first days sum what is available, as a rolling sum with min_periods=1 does
+    totals[:, window:] = totals[:, window:] - totals[:, :-window]
+    return totals
+
+
+# rainfall_ensemble.py - Function 005: Sums member rainfall into monthly totals through the calendar month ids
+# Interactions: numpy
+def calc_member_monthly_rain(model_calendar, rainfall):
+    rainfall = np.atleast_2d(np.asarray(rainfall, dtype=np.float64))
+    month_id = model_calendar["month_id"]
+    n_months = model_calendar["months"]["n_months"]
+    # Daily rows are in date order, so each month is one contiguous run of days
+    month_ids, month_starts = np.unique(month_id, return_index=True)
+    monthly = np.zeros((rainfall.shape[0], n_months), dtype=np.float64)
+    monthly[:, month_ids] = np.add.reduceat(np.nan_to_num(rainfall), month_starts, axis=1)
+    return monthly
+
+
+# rainfall_ensemble.py - Function 006: Calculates percentile bands across the member axis
+# Interactions: numpy
+def calc_percentile_bands(member_values, percentiles=None):
+    percentiles = DEFAULT_PERCENTILES if percentiles is None else list(percentiles)
+    member_values = np.asarray(member_values, dtype=np.float64)
+    return np.nanpercentile(member_values, percentiles, axis=0)
+
+
+# rainfall_ensemble.py - Function 007: Builds a band table with one column per metric and percentile
+# Interactions: calc_percentile_bands, pandas, numpy
+def build_band_frame(dates, member_metrics, percentiles=None):
+    percentiles = DEFAULT_PERCENTILES if percentiles is None else list(percentiles)
+    band_columns = {"Date": dates}
+    for metric, values in member_metrics.items():
+        bands = calc_percentile_bands(values, percentiles)
+        for k, percentile in enumerate(percentiles):
+            band_columns[f"{metric}_P{percentile:g}"] = bands[k]
+        band_columns[f"{metric}_Mean"] = np.nanmean(values, axis=0)
+    return pd.DataFrame(band_columns)
@@ -0,0 +1,150 @@
+"""
+Run context for drought proofing tool
+
+This module contains functions for holding the state of one model run:
+- Model constants copied from config_constants with per-run overrides
+- Input file paths, parsed input CSVs and collected input variables cached for the run only
+- In-memory input tables that stand in for input files
+- Mutable run state such as the Rice ETc counter
+- The run context active in the current thread or task
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Keeps constants, input caches and mutable state per run so several scenarios or sites can run in one process or in threads without sharing module-level state
+# ========================================
+
+import os
+import copy
+import contextlib
+import contextvars
+import pandas as pd
+from shared import config_constants
+
+
+# Context of the run executing in the current thread or task; None outside a run
+_active_context = contextvars.ContextVar("run_context", default=None)
+
+
+# run_context.py - Function 001: Returns the default model constants as a name -> value dictionary
+# Interactions: shared.config_constants
+def get_default_constants():
+    return {name: value for name, value in vars(config_constants).items()
+            if not name.startswith("_") and isinstance(value, (int, float, str))}
+
+
+# run_context.py - Function 002: Creates the context holding one run's constants, caches and mutable state
+# Interactions: get_default_constants
+def create_run_context(inp_source, master_path, scenario_num=0, file_paths=None, constants=None, tables=None):
+    run_constants = get_default_constants()
+    for name, value in (constants or {}).items():
+        if name not in run_constants:
+            raise ValueError(f"Unknown model constant '{name}'")
+        run_constants[name] = value
+    context = {
+        "inp_source": inp_source,
+        "master_path": master_path,
+        "scenario_num": scenario_num,
+        "file_paths": dict(file_paths) if file_paths is not None else None,
+        "constants": run_constants,
+        # Rice ETc allowance counter shared by the ETc stage of this run only
+        "counter": [0],
+        "csv_cache": {},
+        "inputs": {},
+        # Tables keyed by file path that readers use instead of the file
+        "tables": dict(tables) if tables is not None else {},
+        # Parsed daily climate and run calendar shared by sites on the same climate series; None builds them
+        "climate_stages": None,
+    }
+    return context
+
+
+# run_context.py - Function 003: Makes a context the active one for the enclosed block
+# Interactions: contextlib, contextvars
+@contextlib.contextmanager
+def activate_run_context(context):
+    token = _active_context.set(context)
+    try:
+        yield context
+    finally:
+        _active_context.reset(token)
+
+
+# run_context.py - Function 004: Returns the context active in the current thread or task
+# Interactions: None
+def get_active_context():
+    return _active_context.get()
+
+
+# run_context.py - Function 005: Returns a model constant from the active context, or its default outside a run
+# Interactions: get_active_context, shared.config_constants
+def get_constant(name):
+    context = get_active_context()
+    if context is not None:
+        return context["constants"][name]
+    return getattr(config_constants, name)
+
+
+# run_context.py - Function 006: Returns the active context's file paths when it covers this input source and folder
+# Interactions: get_active_context
+def get_context_file_paths(inp_source, master_path):
+    context = get_active_context()
+    if context is None or context["file_paths"] is None:
+        return None
+    if context["inp_source"] != inp_source or context["master_path"] != master_path:
+        return None
+    return context["file_paths"]
+
+
+# run_context.py - Function 007: Reads a header-less input CSV once per run
+# Interactions: get_active_context, pandas, os
+def read_run_csv(file_path):
+    context = get_active_context()
+    if context is not None and file_path in context["csv_cache"]:
+        return context["csv_cache"][file_path]
+    if context is not None and file_path in context["tables"]:
+        context["csv_cache"][file_path] = context["tables"][file_path]
+        return context["tables"][file_path]
+    df = pd.read_csv(file_path, header=None) if file_path and os.path.exists(file_path) else pd.DataFrame()
+    if context is not None:
+        context["csv_cache"][file_path] = df
+    return df
+
+
+# run_context.py - Function 007A: Reads an input table from the active context's in-memory tables, or from disk
+# Interactions: get_active_context, pandas
+def read_run_table(file_path, **read_kwargs):
+    context = get_active_context()
+    if context is not None and file_path in context["tables"]:
+        # Readers reshape what they read, so the stored table is never handed out directly
+        return context["tables"][file_path].copy()
+    return pd.read_csv(file_path, **read_kwargs)
+
+
+# run_context.py - Function 008: Returns a copy of a collected input stored on the active context
+# Interactions: get_active_context, copy
+def get_run_input(key):
+    context = get_active_context()
+    if context is None or key not in context["inputs"]:
+        return None
+    # Callers may edit the collected dictionaries, so each one gets its own copy
+    return copy.deepcopy(context["inputs"][key])
+
+
+# run_context.py - Function 009: Stores a collected input on the active context and returns it
+# Interactions: get_active_context, copy
+def store_run_input(key, value):
+    context = get_active_context()
+    if context is not None:
+        context["inputs"][key] = copy.deepcopy(value)
+    return value
+
+
+# run_context.py - Function 010: Drops the cached input files and collected inputs of the active context
+# Interactions: get_active_context
+def clear_run_caches():
+    context = get_active_context()
+    if context is not None:
+        context["csv_cache"].clear()
+        context["inputs"].clear()
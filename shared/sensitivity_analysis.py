@@ -0,0 +1,117 @@
+"""
+Global sensitivity analysis for drought proofing tool
+
+This module contains functions for sampling parameters and calculating sensitivity indices:
+- Morris one-at-a-time trajectories on a level grid of the unit hypercube
+- Morris elementary effect statistics (mu, mu*, sigma)
+- Saltelli sample blocks for Sobol indices
+- Sobol first-order and total-order indices
+- Ranked index tables per output metric
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Generates Morris and Saltelli parameter samples on the unit hypercube and turns model results into ranked Morris and Sobol indices
+# ========================================
+
+import numpy as np
+import pandas as pd
+
+
+# Grid levels of the Morris design
+DEFAULT_MORRIS_LEVELS = 4
+
+
+# sensitivity_analysis.py - Function 001: Samples Morris trajectories that change one parameter per step
+# Interactions: numpy
+def sample_morris_trajectories(n_params, n_trajectories, levels=DEFAULT_MORRIS_LEVELS, seed=None):
+    if levels < 2 or levels % 2:
+        raise ValueError(f"Morris levels must be an even number of at least 2, got {levels}")
+    rng = np.random.default_rng(seed)
+    delta = levels / (2 * (levels - 1))
+    # Starting points sit in the lower part of the grid so every step of +delta stays inside the unit cube
+    start_levels = np.arange(levels // 2) / (levels - 1)
+    points = np.empty((int(n_trajectories), n_params + 1, n_params))
+    order = np.empty((int(n_trajectories), n_params), dtype=int)
+    for t in range(int(n_trajectories)):
+        point = rng.choice(start_levels, size=n_params)
+        order[t] = rng.permutation(n_params)
+        points[t, 0] = point
+        for step, param in enumerate(order[t]):
+            point = point.copy()
+            point[param] += delta
+            points[t, step + 1] = point
+    return points, order, delta
+
+
+# sensitivity_analysis.py - Function 002: Calculates Morris mu, mu* and sigma from the results along each trajectory
+# Interactions: numpy
+def calc_morris_indices(order, results, delta):
+    # results: trajectories x (parameters + 1) values of one metric
+    results = np.asarray(results, dtype=np.float64)
+    n_params = order.shape[1]
+    effects = np.empty((order.shape[0], n_params))
+    steps = np.diff(results, axis=1) / delta
+    for t in range(order.shape[0]):
+        effects[t, order[t]] = steps[t]
+    return {
+        "mu": np.nanmean(effects, axis=0),
+        "mu_star": np.nanmean(np.abs(effects), axis=0),
+        "sigma": np.nanstd(effects, axis=0, ddof=1) if order.shape[0] > 1 else np.full(n_params, np.nan),
+    }
+
+
+# sensitivity_analysis.py - Function 003: Samples Saltelli blocks of A, B and the A rows with one column taken from B
+# Interactions: numpy
+def sample_saltelli_blocks(n_params, n_samples, seed=None):
+    rng = np.random.default_rng(seed)
+    a = rng.random((int(n_samples), n_params))
+    b = rng.random((int(n_samples), n_params))
+    # Each block holds A_j, B_j, then A_j with parameter i from B_j for every i
+    blocks = np.empty((int(n_samples), n_params + 2, n_params))
+    blocks[:, 0] = a
+    blocks[:, 1] = b
+    for i in range(n_params):
+        blocks[:, i + 2] = a
+        blocks[:, i + 2, i] = b[:, i]
+    return blocks
+
+
+# sensitivity_analysis.py - Function 004: Calculates Sobol first-order and total-order indices from Saltelli block results
+# Interactions: numpy
+def calc_sobol_indices(results):
+    # results: samples x (parameters + 2) values of one metric, laid out like the Saltelli blocks
+    results = np.asarray(results, dtype=np.float64)
+    f_a, f_b, f_ab = results[:, 0], results[:, 1], results[:, 2:]
+    variance = np.var(np.concatenate([f_a, f_b]))
+    if not variance > 0:
+        # A metric that never moves has no variance to attribute
+        n_params = f_ab.shape[1]
+        return {"S1": np.zeros(n_params), "ST": np.zeros(n_params)}
+    # Saltelli (2010) first-order and Jansen total-order estimators
+    first_order = np.mean(f_b[:, None] * (f_ab - f_a[:, None]), axis=0) / variance
+    total_order = 0.5 * np.mean((f_a[:, None] - f_ab) ** 2, axis=0) / variance
+    return {"S1": first_order, "ST": total_order}
+
+
+# sensitivity_analysis.py - Function 005: Scales unit hypercube samples to the parameter bounds
+# Interactions: numpy
+def scale_unit_samples(unit_samples, lows, highs):
+    lows = np.asarray(lows, dtype=np.float64)
+    highs = np.asarray(highs, dtype=np.float64)
+    return lows + np.asarray(unit_samples, dtype=np.float64) * (highs - lows)
+
+
+# sensitivity_analysis.py - Function 006: Builds a table of indices per metric and parameter, ranked within each metric
+# Interactions: pandas
+def build_ranked_index_frame(metric_indices, parameter_names, rank_by):
+    frames = []
+    for metric, indices in metric_indices.items():
+        df_metric = pd.DataFrame({"Metric": metric, "Parameter": parameter_names, **indices})
+        # Rank 1 is the parameter the metric is most sensitive to
+        df_metric["Rank"] = df_metric[rank_by].rank(ascending=False, method="min", na_option="bottom").astype(int)
+        frames.append(df_metric.sort_values("Rank", kind="stable"))
+    if not frames:
+        return pd.DataFrame(columns=["Metric", "Parameter", rank_by, "Rank"])
+    return pd.concat(frames, ignore_index=True)
@@ -15,18 +15,25 @@ This module contains common utility functions:
 import numpy as np
 import pandas as pd
 import calendar
+from shared.model_calendar import resample_monthly
+from shared.model_state import get_label_matrix
+from shared.run_context import read_run_table
 
 
 # utilities.py - Function 001: Resamples time series data from one dataframe and merges with another from CSV
-# Interactions: pandas
-def resample(df1, df2_path, date_col, resample_col, freq="M", agg_func="sum"):
+# Interactions: shared.model_calendar.resample_monthly, shared.run_context.read_run_table, pandas
+def resample(df1, df2_path, date_col, resample_col, freq="M", agg_func="sum", model_calendar=None):
     try:
         # Read the CSV file into df2 with optimized settings
-        df2 = pd.read_csv(df2_path, engine='c', low_memory=False)
+        df2 = read_run_table(df2_path, engine='c', low_memory=False)
         # Ensure the date_col is in datetime format
         df1[date_col] = pd.to_datetime(df1[date_col])
         # Perform the resampling
-        if isinstance(agg_func, str):
+        if model_calendar is not None and freq == "M" and agg_func == "sum":
+            # Monthly sums come straight from the precomputed calendar month ids
+            df_resamp = resample_monthly(model_calendar, df1, [resample_col]).set_index("Date")[resample_col]
+            df_resamp.index.name = date_col
+        elif isinstance(agg_func, str):
             df_resamp = df1.resample(freq, on=date_col)[resample_col].agg(agg_func)
         else:
             df_resamp = df1.resample(freq, on=date_col)[resample_col].apply(agg_func)
@@ -235,38 +242,69 @@ def process_season_data(season, crops, sowing_months, sowing_weeks, irrigated_ar
 # utilities.py - Function 016: Performs safe division with zero handling
 # Interactions: numpy
 def safe_divide(numerator, denominator):
-    return np.where(denominator != 0, numerator / denominator, 0)
+    numerator = np.asarray(numerator)
+    denominator = np.asarray(denominator)
+    # Only non-zero denominators are divided, so zero or empty rows raise no divide warnings
+    dtype = np.result_type(numerator, denominator, np.float16)
+    out = np.zeros(np.broadcast_shapes(numerator.shape, denominator.shape), dtype=dtype)
+    return np.divide(numerator, denominator, out=out, where=denominator != 0)
 
 
 # utilities.py - Function 017: Calculates monthly remaining growth days and updates monthly dataframe
-# Interactions: pandas
-def calc_monthly_remaining_growth_days(df, crops, df_mm, df_cc):
+# Interactions: shared.model_calendar.resample_monthly, shared.model_state.get_label_matrix, calc_crop_area_matrix, assign_columns, pandas
+def calc_monthly_remaining_growth_days(df, crops, df_mm, df_cc, model_calendar):
     print("FUNCTION 20: calc_monthly_remaining_growth_days() - Calculating monthly remaining growth days")
     rg_days_cols = [col for col in df.columns if col.startswith("RG_days_")]
-    df_filtered = df[rg_days_cols + ["Date"]]
 
-    # Resample and count positive values for RG_days_ columns
-    monthly_counts = df_filtered.set_index("Date").resample("M").apply(lambda x: (x > 0).sum())
+    # Count positive values for RG_days_ columns per calendar month
+    monthly_counts = resample_monthly(model_calendar, df, rg_days_cols, agg="count_positive")
 
-    # Reset index of monthly_counts to align with df_mm
-    monthly_counts_reset = monthly_counts.reset_index(drop=True)
+    # Drop the month labels so the counts align with df_mm by position
+    monthly_counts_reset = monthly_counts.drop(columns="Date")
 
     # Update df_mm directly with the new monthly counts
     df_mm_updated = df_mm.join(monthly_counts_reset, how="left")
 
-    for crop in crops:
-        crop_col = f"RG_days_{crop}"
-        irr_col = f"Irr_Area_{crop}"
-        rainfed_col = f"Rainfed_Area_{crop}"
-
-        if crop_col in df_mm_updated.columns:
-            df_mm_updated[irr_col] = df_mm_updated.apply(
-                lambda row: df_cc.loc[crop, "Irr_Area"] if row[crop_col] > 0 else 0,
-                axis=1
-            ).astype(float)
-
-            df_mm_updated[rainfed_col] = df_mm_updated.apply(
-                lambda row: df_cc.loc[crop, "Rainfed_Area"] if row[crop_col] > 0 else 0,
-                axis=1
-            ).astype(float)
-    return df_mm_updated
\ No newline at end of file
+    # Months x crops: a crop holds its irrigated and rainfed area in every month it is growing
+    area_crops = list(dict.fromkeys(crop for crop in crops if f"RG_days_{crop}" in df_mm_updated.columns))
+    active = get_label_matrix(df_mm_updated, "RG_days", area_crops) > 0
+    irr_area, rainfed_area = calc_crop_area_matrix(active, df_cc, area_crops)
+
+    area_columns = {}
+    for j, crop in enumerate(area_crops):
+        area_columns[f"Irr_Area_{crop}"] = irr_area[:, j]
+        area_columns[f"Rainfed_Area_{crop}"] = rainfed_area[:, j]
+    return assign_columns(df_mm_updated, area_columns)
+
+
+# utilities.py - Function 018: Assigns a dictionary of columns to a dataframe in one block
+# Interactions: pandas
+def assign_columns(df, columns):
+    # Existing columns are replaced in place; new ones are added with a single concat to avoid fragmentation
+    new_cols = {}
+    for col, values in columns.items():
+        if col in df.columns:
+            df[col] = values
+        else:
+            new_cols[col] = values
+    if new_cols:
+        df = pd.concat([df, pd.DataFrame(new_cols, index=df.index)], axis=1)
+    return df
+
+
+# utilities.py - Function 019: Builds months x crops irrigated and rainfed area matrices from active-month masks
+# Interactions: numpy
+def calc_crop_area_matrix(active, df_cc, crops):
+    irr_area = df_cc.loc[crops, "Irr_Area"].to_numpy(dtype=np.float64)
+    rainfed_area = df_cc.loc[crops, "Rainfed_Area"].to_numpy(dtype=np.float64)
+    return np.where(active, irr_area, 0.0), np.where(active, rainfed_area, 0.0)
+
+
+# utilities.py - Function 020: Returns the position of the first key/value table row named var_name, or None
+# Interactions: numpy
+def find_variable_row(df, var_name):
+    if df.shape[0] == 0 or df.shape[1] == 0:
+        return None
+    # One comparison over the name column replaces a cell-by-cell scan of the table
+    matches = np.flatnonzero(df.iloc[:, 0].to_numpy() == var_name)
+    return int(matches[0]) if len(matches) else None
@@ -0,0 +1,164 @@
+"""
+Stochastic daily weather generator for drought proofing tool
+
+This module contains functions for fitting and sampling synthetic weather on the model calendar:
+- Monthly wet/dry first-order Markov chain for rain occurrence
+- Monthly gamma distributions for wet-day rain amounts
+- Monthly Tmin/Tmax perturbations with cross and month-to-month correlation
+- Seeded members x days rainfall and members x months temperature arrays
+
+@author: Dr. Jagadeesh, Consultant, IWMI
+"""
+
+# ========================================
+# FILE PURPOSE: Fits a Markov-chain/gamma rainfall and monthly temperature perturbation generator to the recorded pcp.csv and temp.csv series and samples realizations as arrays
+# ========================================
+
+import numpy as np
+
+
+# Daily rain (mm) above which a day counts as wet
+DEFAULT_WET_THRESHOLD = 0.1
+# Smallest Tmax - Tmin spread (deg C) kept in generated months so the Hargreaves term stays defined
+MIN_TEMPERATURE_RANGE = 0.1
+
+
+# weather_generator.py - Function 001: Fits the monthly wet/dry transition probabilities of daily rain occurrence
+# Interactions: numpy
+def fit_rain_occurrence(model_calendar, rainfall, wet_threshold=DEFAULT_WET_THRESHOLD):
+    rainfall = np.nan_to_num(np.asarray(rainfall, dtype=np.float64))
+    if len(rainfall) != model_calendar["n_days"]:
+        raise ValueError(f"Rainfall has {len(rainfall)} days but the calendar holds {model_calendar['n_days']} days")
+    wet = rainfall > wet_threshold
+    # Transitions are attributed to the calendar month of the day being entered
+    month_pos = model_calendar["month"][1:] - 1
+    prev_wet, now_wet = wet[:-1], wet[1:]
+    dry_days = np.bincount(month_pos, weights=~prev_wet, minlength=12)
+    wet_days = np.bincount(month_pos, weights=prev_wet, minlength=12)
+    dry_to_wet = np.bincount(month_pos, weights=~prev_wet & now_wet, minlength=12)
+    wet_to_wet = np.bincount(month_pos, weights=prev_wet & now_wet, minlength=12)
+
+    # Months without one of the previous states fall back to the month's wet-day frequency
+    wet_frequency = np.bincount(model_calendar["month"] - 1, weights=wet, minlength=12) / np.maximum(
+        np.bincount(model_calendar["month"] - 1, minlength=12), 1)
+    p_dry_wet = np.where(dry_days > 0, dry_to_wet / np.maximum(dry_days, 1), wet_frequency)
+    p_wet_wet = np.where(wet_days > 0, wet_to_wet / np.maximum(wet_days, 1), wet_frequency)
+    return p_dry_wet, p_wet_wet
+
+
+# weather_generator.py - Function 002: Fits monthly gamma distributions to wet-day rain above the threshold
+# Interactions: numpy
+def fit_rain_amounts(model_calendar, rainfall, wet_threshold=DEFAULT_WET_THRESHOLD):
+    rainfall = np.nan_to_num(np.asarray(rainfall, dtype=np.float64))
+    wet = rainfall > wet_threshold
+    month_pos = model_calendar["month"][wet] - 1
+    excess = rainfall[wet] - wet_threshold
+    counts = np.bincount(month_pos, minlength=12)
+    means = np.bincount(month_pos, weights=excess, minlength=12) / np.maximum(counts, 1)
+    variances = np.bincount(month_pos, weights=excess ** 2, minlength=12) / np.maximum(counts, 1) - means ** 2
+
+    # Method of moments; months with too few wet days fall back to an exponential with the same mean
+    fitted = (counts > 1) & (variances > 0) & (means > 0)
+    shape = np.where(fitted, means ** 2 / np.where(fitted, variances, 1), 1.0)
+    scale = np.where(fitted, variances / np.where(fitted, means, 1), means)
+    return shape, scale
+
+
+# weather_generator.py - Function 003: Fits monthly Tmin/Tmax means, spreads and anomaly correlations
+# Interactions: numpy
+def fit_temperature_perturbations(model_calendar, tmin, tmax):
+    month_pos = model_calendar["months"]["month"] - 1
+    temps = np.column_stack([np.asarray(tmin, dtype=np.float64), np.asarray(tmax, dtype=np.float64)])
+    if len(temps) != len(month_pos):
+        raise ValueError(f"Temperature has {len(temps)} months but the calendar holds {len(month_pos)} months")
+    counts = np.bincount(month_pos, minlength=12)[:, None]
+    means = np.stack([np.bincount(month_pos, weights=temps[:, k], minlength=12) for k in range(2)], axis=1)
+    means = means / np.maximum(counts, 1)
+    anomalies = temps - means[month_pos]
+    stds = np.sqrt(np.stack([np.bincount(month_pos, weights=anomalies[:, k] ** 2, minlength=12)
+                             for k in range(2)], axis=1) / np.maximum(counts - 1, 1))
+
+    # Standardized anomalies give one Tmin/Tmax correlation and one lag-1 persistence per variable
+    z = anomalies / np.where(stds > 0, stds, 1)[month_pos]
+    cross_corr = np.corrcoef(z[:, 0], z[:, 1])[0, 1] if len(z) > 2 else 0.0
+    lag_corr = np.array([np.corrcoef(z[:-1, k], z[1:, k])[0, 1] if len(z) > 2 else 0.0 for k in range(2)])
+    return {
+        "means": means,
+        "stds": stds,
+        "cross_corr": float(np.clip(np.nan_to_num(cross_corr), -0.99, 0.99)),
+        "lag_corr": np.clip(np.nan_to_num(lag_corr), -0.99, 0.99),
+    }
+
+
+# weather_generator.py - Function 004: Fits every generator component to the recorded daily rain and monthly temperatures
+# Interactions: fit_rain_occurrence, fit_rain_amounts, fit_temperature_perturbations
+def fit_weather_generator(model_calendar, rainfall, tmin, tmax, wet_threshold=DEFAULT_WET_THRESHOLD):
+    p_dry_wet, p_wet_wet = fit_rain_occurrence(model_calendar, rainfall, wet_threshold)
+    shape, scale = fit_rain_amounts(model_calendar, rainfall, wet_threshold)
+    return {
+        "wet_threshold": float(wet_threshold),
+        "p_dry_wet": p_dry_wet,
+        "p_wet_wet": p_wet_wet,
+        "gamma_shape": shape,
+        "gamma_scale": scale,
+        "temperature": fit_temperature_perturbations(model_calendar, tmin, tmax),
+    }
+
+
+# weather_generator.py - Function 005: Samples members x days rainfall from the fitted occurrence chain and gamma amounts
+# Interactions: numpy
+def simulate_rainfall(generator, model_calendar, n_members, rng):
+    n_members, n_days = int(n_members), model_calendar["n_days"]
+    month_pos = model_calendar["month"] - 1
+    p_dry_wet = generator["p_dry_wet"][month_pos]
+    p_wet_wet = generator["p_wet_wet"][month_pos]
+
+    # The first day starts from the chain's stationary wet probability for its month
+    u = rng.random((n_days, n_members))
+    wet = np.empty((n_days, n_members), dtype=bool)
+    if n_days:
+        stationary = p_dry_wet[0] / max(1 - p_wet_wet[0] + p_dry_wet[0], 1e-12)
+        wet[0] = u[0] < stationary
+    # Only the occurrence chain is sequential; each step covers all members at once
+    for t in range(1, n_days):
+        wet[t] = u[t] < np.where(wet[t - 1], p_wet_wet[t], p_dry_wet[t])
+
+    amounts = rng.gamma(generator["gamma_shape"][month_pos][:, None],
+                        generator["gamma_scale"][month_pos][:, None], size=(n_days, n_members))
+    return np.where(wet, amounts + generator["wet_threshold"], 0.0).T
+
+
+# weather_generator.py - Function 006: Samples members x months Tmin, Tmax and Tmean from the fitted perturbations
+# Interactions: numpy
+def simulate_temperature(generator, model_calendar, n_members, rng):
+    params = generator["temperature"]
+    n_members = int(n_members)
+    month_pos = model_calendar["months"]["month"] - 1
+    n_months = len(month_pos)
+    lag_corr = params["lag_corr"]
+    rho = params["cross_corr"]
+
+    # Correlated innovations feed a lag-1 autoregression of the standardized anomalies
+    e = rng.standard_normal((n_months, n_members, 2))
+    e[:, :, 1] = rho * e[:, :, 0] + np.sqrt(1 - rho ** 2) * e[:, :, 1]
+    z = np.empty_like(e)
+    if n_months:
+        z[0] = e[0]
+    innovation_scale = np.sqrt(1 - lag_corr ** 2)
+    for t in range(1, n_months):
+        z[t] = lag_corr * z[t - 1] + innovation_scale * e[t]
+
+    temps = params["means"][month_pos][:, None, :] + params["stds"][month_pos][:, None, :] * z
+    tmin = temps[:, :, 0].T
+    tmax = np.maximum(temps[:, :, 1].T, tmin + MIN_TEMPERATURE_RANGE)
+    return tmin, tmax, (tmin + tmax) / 2
+
+
+# weather_generator.py - Function 007: Generates seeded weather members aligned to the model calendar
+# Interactions: simulate_rainfall, simulate_temperature, numpy
+def generate_weather_members(generator, model_calendar, n_members, seed=None):
+    # One generator stream keeps rainfall and temperature reproducible from a single seed
+    rng = np.random.default_rng(seed)
+    rainfall = simulate_rainfall(generator, model_calendar, n_members, rng)
+    tmin, tmax, tmean = simulate_temperature(generator, model_calendar, n_members, rng)
+    return {"rainfall": rainfall, "Tmin": tmin, "Tmax": tmax, "Tmean": tmean}
@@ -9,78 +9,78 @@ ET and evaporation calculations for drought proofing tool
 # ========================================
 
 import numpy as np
-from shared.utilities import to_float, safe_divide, calc_monthly_remaining_growth_days
-from orchestrator.input_collector import collect_inp_variables, collect_int_variables
+import pandas as pd
+from shared.utilities import to_float, safe_divide, calc_monthly_remaining_growth_days, assign_columns
+from shared.model_state import get_label_matrix
+from orchestrator.input_collector import collect_inp_variables
 from shared.data_readers import get_radiation_db
+from shared.model_calendar import get_month_position, resample_monthly
 from soil_storage_bucket.processing.crop_coefficients import calc_crop_kc, calc_kci_by_plot, calculate_stage_1
 from soil_storage_bucket.processing.root_depth import calc_final_crop_rd
 from soil_storage_bucket.processing.water_stress import calc_final_depletion_factor
 
 
 # evapotranspiration.py - Function 001: Calculates monthly reference evapotranspiration using Hargreaves method
-# Interactions: shared.data_readers.get_radiation_db, orchestrator.input_collector.collect_inp_variables, numpy
-def calc_etom(df_mm,file_paths,inp_source,master_path):
+# Interactions: get_monthly_radiation, calc_hargreaves_etom, orchestrator.input_collector.collect_inp_variables
+def calc_etom(df_mm,file_paths,inp_source,master_path, model_calendar):
     print("FUNCTION 27: calc_etom() - Calculating reference evapotranspiration")
     # df_rd = get_radiation_db(drought_proofing_tool.radiation_db, user_input.latitude)
     
-    radiation_db = file_paths["radiation_db"]
-    df_rd = get_radiation_db(radiation_db, collect_inp_variables(inp_source,master_path)["latitude"])
-    # Initialize the ETom column with zeros
-    df_mm["ETom"] = 0.0
-
+    radiation = get_monthly_radiation(file_paths, collect_inp_variables(inp_source,master_path)["latitude"],
+                                      model_calendar)
     # Vectorized ETom calculation - much faster than iterrows
-    df_mm["month_index"] = df_mm.index % 12
-    df_mm["radiation"] = df_mm["month_index"].map(df_rd["Radiation"])
-    df_mm["ETom"] = (0.0023 * df_mm["radiation"] * np.sqrt(df_mm["Tmax"] - df_mm["Tmin"]) *
-                     (df_mm["Tmean"] + 17.8) * df_mm["Days"])
-    df_mm.drop(["month_index", "radiation"], axis=1, inplace=True)
+    df_mm["ETom"] = calc_hargreaves_etom(radiation, df_mm["Tmin"], df_mm["Tmax"], df_mm["Tmean"], df_mm["Days"])
     return df_mm
 
 
+# evapotranspiration.py - Function 001A: Returns the extraterrestrial radiation of every model month
+# Interactions: shared.data_readers.get_radiation_db, shared.model_calendar.get_month_position
+def get_monthly_radiation(file_paths, latitude, model_calendar):
+    df_rd = get_radiation_db(file_paths["radiation_db"], latitude)
+    return df_rd["Radiation"].to_numpy()[get_month_position(model_calendar)]
+
+
+# evapotranspiration.py - Function 001B: Applies the Hargreaves equation to monthly temperatures
+# Interactions: numpy
+def calc_hargreaves_etom(radiation, tmin, tmax, tmean, days):
+    # Works on Series or on member x month arrays alike
+    return 0.0023 * radiation * np.sqrt(tmax - tmin) * (tmean + 17.8) * days
+
+
 # evapotranspiration.py - Function 002: Distributes monthly reference ET to daily values
 # Interactions: pandas
-def calculate_daily_etoi(df_mm, df_dd):
+def calculate_daily_etoi(df_mm, df_dd, model_calendar):
     print("FUNCTION 28: calculate_daily_etoi() - Calculating daily ET reference")
-    # Vectorized approach - much faster than nested loops
-    daily_etoi = df_mm["ETom"] / df_mm["Days"]
-    df_dd["EToi"] = daily_etoi.repeat(df_mm["Days"]).values
+    # Each day picks up its month's daily share through the calendar month id
+    daily_etoi = (df_mm["ETom"] / df_mm["Days"]).to_numpy()
+    df_dd["EToi"] = daily_etoi[model_calendar["month_id"]]
     return df_dd
 
 
 # evapotranspiration.py - Function 003: Applies evaporation reduction factors based on conservation practices
-# Interactions: orchestrator.input_collector.collect_int_variables, shared.utilities.to_float
-def apply_eva_red(row, default_val_eva_red,inp_source,master_path):
-    int_var = collect_int_variables(inp_source,master_path)
-    # Convert "Cover_Crops_Eva_Red" based on "Cover_Area"
-    row["Cover_Eva_Red"] = ((
-        to_float(int_var["Cover_Crops_Eva_Red"], default_val_eva_red["Cover_Crops_Eva_Red"])
-        if to_float(row["Cover_Area"]) > 0
-        else default_val_eva_red["Cover_Crops_Eva_Red"]
-    ))/100
-    row["Mulching_Eva_Red"] = ((
-        to_float(int_var["Mulching_Eva_Red"], default_val_eva_red["Mulching_Eva_Red"])
-        if to_float(row["Mulching_Area"]) > 0
-        else default_val_eva_red["Mulching_Eva_Red"]
-    ))/100
-    row["Tank_Eva_Red"] = ((
-        to_float(int_var["Tank_Eva_Red"], default_val_eva_red["Tank_Eva_Red"])
-        if to_float(row["Tank_Area"]) > 0
-        else default_val_eva_red["Tank_Eva_Red"]
-    ))/100
-    row["Tillage_Eva_Red"] = ((
-        to_float(int_var["Tillage_Eva_Red"], default_val_eva_red["Tillage_Eva_Red"])
-        if to_float(row["Tillage_Area"]) > 0
-        else default_val_eva_red["Tillage_Eva_Red"]
-    ))/100
-    return row
+# Interactions: shared.utilities.to_float, pandas
+def apply_eva_red(df_cc, default_val_eva_red, int_var):
+    # (output column, area column, intervention/default key); int_var is collected once by the caller
+    eva_red_specs = [
+        ("Cover_Eva_Red", "Cover_Area", "Cover_Crops_Eva_Red"),
+        ("Mulching_Eva_Red", "Mulching_Area", "Mulching_Eva_Red"),
+        ("Tank_Eva_Red", "Tank_Area", "Tank_Eva_Red"),
+        ("Tillage_Eva_Red", "Tillage_Area", "Tillage_Eva_Red")
+    ]
+    for out_col, area_col, key in eva_red_specs:
+        default_val = default_val_eva_red[key]
+        with_practice = pd.to_numeric(df_cc[area_col], errors="coerce") > 0
+        df_cc[out_col] = np.where(with_practice, to_float(int_var[key], default_val), default_val) / 100
+    return df_cc
 
 
 # evapotranspiration.py - Function 004: Calculates average soil evaporation reduction from conservation practices
 # Interactions: pandas
-def calc_red_soil_evap(row):
+def calc_red_soil_evap(df_cc):
     # Calculate the mean of the specified evaporation reduction columns
-    row["red_soil_evap"] = row[["Tillage_Eva_Red", "Tank_Eva_Red", "Mulching_Eva_Red", "Cover_Eva_Red"]].mean()
-    return row
+    eva_red_cols = ["Tillage_Eva_Red", "Tank_Eva_Red", "Mulching_Eva_Red", "Cover_Eva_Red"]
+    df_cc["red_soil_evap"] = df_cc[eva_red_cols].apply(pd.to_numeric, errors="coerce").mean(axis=1)
+    return df_cc
 
 
 # evapotranspiration.py - Function 005: Calculates crop evapotranspiration with special rice preparation handling
@@ -115,13 +115,13 @@ def calc_etci(df_cc, etoi, kci, local_crop, counter):
 
 
 # evapotranspiration.py - Function 006: Calculates soil evaporation coefficient (Kei) for all plots
-# Interactions: pandas
+# Interactions: shared.model_state.get_label_matrix, shared.utilities.assign_columns, numpy
 def calc_kei(df_crop, kei, all_plots):
-    for plot in all_plots:
-        kei_values = df_crop.apply(lambda row: kei if row[f"Kci_{plot}"] == 0 or row[f"Stage_1_{plot}"] > 0 else 0,
-                                   axis=1)
-        df_crop[f"Kei_{plot}"] = kei_values
-    return df_crop
+    # Days x plots: soil evaporation applies on bare soil (Kci 0) and during the initial stage
+    kci = get_label_matrix(df_crop, "Kci", all_plots)
+    stage_1 = get_label_matrix(df_crop, "Stage_1", all_plots)
+    kei_matrix = np.where((kci == 0) | (stage_1 > 0), kei, 0)
+    return assign_columns(df_crop, {f"Kei_{plot}": kei_matrix[:, j] for j, plot in enumerate(all_plots)})
 
 
 # evapotranspiration.py - Function 007: Calculates daily soil evaporation (ESi) for all plots
@@ -132,56 +132,52 @@ def calculate_daily_esi(df_dd, df_crop, all_plots):
     return df_dd
 
 
-# evapotranspiration.py - Function 008: Calculates actual soil evaporation considering water stress and reduction factors
-# Interactions: None
-def calc_ae_soil(esi, pei, ks_soil_cond, ks_soil, x):
-    if ks_soil_cond == 1 or pei > esi:
-        return esi * x
-    elif ks_soil_cond == 2 and pei < esi:
-        return (pei + ks_soil * (esi - pei)) * x
-    elif ks_soil_cond == 3 and pei < esi:
-        return pei * x
-    else:
-        return 0
+# evapotranspiration.py - Function 008: Calculates actual soil evaporation of all plots considering water stress and reduction factors
+# Interactions: numpy
+def calc_ae_soil_array(esi, pei, ks_soil_cond, ks_soil, x):
+    conditions = [
+        (ks_soil_cond == 1) | (pei > esi),
+        (ks_soil_cond == 2) & (pei < esi),
+        (ks_soil_cond == 3) & (pei < esi)
+    ]
+    choices = [esi * x, (pei + ks_soil * (esi - pei)) * x, pei * x]
+    return np.select(conditions, choices, default=0)
 
 
-# evapotranspiration.py - Function 009: Calculates actual crop evapotranspiration considering water stress
-# Interactions: None
-def calc_ae_crop(etci, pei, ks_crop_cond, ks_crop):
-    if ks_crop_cond == 1 or pei > etci:
-        return etci
-    elif ks_crop_cond == 3 and pei < etci:
-        return pei
-    elif ks_crop_cond == 2 and pei < etci:
-        return pei + ks_crop * (etci - pei)
-    else:
-        return 0
+# evapotranspiration.py - Function 009: Calculates actual crop evapotranspiration of all plots considering water stress
+# Interactions: numpy
+def calc_ae_crop_array(etci, pei, ks_crop_cond, ks_crop):
+    conditions = [
+        (ks_crop_cond == 1) | (pei > etci),
+        (ks_crop_cond == 3) & (pei < etci),
+        (ks_crop_cond == 2) & (pei < etci)
+    ]
+    choices = [etci, pei, pei + ks_crop * (etci - pei)]
+    return np.select(conditions, choices, default=0)
 
 
 # evapotranspiration.py - Function 010: Distributes plot-level actual evapotranspiration to individual crops
-# Interactions: numpy, pandas
+# Interactions: pandas
 def calc_ae_per_crop(df_crop, valid_crops_df, ae_type):
     print(f"FUNCTION 37: calc_ae_per_crop() - Calculating actual evapotranspiration for {ae_type}")
     # ae_type can be either "crop" or "soil"
-    ae_plot_col_template = f"AE_{ae_type}_{{plot}}"
-    ae_crop_col_template = f"AE_{ae_type}_{{crop}}"
-
-    # Iterate over each unique plot
+    # Build the crop -> plot AE column map once (a crop listed on several plots takes its last plot)
+    crop_col_map = {}
     for plot in valid_crops_df["Plot"].unique():
-        # Get the crops associated with the current plot
         crops_in_plot = valid_crops_df.loc[valid_crops_df["Plot"] == plot, "Crop"].tolist()
+        for crop in crops_in_plot:
+            if f"{crop}_Sown_Area" in df_crop.columns:
+                # ALWAYS assign plot AE to crop regardless of sown area (1:1 mapping)
+                crop_col_map[f"AE_{ae_type}_{crop}"] = f"AE_{ae_type}_{plot}"
+    if not crop_col_map:
+        return df_crop
 
-        for i in range(len(df_crop)):
-            for crop in crops_in_plot:
-                sown_area_col = f"{crop}_Sown_Area"
-                ae_plot_col = ae_plot_col_template.format(plot=plot)
-                ae_crop_col = ae_crop_col_template.format(crop=crop)
-
-                if sown_area_col in df_crop.columns:
-                    # ALWAYS assign plot AE to crop regardless of sown area (1:1 mapping)
-                    df_crop.loc[i, ae_crop_col] = df_crop.loc[i, ae_plot_col]
-
-    return df_crop
+    # Single block copy of the plot columns under the crop column names
+    ae_crop_df = df_crop[list(crop_col_map.values())].copy()
+    ae_crop_df.columns = list(crop_col_map.keys())
+    existing_cols = [col for col in ae_crop_df.columns if col in df_crop.columns]
+    df_crop[existing_cols] = ae_crop_df[existing_cols]
+    return pd.concat([df_crop, ae_crop_df.drop(columns=existing_cols)], axis=1)
 
 
 # evapotranspiration.py - Function 011: Calculates soil evaporation coefficient for fallow land
@@ -211,9 +207,9 @@ def calc_ae_soil_fallow(esi, pei, ks_soil_cond, ks_soil):
 
 
 # evapotranspiration.py - Function 014: Calculates crop evapotranspiration for each plot
-# Interactions: soil_storage_bucket.processing.crop_coefficients.calc_crop_kc, soil_storage_bucket.processing.crop_coefficients.calc_kci_by_plot, calc_etci, soil_storage_bucket.processing.crop_coefficients.calculate_stage_1, calc_kei, calculate_daily_esi, shared.utilities.calc_monthly_remaining_growth_days, soil_storage_bucket.processing.root_depth.calc_final_crop_rd, soil_storage_bucket.processing.water_stress.calc_final_depletion_factor, pandas
+# Interactions: soil_storage_bucket.processing.crop_coefficients.calc_crop_kc, soil_storage_bucket.processing.crop_coefficients.calc_kci_by_plot, calc_etci, soil_storage_bucket.processing.crop_coefficients.calculate_stage_1, calc_kei, calculate_daily_esi, shared.utilities.calc_monthly_remaining_growth_days, soil_storage_bucket.processing.root_depth.calc_final_crop_rd, soil_storage_bucket.processing.water_stress.calc_final_depletion_factor, shared.model_calendar.resample_monthly, pandas
 def calc_etci_plot(df_crop, df_cc, df_cp, df_dd, df_mm, all_plots, all_crops, num_plots, counter, kei, valid_crops_df,
-                   crop_df):
+                   crop_db, model_calendar):
     print("FUNCTION 23: calc_etci_plot() - Calculating ETc for each plot")
     # Calculate Kci for each crop
     for crop in all_crops:
@@ -228,7 +224,7 @@ def calc_etci_plot(df_crop, df_cc, df_cp, df_dd, df_mm, all_plots, all_crops, nu
         # Create a new column in df_dd for the ETci values of the current crop
         df_dd[f"ETci_{crop}"] = monthly_etci
         # Resample and sum the monthly ETci values for the current crop
-        monthly_etci_sum = df_dd.resample("M", on="Date")[f"ETci_{crop}"].sum().reset_index()
+        monthly_etci_sum = resample_monthly(model_calendar, df_dd, [f"ETci_{crop}"])
         # Merge the monthly ETci with df_mm
         df_mm = df_mm.merge(monthly_etci_sum, on="Date", how="left")
 
@@ -250,7 +246,7 @@ def calc_etci_plot(df_crop, df_cc, df_cp, df_dd, df_mm, all_plots, all_crops, nu
         else:
             print(f"Column {kci_column} not found in df_crop")
 
-        monthly_etci = df_dd.resample("M", on="Date")[f"ETci_{plot}"].sum().reset_index()
+        monthly_etci = resample_monthly(model_calendar, df_dd, [f"ETci_{plot}"])
         df_mm = df_mm.merge(monthly_etci, on="Date", how="left")
 
     total_etci_columns = [f"ETci_{plot}" for plot in all_plots]
@@ -258,9 +254,9 @@ def calc_etci_plot(df_crop, df_cc, df_cp, df_dd, df_mm, all_plots, all_crops, nu
     df_crop = calculate_stage_1(df_crop, all_crops, df_cp)
     df_crop = calc_kei(df_crop, kei, all_plots)
     df_dd = calculate_daily_esi(df_dd, df_crop, all_plots)
-    df_mm = calc_monthly_remaining_growth_days(df_crop, all_crops, df_mm, df_cc)
-    df_crop = calc_final_crop_rd(df_crop, crop_df, all_crops, valid_crops_df)
-    df_crop = calc_final_depletion_factor(df_crop, crop_df, all_crops, valid_crops_df)
+    df_mm = calc_monthly_remaining_growth_days(df_crop, all_crops, df_mm, df_cc, model_calendar)
+    df_crop = calc_final_crop_rd(df_crop, crop_db, all_crops, valid_crops_df)
+    df_crop = calc_final_depletion_factor(df_crop, crop_db, all_crops, valid_crops_df)
     return df_dd, df_crop, df_mm
 
 
@@ -306,4 +302,34 @@ def calc_final_et_biological(df_mm, crops, df_cc, df_crop):
     # Keep original water balance ET calculation unchanged
     df_mm["Final_ET"] = (df_mm["Rain"] - df_mm["Final_Runoff"] - df_mm["Final_Recharge"]).clip(lower=0)
 
-    return df_mm
\ No newline at end of file
+    return df_mm
+
+
+# evapotranspiration.py - Function 017: Moves the reference-ET driven daily and monthly columns onto a new ETom series
+# Interactions: shared.model_calendar.resample_monthly, shared.model_state.get_label_matrix, numpy
+def update_reference_et(df_dd, df_mm, df_crop, etom, all_crops, all_plots, model_calendar):
+    etom = np.asarray(etom, dtype=np.float64)
+    days = df_mm["Days"].to_numpy(dtype=np.float64)
+    new_etoi = (etom / days)[model_calendar["month_id"]]
+    delta_etoi = (new_etoi - df_dd["EToi"].to_numpy(dtype=np.float64))[:, None]
+    # ETc and ESi are EToi times a coefficient plus any fixed allowance, so shifting by the EToi change keeps the allowance
+    crop_etci = get_label_matrix(df_dd, "ETci", all_crops, dtype=np.float64) + \
+        delta_etoi * get_label_matrix(df_crop, "Kci", all_crops, dtype=np.float64)
+    plot_etci = get_label_matrix(df_dd, "ETci", all_plots, dtype=np.float64) + \
+        delta_etoi * get_label_matrix(df_crop, "Kci", all_plots, dtype=np.float64)
+    plot_esi = get_label_matrix(df_dd, "ESi", all_plots, dtype=np.float64) + \
+        delta_etoi * get_label_matrix(df_crop, "Kei", all_plots, dtype=np.float64)
+
+    df_mm["ETom"] = etom.astype(df_mm["ETom"].dtype)
+    df_dd["EToi"] = new_etoi.astype(df_dd["EToi"].dtype)
+    etci_columns = [f"ETci_{label}" for label in list(all_crops) + list(all_plots)]
+    etci = np.hstack([crop_etci, plot_etci])
+    for j, col in enumerate(etci_columns):
+        df_dd[col] = etci[:, j].astype(df_dd[col].dtype)
+    for j, plot in enumerate(all_plots):
+        df_dd[f"ESi_{plot}"] = plot_esi[:, j].astype(df_dd[f"ESi_{plot}"].dtype)
+    df_dd["ETci"] = df_dd[[f"ETci_{plot}" for plot in all_plots]].sum(axis=1)
+    monthly_etci = resample_monthly(model_calendar, df_dd, etci_columns)
+    for col in etci_columns:
+        df_mm[col] = monthly_etci[col].to_numpy()
+    return df_dd, df_mm
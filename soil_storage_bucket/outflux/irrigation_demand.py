@@ -7,6 +7,7 @@ Irrigation demand calculations for drought proofing tool
 # ========================================
 # FILE PURPOSE: Calculates irrigation water requirements and demands based on crop ET and actual ET differences
 # ========================================
+from shared.model_calendar import resample_monthly
 
 
 # irrigation_demand.py - Function 001: Calculates irrigation water requirements as difference between ET and actual ET
@@ -19,22 +20,22 @@ def calculate_iwr(df_dd, df_crop, crops):
 
 
 # irrigation_demand.py - Function 002: Aggregates daily irrigation water requirements to monthly values
-# Interactions: calculate_iwr
-def calculate_monthly_iwr(df_dd, df_mm, df_crop, crops):
+# Interactions: calculate_iwr, shared.model_calendar.resample_monthly
+def calculate_monthly_iwr(df_dd, df_mm, df_crop, crops, model_calendar):
     # Calculate IWR for all crops in a single step
     df_crop = calculate_iwr(df_dd, df_crop.copy(), crops)
-    # Resample and merge IWR with other columns (can be vectorized)
+    # Sum per calendar month and merge IWR with other columns
     for crop in crops:
-        iwr_resampled = df_crop.set_index("Date")[f"IWR_{crop}"].resample("M").sum().reset_index()
+        iwr_resampled = resample_monthly(model_calendar, df_crop, [f"IWR_{crop}"])
         df_mm = df_mm.merge(iwr_resampled, how="left", on="Date", suffixes=("", f"_{crop}"))
-        ae_soil = df_crop[["Date", f"AE_soil_{crop}"]].set_index("Date").resample("M").sum().reset_index()
-        ae_crop = df_crop[["Date", f"AE_crop_{crop}"]].set_index("Date").resample("M").sum().reset_index()
+        ae_soil = resample_monthly(model_calendar, df_crop, [f"AE_soil_{crop}"])
+        ae_crop = resample_monthly(model_calendar, df_crop, [f"AE_crop_{crop}"])
         df_mm = df_mm.merge(ae_soil, how="left", on="Date", suffixes=("", f"_soil_{crop}"))
         df_mm = df_mm.merge(ae_crop, how="left", on="Date", suffixes=("", f"_crop_{crop}"))
 
     # Add fallow area evapotranspiration aggregation if available (only if not already present)
     if "AE_soil_Fallow" in df_dd.columns and "AE_soil_Fallow" not in df_mm.columns:
-        ae_soil_fallow = df_dd[["Date", "AE_soil_Fallow"]].set_index("Date").resample("M").sum().reset_index()
+        ae_soil_fallow = resample_monthly(model_calendar, df_dd, ["AE_soil_Fallow"])
         df_mm = df_mm.merge(ae_soil_fallow, how="left", on="Date")
 
     return df_mm
@@ -14,8 +14,8 @@ This module contains functions for calculating the effects of conservation pract
 # FILE PURPOSE: Calculates effects of conservation practices on soil moisture, field capacity, and evaporation reduction
 # ========================================
 import numpy as np
-import pandas as pd
-from shared.utilities import to_float
+from shared.model_state import get_crop_plot_incidence, get_label_matrix, sum_crops_by_plot
+from shared.utilities import assign_columns, to_float
 
 
 # conservation_practices.py - Function 001: Calculates total area under soil moisture conservation practices
@@ -76,82 +76,66 @@ def calculate_capacity(awc_capacity, with_out_soil_con, total_area, overall_sum,
 
 
 # conservation_practices.py - Function 004: Calculates soil evaporation reduction factors for conservation practices
-# Interactions: pandas, numpy
+# Interactions: shared.model_state.get_label_matrix, shared.utilities.assign_columns, numpy
 def calc_soil_ke(df_crop, df_cc, all_crops):
-    new_columns = {}
-
-    for crop in all_crops:
-        eva_red_area = []
-        eva_red = []
-
-        # Vectorized calculation - much faster than iterrows
-        mask = df_crop[f"{crop}_Sown_Area"] > 0
-        area_calc = (
-            df_cc.at[crop, "Tillage_Area"] +
-            df_cc.at[crop, "Mulching_Area"] +
-            df_cc.at[crop, "Cover_Area"] +
-            df_cc.at[crop, "Tank_Area"]
-        )
-        
-        eva_red_area = np.where(mask, area_calc, 0)
-        eva_red = np.where(mask & (area_calc > 0), df_cc.at[crop, "red_soil_evap"], 0)
+    crops = list(all_crops)
+    # Days x crops mask of sown days, and per-crop practice area and reduction vectors
+    sown = get_label_matrix(df_crop, "Sown_Area", crops, template="{label}_{var}") > 0
+    area_calc = (df_cc.loc[crops, "Tillage_Area"].to_numpy() +
+                 df_cc.loc[crops, "Mulching_Area"].to_numpy() +
+                 df_cc.loc[crops, "Cover_Area"].to_numpy() +
+                 df_cc.loc[crops, "Tank_Area"].to_numpy())
+    red_soil_evap = df_cc.loc[crops, "red_soil_evap"].to_numpy()
+
+    eva_red_area = np.where(sown, area_calc, 0)
+    eva_red = np.where(sown & (area_calc > 0), red_soil_evap, 0)
 
-        new_columns[f"eva_red_area_{crop}"] = eva_red_area
-        new_columns[f"eva_red_{crop}"] = eva_red
+    new_columns = {}
+    for j, crop in enumerate(crops):
+        new_columns[f"eva_red_area_{crop}"] = eva_red_area[:, j]
+        new_columns[f"eva_red_{crop}"] = eva_red[:, j]
+    return assign_columns(df_crop, new_columns)
 
-    # Add all new columns at once to avoid fragmentation
-    df_crop = pd.concat([df_crop, pd.DataFrame(new_columns)], axis=1)
 
-    return df_crop
+# conservation_practices.py - Function 004A: Stacks per-crop columns into a days x crops matrix, zero-filling missing crops
+# Interactions: numpy
+def _get_crop_matrix(df_crop, template, crops):
+    matrix = np.zeros((len(df_crop), len(crops)), dtype=np.float64)
+    for j, crop in enumerate(crops):
+        col = template.format(crop=crop)
+        if col in df_crop.columns:
+            matrix[:, j] = df_crop[col].to_numpy(dtype=np.float64)
+    return matrix
 
 
 # conservation_practices.py - Function 005: Calculates final evaporation reduction factors for each crop
-# Interactions: pandas, numpy
+# Interactions: _get_crop_matrix, shared.utilities.assign_columns, numpy
 def calc_final_evap_red(df_crop, all_crops):
-    new_columns = {}
-    for crop in all_crops:
-        final_evap_red = []
-
-        # Vectorized calculation - much faster than iterrows
-        sown_area = df_crop.get(f"{crop}_Sown_Area", pd.Series([0] * len(df_crop)))
-        eva_red_area = df_crop.get(f"eva_red_area_{crop}", pd.Series([0] * len(df_crop)))
-        eva_red = df_crop.get(f"eva_red_{crop}", pd.Series([0] * len(df_crop)))
-        
-        # Calculate final_evap_red vectorized
-        mask_valid = ~pd.isna(sown_area) & (sown_area > 0)
-        final_evap_red = np.where(
-            mask_valid,
-            1 - ((eva_red_area * eva_red) / sown_area),
-            1
-        )
-
-        new_columns[f"Final_Evap_Red_{crop}"] = final_evap_red
-    df_crop = pd.concat([df_crop, pd.DataFrame(new_columns)], axis=1)
-    return df_crop
-
-
-# conservation_practices.py - Function 006: Calculates weighted evaporation reduction factors aggregated by plot
-# Interactions: pandas
-def calc_final_evap_red_plot_wise(df_crop, all_crops, all_plots):
-    # Initialize the new column with zeros
-    plot_columns = {f"Final_Evap_Red_{plot}": [0.0] * len(df_crop) for plot in all_plots}
-    df_crop = pd.concat([df_crop, pd.DataFrame(plot_columns)], axis=1)
-
-    for plot in all_plots:
-        for crop in all_crops:
-            # Filter rows where plot is present
-            plot_df = df_crop[df_crop.apply(lambda row: any(
-                row[f"Plot_{crop_name}"] == plot for crop_name in all_crops), axis=1)]
-
-            if plot_df.empty:
-                continue
-
-            if f"Final_Evap_Red_{crop}" in df_crop.columns:
-                sown_area_col = f"{crop}_Sown_Area"
-                if sown_area_col in plot_df.columns:
-                    weighted_evap_red = (plot_df[sown_area_col] *
-                                         plot_df[f"Final_Evap_Red_{crop}"]
-                                         ).sum() / plot_df[sown_area_col].sum()
-                    df_crop.loc[plot_df.index, f"Final_Evap_Red_{plot}"] = weighted_evap_red
-
-    return df_crop
\ No newline at end of file
+    crops = list(all_crops)
+    sown_area = _get_crop_matrix(df_crop, "{crop}_Sown_Area", crops)
+    eva_red_area = _get_crop_matrix(df_crop, "eva_red_area_{crop}", crops)
+    eva_red = _get_crop_matrix(df_crop, "eva_red_{crop}", crops)
+
+    mask_valid = ~np.isnan(sown_area) & (sown_area > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        final_evap_red = np.where(mask_valid, 1 - ((eva_red_area * eva_red) / sown_area), 1)
+
+    return assign_columns(df_crop, {f"Final_Evap_Red_{crop}": final_evap_red[:, j] for j, crop in enumerate(crops)})
+
+
+# conservation_practices.py - Function 006: Calculates sown-area weighted evaporation reduction factors aggregated by plot
+# Interactions: _get_crop_matrix, shared.model_state.get_crop_plot_incidence, shared.model_state.sum_crops_by_plot, shared.utilities.assign_columns, numpy
+def calc_final_evap_red_plot_wise(df_crop, valid_crops_df, all_crops, all_plots):
+    crops, plots, incidence = get_crop_plot_incidence(valid_crops_df, all_crops, all_plots)
+    sown_area = np.nan_to_num(_get_crop_matrix(df_crop, "{crop}_Sown_Area", crops))
+    final_evap_red = _get_crop_matrix(df_crop, "Final_Evap_Red_{crop}", crops)
+
+    # Each plot's factor is the sown-area weighted mean of its crops' factors on that day
+    weighted = sum_crops_by_plot(sown_area * final_evap_red, incidence)
+    plot_sown = sum_crops_by_plot(sown_area, incidence)
+    # Plots with crops but nothing sown get no reduction; plots without crops stay at 0
+    has_crops = incidence.sum(axis=0) > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plot_evap_red = np.where(plot_sown > 0, weighted / plot_sown, np.where(has_crops, 1.0, 0.0))
+
+    return assign_columns(df_crop, {f"Final_Evap_Red_{plot}": plot_evap_red[:, j] for j, plot in enumerate(plots)})
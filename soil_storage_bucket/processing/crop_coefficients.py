@@ -8,153 +8,67 @@ Crop coefficient calculations for drought proofing tool
 # FILE PURPOSE: Calculates crop coefficients (Kc) for different growth stages including initial, development, mid-season, and late-season stages
 # ========================================
 
-import math
-import pandas as pd
 import numpy as np
+from shared.crop_database import get_crop_id, get_crop_name, get_crop_param, get_stage_days
+from shared.model_calendar import get_sowing_starts
 
 
 # crop_coefficients.py - Function 001: Calculates initial crop coefficient (Kc) for initial growth stage
-# Interactions: pandas, numpy, math
-def calculate_kc_ini(df, crop_df, sowing_week, sowing_month, stage_column, kc_column, selected_crop):
-    sowing_month_num = pd.to_datetime(f"{sowing_month} 1, 2000").month
-    def local_find_start_date(year):
-        local_start_date = pd.to_datetime(f"{year}-{sowing_month_num}-01")
-        local_start_date += pd.Timedelta(days=(int(sowing_week) - 1) * 7)  # Convert sowing_week to int
-        return local_start_date
-
-    df["start_date"] = df["Date"].dt.year.apply(local_find_start_date)
-
-    crop_row = crop_df[crop_df["Crops"] == selected_crop]
-    if crop_row.empty:
-        raise ValueError(f"Selected crop {selected_crop} not found in crop_df")
-
-    l_days_str = crop_row[stage_column].values[0]
-    kc_value = float(crop_row[kc_column].values[0])
-
-    try:
-        l_ini_days_float = float(l_days_str)
-        # Round up if decimal part exceeds 0.5
-        if (l_ini_days_float % 1) > 0.5:
-            l_ini_days = math.ceil(l_ini_days_float)
-        else:
-            l_ini_days = int(l_ini_days_float)
-
-    except ValueError:
-        raise ValueError(f"Invalid {stage_column} value: {l_days_str}")
-
-    kc_col_name = f"{kc_column}_{selected_crop}"
-    df[kc_col_name] = np.float32(0)
-
-    # Vectorized approach - much faster than iterrows
-    for start_date in df["start_date"].unique():
-        end_date = start_date + pd.Timedelta(days=l_ini_days)
-        mask = (df["Date"] >= start_date) & (df["Date"] < end_date)
-        df.loc[mask, kc_col_name] = np.float32(kc_value)
+# Interactions: shared.crop_database.get_crop_name, shared.crop_database.get_stage_days, shared.crop_database.get_crop_param, calc_stage_kc
+def calculate_kc_ini(df, crop_db, model_calendar, sowing_starts, stage_column, kc_column, crop_id):
+    selected_crop = get_crop_name(crop_db, crop_id)
+    # Stage length is pre-rounded and Kc pre-parsed in the crop database
+    l_ini_days = get_stage_days(crop_db, crop_id, stage_column)
+    kc_value = get_crop_param(crop_db, crop_id, kc_column)
+
+    df[f"{kc_column}_{selected_crop}"] = calc_stage_kc(model_calendar, sowing_starts, 0, l_ini_days, kc_value)
     return df, l_ini_days
 
 
 # crop_coefficients.py - Function 002: Calculates crop coefficient (Kc) for development growth stage
-# Interactions: pandas, numpy, math
-def calculate_kc_dev(df, crop_df, stage_column, kc_column, selected_crop, l_ini_days):
-    crop_row = crop_df[crop_df["Crops"] == selected_crop]
-    if crop_row.empty:
-        raise ValueError(f"Selected crop {selected_crop} not found in crop_df")
-
-    l_days_str = crop_row[stage_column].values[0]
-    kc_value = float(crop_row[kc_column].values[0])
-
-    try:
-        l_dev_days_float = float(l_days_str)
-        # Round up if decimal part exceeds 0.5
-        if (l_dev_days_float % 1) > 0.5:
-            l_dev_days = math.ceil(l_dev_days_float)
-        else:
-            l_dev_days = int(l_dev_days_float)
-    except ValueError:
-        raise ValueError(f"Invalid {stage_column} value: {l_days_str}")
-
-    kc_col_name = f"{kc_column}_{selected_crop}"
-    df[kc_col_name] = np.float32(0)
-
-    # Vectorized approach
-    for start_date in df["start_date"].unique():
-        dev_start_date = start_date + pd.Timedelta(days=l_ini_days)
-        dev_end_date = dev_start_date + pd.Timedelta(days=l_dev_days)
-        mask = (df["Date"] >= dev_start_date) & (df["Date"] < dev_end_date)
-        df.loc[mask, kc_col_name] = np.float32(kc_value)
+# Interactions: shared.crop_database.get_crop_name, shared.crop_database.get_stage_days, shared.crop_database.get_crop_param, calc_stage_kc
+def calculate_kc_dev(df, crop_db, model_calendar, sowing_starts, stage_column, kc_column, crop_id, l_ini_days):
+    selected_crop = get_crop_name(crop_db, crop_id)
+    # Stage length is pre-rounded and Kc pre-parsed in the crop database
+    l_dev_days = get_stage_days(crop_db, crop_id, stage_column)
+    kc_value = get_crop_param(crop_db, crop_id, kc_column)
+
+    df[f"{kc_column}_{selected_crop}"] = calc_stage_kc(model_calendar, sowing_starts, l_ini_days, l_dev_days,
+                                                       kc_value)
     return df, l_dev_days
 
 
 # crop_coefficients.py - Function 003: Calculates crop coefficient (Kc) for mid-season growth stage
-# Interactions: pandas, numpy, math
-def calculate_kc_mid(df, crop_df, stage_column, kc_column, selected_crop, l_ini_days, l_dev_days):
-    crop_row = crop_df[crop_df["Crops"] == selected_crop]
-    if crop_row.empty:
-        raise ValueError(f"Selected crop {selected_crop} not found in crop_df")
-
-    l_days_str = crop_row[stage_column].values[0]
-    kc_value = float(crop_row[kc_column].values[0])
-
-    try:
-        l_mid_days_float = float(l_days_str)
-        # Round up if decimal part exceeds 0.5
-        if (l_mid_days_float % 1) > 0.5:
-            l_mid_days = math.ceil(l_mid_days_float)
-        else:
-            l_mid_days = int(l_mid_days_float)
-
-    except ValueError:
-        raise ValueError(f"Invalid {stage_column} value: {l_days_str}")
-
-    kc_col_name = f"{kc_column}_{selected_crop}"
-    df[kc_col_name] = np.float32(0)
-
-    # Vectorized approach - much faster than iterrows
-    for start_date in df["start_date"].unique():
-        adj_start_date = start_date + pd.Timedelta(days=l_ini_days + l_dev_days)
-        end_date = adj_start_date + pd.Timedelta(days=l_mid_days)
-        mask = (df["Date"] >= adj_start_date) & (df["Date"] < end_date)
-        df.loc[mask, kc_col_name] = np.float32(kc_value)
+# Interactions: shared.crop_database.get_crop_name, shared.crop_database.get_stage_days, shared.crop_database.get_crop_param, calc_stage_kc
+def calculate_kc_mid(df, crop_db, model_calendar, sowing_starts, stage_column, kc_column, crop_id, l_ini_days,
+                     l_dev_days):
+    selected_crop = get_crop_name(crop_db, crop_id)
+    # Stage length is pre-rounded and Kc pre-parsed in the crop database
+    l_mid_days = get_stage_days(crop_db, crop_id, stage_column)
+    kc_value = get_crop_param(crop_db, crop_id, kc_column)
+
+    df[f"{kc_column}_{selected_crop}"] = calc_stage_kc(model_calendar, sowing_starts, l_ini_days + l_dev_days,
+                                                       l_mid_days, kc_value)
     return df, l_mid_days
 
 
 # crop_coefficients.py - Function 004: Calculates crop coefficient (Kc) for late season growth stage
-# Interactions: pandas, numpy, math
-def calculate_kc_late(df, crop_df, stage_column, kc_column, selected_crop, l_ini_days, l_dev_days, l_mid_days):
-    crop_row = crop_df[crop_df["Crops"] == selected_crop]
-    if crop_row.empty:
-        raise ValueError(f"Selected crop {selected_crop} not found in crop_df")
-
-    l_days_str = crop_row[stage_column].values[0]
-    kc_value = float(crop_row[kc_column].values[0])
-
-    try:
-        l_late_days_float = float(l_days_str)
-        # Round up if decimal part exceeds 0.5
-        if (l_late_days_float % 1) > 0.5:
-            l_late_days = math.ceil(l_late_days_float)
-        else:
-            l_late_days = int(l_late_days_float)
-
-    except ValueError:
-        raise ValueError(f"Invalid {stage_column} value: {l_days_str}")
-
-    kc_col_name = f"{kc_column}_{selected_crop}"
-    df[kc_col_name] = np.float32(0)
-
-    # Vectorized approach - much faster than iterrows
-    for start_date in df["start_date"].unique():
-        adj_start_date = start_date + pd.Timedelta(days=l_ini_days + l_dev_days + l_mid_days)
-        end_date = adj_start_date + pd.Timedelta(days=l_late_days)
-        mask = (df["Date"] >= adj_start_date) & (df["Date"] < end_date)
-        df.loc[mask, kc_col_name] = np.float32(kc_value)
-    df.drop("start_date", axis=1, inplace=True)
+# Interactions: shared.crop_database.get_crop_name, shared.crop_database.get_stage_days, shared.crop_database.get_crop_param, calc_stage_kc
+def calculate_kc_late(df, crop_db, model_calendar, sowing_starts, stage_column, kc_column, crop_id, l_ini_days,
+                      l_dev_days, l_mid_days):
+    selected_crop = get_crop_name(crop_db, crop_id)
+    # Stage length is pre-rounded and Kc pre-parsed in the crop database
+    l_late_days = get_stage_days(crop_db, crop_id, stage_column)
+    kc_value = get_crop_param(crop_db, crop_id, kc_column)
+
+    df[f"{kc_column}_{selected_crop}"] = calc_stage_kc(model_calendar, sowing_starts,
+                                                       l_ini_days + l_dev_days + l_mid_days, l_late_days, kc_value)
     return df, l_late_days
 
 
 # crop_coefficients.py - Function 005: Processes all crop coefficients through all growth stages for multiple crops
-# Interactions: calculate_kc_ini, calculate_kc_dev, calculate_kc_mid, calculate_kc_late
-def process_crops(df, crop_df, crops, sowing_months, sowing_weeks, df_cp):
+# Interactions: shared.crop_database.get_crop_id, shared.model_calendar.get_sowing_starts, calculate_kc_ini, calculate_kc_dev, calculate_kc_mid, calculate_kc_late
+def process_crops(df, crop_db, crops, sowing_months, sowing_weeks, df_cp, model_calendar):
     print("FUNCTION 17: process_crops() - Processing crop coefficients")
     for i, selected_crop in enumerate(crops):
         if selected_crop:
@@ -165,13 +79,17 @@ def process_crops(df, crop_df, crops, sowing_months, sowing_weeks, df_cp):
             plot_info = df_cp[df_cp["Crop"] == selected_crop]["Plot"].values[0]
             df[f"Plot_{selected_crop}"] = plot_info
 
-            df, l_ini_days = calculate_kc_ini(df, crop_df, sowing_week, sowing_month, "L_ini_days", "kc_ini",
-                                              selected_crop)
-            df, l_dev_days = calculate_kc_dev(df, crop_df, "L_dev_days", "kc_dev", selected_crop, l_ini_days)
-            df, l_mid_days = calculate_kc_mid(df, crop_df, "L_mid_days", "kc_mid", selected_crop, l_ini_days,
-                                              l_dev_days)
-            df, l_late_days = calculate_kc_late(df, crop_df, "L_late_days", "kc_end", selected_crop, l_ini_days,
-                                                l_dev_days, l_mid_days)
+            # Resolve the crop id and the yearly sowing dates once for all four stages
+            crop_id = get_crop_id(crop_db, selected_crop)
+            sowing_starts = get_sowing_starts(model_calendar, sowing_month, sowing_week)
+            df, l_ini_days = calculate_kc_ini(df, crop_db, model_calendar, sowing_starts, "L_ini_days", "kc_ini",
+                                              crop_id)
+            df, l_dev_days = calculate_kc_dev(df, crop_db, model_calendar, sowing_starts, "L_dev_days", "kc_dev",
+                                              crop_id, l_ini_days)
+            df, l_mid_days = calculate_kc_mid(df, crop_db, model_calendar, sowing_starts, "L_mid_days", "kc_mid",
+                                              crop_id, l_ini_days, l_dev_days)
+            df, l_late_days = calculate_kc_late(df, crop_db, model_calendar, sowing_starts, "L_late_days", "kc_end",
+                                                crop_id, l_ini_days, l_dev_days, l_mid_days)
     return df
 
 
@@ -238,4 +156,16 @@ def calculate_stage_1(df, crops, df_cp):
         if f"Stage_1_{crop}" in df.columns:
             mask = df[f"Plot_{crop}"] == plot
             df.loc[mask, f"Stage_1_{plot}"] += df.loc[mask, f"Stage_1_{crop}"]
-    return df
\ No newline at end of file
+    return df
+
+
+# crop_coefficients.py - Function 009: Builds the daily Kc series of one growth stage from the yearly sowing dates
+# Interactions: numpy
+def calc_stage_kc(model_calendar, sowing_starts, stage_offset, stage_days, kc_value):
+    day_number = model_calendar["day_number"]
+    in_stage = np.zeros(len(day_number), dtype=bool)
+    # A stage window may run past the year end, so every year's window is checked against every day
+    for start in np.unique(sowing_starts):
+        stage_start = start + stage_offset
+        in_stage |= (day_number >= stage_start) & (day_number < stage_start + stage_days)
+    return np.where(in_stage, np.float32(kc_value), np.float32(0)).astype(np.float32)
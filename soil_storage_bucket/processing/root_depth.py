@@ -8,73 +8,61 @@ Root depth calculations for drought proofing tool
 # FILE PURPOSE: Calculates crop root depths based on growth stages and aggregates by plot for soil moisture calculations
 # ========================================
 
-import pandas as pd
+import numpy as np
+from shared.crop_database import has_crop, get_crop_id
+from shared.model_state import get_crop_plot_incidence, sum_crops_by_plot
+from shared.utilities import assign_columns
 
 
 # root_depth.py - Function 001: Calculates crop root depth based on growth stage and crop parameters
-# Interactions: None
-def root_dep(row, min_root_depth, max_root_depth, total_growth_days, selected_crop):
-    try:
-        rg_days = row[f"RG_days_{selected_crop}"]
-        # Handle NaN values by treating them as 0 (no active crop)
-        if pd.isna(rg_days) or rg_days == 0:
-            crop_rd = 0
-        else:
-            crop_rd = min_root_depth + (max_root_depth - min_root_depth) * \
-                      (total_growth_days - rg_days) / total_growth_days
-        return crop_rd
-    except ValueError:
-        return None
+# Interactions: numpy
+def root_dep(rg_days, min_root_depth, max_root_depth, total_growth_days):
+    rg_days = np.asarray(rg_days, dtype=np.float64)
+    # Handle NaN values by treating them as 0 (no active crop)
+    inactive = np.isnan(rg_days) | (rg_days == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crop_rd = min_root_depth + (max_root_depth - min_root_depth) * (total_growth_days - rg_days) / total_growth_days
+    return np.where(inactive, 0, crop_rd)
 
 
 # root_depth.py - Function 002: Calculates root depth for a specific crop throughout growing season
-# Interactions: root_dep
-def calculate_crop_rd(df_crop, crop_df, selected_crop):
-    crop_row = crop_df[crop_df["Crops"] == selected_crop]
-
-    if not crop_row.empty:
-        min_root_depth_str = crop_row["Min root depth"].values[0]
-        total_growth_days_str = crop_row["Total Growth Days"].values[0]
-        max_root_depth_str = crop_row["Max root depth"].values[0]
-
-        try:
-            min_root_depth = float(min_root_depth_str)
-            max_root_depth = float(max_root_depth_str)
-            total_growth_days = float(total_growth_days_str)
-
-            df_crop[f"{selected_crop}_crop_rd"] = df_crop.apply(
-                lambda row: root_dep(row, min_root_depth, max_root_depth, total_growth_days, selected_crop), axis=1
-            )
-        except ValueError:
-            raise ValueError(
-                f"Invalid values found: Min root depth={min_root_depth_str}, Max root depth={max_root_depth_str}, "
-                f"Total Growth Days={total_growth_days_str}")
-    else:
+# Interactions: root_dep, shared.crop_database.has_crop, shared.crop_database.get_crop_id
+def calculate_crop_rd(df_crop, crop_db, selected_crop):
+    if not has_crop(crop_db, selected_crop):
         print(f"No '{selected_crop}' crop found in the crop data.")
+        return None
+
+    crop_id = get_crop_id(crop_db, selected_crop)
+    min_root_depth = crop_db["params"]["Min root depth"][crop_id]
+    max_root_depth = crop_db["params"]["Max root depth"][crop_id]
+    total_growth_days = crop_db["params"]["Total Growth Days"][crop_id]
+    if np.isnan(min_root_depth) or np.isnan(max_root_depth) or np.isnan(total_growth_days):
+        raw = crop_db["raw"]
+        raise ValueError(
+            f"Invalid values found: Min root depth={raw['Min root depth'][crop_id]}, "
+            f"Max root depth={raw['Max root depth'][crop_id]}, "
+            f"Total Growth Days={raw['Total Growth Days'][crop_id]}")
+    return root_dep(df_crop[f"RG_days_{selected_crop}"], min_root_depth, max_root_depth, total_growth_days)
 
 
 # root_depth.py - Function 003: Calculates final aggregated root depth by plot for all crops
-# Interactions: calculate_crop_rd
-def calc_final_crop_rd(df_crop, crop_df, all_crops, valid_crops_df):
+# Interactions: calculate_crop_rd, shared.model_state.get_crop_plot_incidence, shared.model_state.sum_crops_by_plot, shared.utilities.assign_columns
+def calc_final_crop_rd(df_crop, crop_db, all_crops, valid_crops_df):
     print("FUNCTION 21: calc_final_crop_rd() - Calculating final crop root depth")
     # Step 1: Calculate root depth for each crop
+    crop_rd = {}
     for selected_crop in all_crops:
-        calculate_crop_rd(df_crop, crop_df, selected_crop)
-
-    # Step 2: Initialize columns for each plot
-    plot_numbers = valid_crops_df["Plot"].unique()
-    for plot in plot_numbers:
-        df_crop[f"crop_rd_{plot}"] = 0
-
-    # Step 3: Sum root depth for each plot
-    for plot in plot_numbers:
-        # Get the list of crops for this plot
-        crops_in_plot = valid_crops_df[valid_crops_df["Plot"] == plot]["Crop"].tolist()
+        values = calculate_crop_rd(df_crop, crop_db, selected_crop)
+        if values is not None:
+            crop_rd[f"{selected_crop}_crop_rd"] = values
+    df_crop = assign_columns(df_crop, crop_rd)
 
-        # Calculate sum of root depth for crops in this plot
-        if crops_in_plot:
-            df_crop[f"crop_rd_{plot}"] = df_crop.apply(
-                lambda row: sum(row[f"{crop}_crop_rd"] for crop in crops_in_plot if f"{crop}_crop_rd" in row.index),
-                axis=1
-            )
-    return df_crop
\ No newline at end of file
+    # Step 2: Sum root depth for each plot as a day x crop by crop x plot product
+    crops, plots, incidence = get_crop_plot_incidence(valid_crops_df)
+    rd_matrix = np.column_stack([
+        df_crop[f"{crop}_crop_rd"].to_numpy(dtype=np.float64) if f"{crop}_crop_rd" in df_crop.columns
+        else np.zeros(len(df_crop)) for crop in crops
+    ]) if crops else np.zeros((len(df_crop), 0))
+    plot_rd = sum_crops_by_plot(rd_matrix, incidence)
+    df_crop = assign_columns(df_crop, {f"crop_rd_{plot}": plot_rd[:, j] for j, plot in enumerate(plots)})
+    return df_crop
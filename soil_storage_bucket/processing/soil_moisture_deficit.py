@@ -3,6 +3,7 @@ Soil moisture deficit calculations for soil storage bucket
 
 This module contains functions for calculating soil moisture deficit:
 - SMD calculations for each plot
+- The daily SMD loop over day x plot arrays, with optional trailing member axes
 - SMD calculations using water balance approach
 - SMD calculations for fallow land areas
 
@@ -14,82 +15,66 @@ This module contains functions for calculating soil moisture deficit:
 # ========================================
 
 import numpy as np
-import pandas as pd
-from soil_storage_bucket.processing.water_stress import calc_ks_soil_cond, calc_ks_soil, calc_ks_crop_cond, calc_ks_crop
-from soil_storage_bucket.outflux.evapotranspiration import calc_ae_soil, calc_ae_crop, calc_ae_per_crop
+from shared.model_state import create_model_state, pack_columns, get_state_var, write_state_to_frame
+from soil_storage_bucket.processing.water_stress import calc_ks_cond_array, calc_ks_array
+from soil_storage_bucket.outflux.evapotranspiration import calc_ae_soil_array, calc_ae_crop_array, calc_ae_per_crop
 from aquifer_storage_bucket.influx.recharge_calculations import update_gwnr
 
+# Plot-indexed variables read by calc_smdi_series (from df_crop and df_dd) and the ones it produces
+SMDI_INPUT_VARS = ["Kei", "REWi", "TEWi", "Final_Evap_Red", "Kci", "RAWi", "TAWi", "ESi", "ETci"]
+SMDI_OUTPUT_VARS = ["SMDi_shifted", "SMDi", "Ks_soil_cond", "Ks_soil", "AE_soil", "Ks_crop_cond", "Ks_crop", "AE_crop"]
+
 
 # soil_moisture_deficit.py - Function 001: Calculates soil moisture deficit index for each plot
-# Interactions: soil_storage_bucket.processing.water_stress.calc_ks_soil_cond, soil_storage_bucket.processing.water_stress.calc_ks_soil, soil_storage_bucket.processing.water_stress.calc_ks_crop_cond, soil_storage_bucket.processing.water_stress.calc_ks_crop, soil_storage_bucket.outflux.evapotranspiration.calc_ae_soil, soil_storage_bucket.outflux.evapotranspiration.calc_ae_crop, calc_smd, soil_storage_bucket.outflux.evapotranspiration.calc_ae_per_crop, aquifer_storage_bucket.influx.recharge_calculations.update_gwnr, pandas, numpy
+# Interactions: calc_smdi_series, write_smdi_outputs, shared.model_state.create_model_state, shared.model_state.pack_columns, shared.model_state.get_state_var, numpy
 def calc_smdi_plot(df_crop, df_dd, valid_crops_df, all_plots, smdi_1):
     print("FUNCTION 18: calc_smdi_plot() - Calculating soil moisture deficit for each plot")
-    smdi_shifted_dict = {}
-    smdi_dict = {}
-
-    for plot in all_plots:
-        # Initialize the first value and store it in the dictionary
-        smdi_shifted_dict[f"SMDi_shifted_{plot}"] = [smdi_1] + [0] * (len(df_crop) - 1)
-        # Create an array of zeros for SMDi_{plot}
-        smdi_dict[f"SMDi_{plot}"] = np.zeros(len(df_crop), dtype=np.float32)
-
-    # Convert dictionaries to DataFrames
-    smdi_shifted_df = pd.DataFrame(smdi_shifted_dict, dtype=np.float32)
-    smdi_df = pd.DataFrame(smdi_dict)
-
-    # Assign the new columns to df_crop at once
-    df_crop = pd.concat([df_crop, smdi_shifted_df, smdi_df], axis=1)
-    for plot in all_plots:
-        for i in range(len(df_crop)):
-            if i > 0:
-                df_crop.loc[i, f"SMDi_shifted_{plot}"] = df_crop.loc[i - 1, f"SMDi_{plot}"]
-
-            df_crop.loc[i, f"Ks_soil_cond_{plot}"] = calc_ks_soil_cond(df_crop.loc[i, f"Kei_{plot}"],
-                                                                       df_crop.loc[i, f"SMDi_shifted_{plot}"],
-                                                                       df_crop.loc[i, f"REWi_{plot}"],
-                                                                       df_crop.loc[i, f"TEWi_{plot}"])
-
-            df_crop.loc[i, f"Ks_soil_{plot}"] = calc_ks_soil(df_crop.loc[i, f"Ks_soil_cond_{plot}"],
-                                                             df_crop.loc[i, f"TEWi_{plot}"],
-                                                             df_crop.loc[i, f"SMDi_shifted_{plot}"],
-                                                             df_crop.loc[i, f"REWi_{plot}"])
-
-            df_crop.loc[i, f"AE_soil_{plot}"] = calc_ae_soil(df_dd.loc[i, f"ESi_{plot}"],
-                                                             df_dd.loc[i, "Pei"],
-                                                             df_crop.loc[i, f"Ks_soil_cond_{plot}"],
-                                                             df_crop.loc[i, f"Ks_soil_{plot}"],
-                                                             df_crop.loc[i, f"Final_Evap_Red_{plot}"])
-
-            df_crop.loc[i, f"Ks_crop_cond_{plot}"] = calc_ks_crop_cond(df_crop.loc[i, f"Kci_{plot}"],
-                                                                       df_crop.loc[i, f"SMDi_shifted_{plot}"],
-                                                                       df_crop.loc[i, f"RAWi_{plot}"],
-                                                                       df_crop.loc[i, f"TAWi_{plot}"])
-
-            df_crop.loc[i, f"Ks_crop_{plot}"] = calc_ks_crop(df_crop.loc[i, f"Ks_crop_cond_{plot}"],
-                                                             df_crop.loc[i, f"TAWi_{plot}"],
-                                                             df_crop.loc[i, f"SMDi_shifted_{plot}"],
-                                                             df_crop.loc[i, f"RAWi_{plot}"])
-
-            df_crop.loc[i, f"AE_crop_{plot}"] = calc_ae_crop(df_dd.loc[i, f"ETci_{plot}"],
-                                                             df_dd.loc[i, "Pei"],
-                                                             df_crop.loc[i, f"Ks_crop_cond_{plot}"],
-                                                             df_crop.loc[i, f"Ks_crop_{plot}"])
-
-            smdi_value = calc_smd(df_crop.loc[i, f"SMDi_shifted_{plot}"],
-                                  df_crop.loc[i, f"AE_soil_{plot}"],
-                                  df_crop.loc[i, f"AE_crop_{plot}"],
-                                  df_dd.loc[i, "Pei"])
-
-            df_crop.loc[i, f"SMDi_{plot}"] = np.float32(smdi_value)
-
-    for plot in all_plots:
-        columns_to_convert = [
-            f"SMDi_shifted_{plot}", f"Ks_soil_cond_{plot}", f"Ks_soil_{plot}",
-            f"AE_soil_{plot}", f"Ks_crop_cond_{plot}", f"Ks_crop_{plot}",
-            f"AE_crop_{plot}", f"SMDi_{plot}"
-        ]
-
-        df_crop[columns_to_convert] = df_crop[columns_to_convert].astype("float32")
+    # Hold the plot-indexed inputs as day x plot x variable arrays for the daily loop
+    state = create_model_state(len(df_crop), plots=all_plots, plot_vars=SMDI_INPUT_VARS)
+    pack_columns(state, df_crop, "plot", ["Kei", "REWi", "TEWi", "Final_Evap_Red", "Kci", "RAWi", "TAWi"])
+    pack_columns(state, df_dd, "plot", ["ESi", "ETci"])
+    smdi_outputs = calc_smdi_series(*(get_state_var(state, "plot", var) for var in SMDI_INPUT_VARS),
+                                    df_dd["Pei"].to_numpy(dtype=np.float64)[:, np.newaxis], smdi_1)
+    return write_smdi_outputs(df_crop, df_dd, smdi_outputs, valid_crops_df, all_plots)
+
+
+# soil_moisture_deficit.py - Function 001A: Steps the plot soil moisture deficits through time for day x plot arrays
+# Interactions: soil_storage_bucket.processing.water_stress.calc_ks_cond_array, soil_storage_bucket.processing.water_stress.calc_ks_array, soil_storage_bucket.outflux.evapotranspiration.calc_ae_soil_array, soil_storage_bucket.outflux.evapotranspiration.calc_ae_crop_array, numpy
+def calc_smdi_series(kei, rewi, tewi, evap_red, kci, rawi, tawi, esi, etci, pei, smdi_1):
+    # Arrays are days x plots; any trailing axes (e.g. ensemble members) are stepped together
+    kei, rewi, tewi, evap_red, kci, rawi, tawi, esi, etci, pei = np.broadcast_arrays(
+        kei, rewi, tewi, evap_red, kci, rawi, tawi, esi, etci, pei)
+    smdi_outputs = {var: np.zeros(pei.shape, dtype=np.float64) for var in SMDI_OUTPUT_VARS}
+    smdi_shifted, smdi = smdi_outputs["SMDi_shifted"], smdi_outputs["SMDi"]
+    ks_soil_cond, ks_soil = smdi_outputs["Ks_soil_cond"], smdi_outputs["Ks_soil"]
+    ks_crop_cond, ks_crop = smdi_outputs["Ks_crop_cond"], smdi_outputs["Ks_crop"]
+    ae_soil, ae_crop = smdi_outputs["AE_soil"], smdi_outputs["AE_crop"]
+
+    # Days depend on the previous day's deficit, so step through time and evaluate all plots together
+    smdi_prev = np.full(pei.shape[1:], smdi_1, dtype=np.float32)
+    for i in range(pei.shape[0]):
+        smdi_shifted[i] = smdi_prev
+        ks_soil_cond[i] = calc_ks_cond_array(kei[i], smdi_shifted[i], rewi[i], tewi[i])
+        ks_soil[i] = calc_ks_array(ks_soil_cond[i], tewi[i], smdi_shifted[i], rewi[i])
+        ae_soil[i] = calc_ae_soil_array(esi[i], pei[i], ks_soil_cond[i], ks_soil[i], evap_red[i])
+        ks_crop_cond[i] = calc_ks_cond_array(kci[i], smdi_shifted[i], rawi[i], tawi[i])
+        ks_crop[i] = calc_ks_array(ks_crop_cond[i], tawi[i], smdi_shifted[i], rawi[i])
+        ae_crop[i] = calc_ae_crop_array(etci[i], pei[i], ks_crop_cond[i], ks_crop[i])
+        smdi_value = smdi_shifted[i] + ae_soil[i] + ae_crop[i] - pei[i]
+        smdi_prev = np.where(smdi_value < 0, 0, smdi_value).astype(np.float32)
+        smdi[i] = smdi_prev
+    return smdi_outputs
+
+
+# soil_moisture_deficit.py - Function 001B: Writes day x plot deficit results to df_crop with per-crop AE and plot recharge
+# Interactions: shared.model_state.create_model_state, shared.model_state.get_state_var, shared.model_state.write_state_to_frame, soil_storage_bucket.outflux.evapotranspiration.calc_ae_per_crop, aquifer_storage_bucket.influx.recharge_calculations.update_gwnr
+def write_smdi_outputs(df_crop, df_dd, smdi_outputs, valid_crops_df, all_plots):
+    state = create_model_state(len(df_crop), plots=all_plots, plot_vars=SMDI_OUTPUT_VARS)
+    for var in SMDI_OUTPUT_VARS:
+        get_state_var(state, "plot", var)[:] = smdi_outputs[var]
+    # Convert back to the wide "{var}_{plot}" layout only at the stage boundary
+    df_crop = write_state_to_frame(df_crop, state, "plot", ["SMDi_shifted", "SMDi"])
+    df_crop = write_state_to_frame(df_crop, state, "plot", SMDI_OUTPUT_VARS[2:], label_major=True)
 
     df_crop = calc_ae_per_crop(df_crop, valid_crops_df, ae_type="crop")
     df_crop = calc_ae_per_crop(df_crop, valid_crops_df, ae_type="soil")
@@ -97,14 +82,5 @@ def calc_smdi_plot(df_crop, df_dd, valid_crops_df, all_plots, smdi_1):
     return df_crop
 
 
-# soil_moisture_deficit.py - Function 002: Calculates soil moisture deficit using water balance approach
-# Interactions: None
-def calc_smd(smdi, ae_soil, ae_crop, pei):
-    if smdi + ae_soil + ae_crop - pei < 0:
-        return 0
-    else:
-        return smdi + ae_soil + ae_crop - pei
-
-
 # calc_smd_fallow function moved to aquifer_storage_bucket/influx/recharge_calculations.py
 # to break circular import dependency
\ No newline at end of file
@@ -13,35 +13,34 @@ This module contains functions for calculating various water capacities in soil:
 # ========================================
 # FILE PURPOSE: Calculates soil water capacities including total and readily available water for crops and evaporation
 # ========================================
+from shared.utilities import assign_columns
 
 
 # water_capacity.py - Function 001: Calculates total available water (TAW) for each plot based on root depth
-# Interactions: None
+# Interactions: shared.utilities.assign_columns
 def calc_taw(df_crop, capacity, all_plots):
-    for plot in all_plots:
-        df_crop[f"TAWi_{plot}"] = capacity * df_crop[f"crop_rd_{plot}"]
-    return df_crop
+    root_depth = df_crop[[f"crop_rd_{plot}" for plot in all_plots]].to_numpy()
+    taw = capacity * root_depth
+    return assign_columns(df_crop, {f"TAWi_{plot}": taw[:, j] for j, plot in enumerate(all_plots)})
 
 
 # water_capacity.py - Function 002: Calculates readily available water (RAW) based on depletion factors
-# Interactions: None
+# Interactions: shared.utilities.assign_columns
 def calc_raw(df_crop, all_plots):
-    for plot in all_plots:
-        df_crop[f"RAWi_{plot}"] = df_crop[f"final_depletion_{plot}"] * df_crop[f"TAWi_{plot}"]
-    return df_crop
+    depletion = df_crop[[f"final_depletion_{plot}" for plot in all_plots]].to_numpy()
+    raw = depletion * df_crop[[f"TAWi_{plot}" for plot in all_plots]].to_numpy()
+    return assign_columns(df_crop, {f"RAWi_{plot}": raw[:, j] for j, plot in enumerate(all_plots)})
 
 
 # water_capacity.py - Function 003: Calculates total evaporable water (TEW) from soil surface layer
-# Interactions: None
+# Interactions: shared.utilities.assign_columns
 def calc_tew(df_crop, theta_fc, theta_wp, all_plots):
-    for plot in all_plots:
-        df_crop[f"TEWi_{plot}"] = (theta_fc - 0.5 * theta_wp) * df_crop["Ze"]
-    return df_crop
+    tew = ((theta_fc - 0.5 * theta_wp) * df_crop["Ze"]).to_numpy()
+    return assign_columns(df_crop, {f"TEWi_{plot}": tew for plot in all_plots})
 
 
 # water_capacity.py - Function 004: Calculates readily evaporable water (REW) from soil surface
-# Interactions: None
+# Interactions: shared.utilities.assign_columns
 def calc_rew(df_crop, all_plots):
-    for plot in all_plots:
-        df_crop[f"REWi_{plot}"] = 0.4 * df_crop[f"TEWi_{plot}"]
-    return df_crop
\ No newline at end of file
+    rew = 0.4 * df_crop[[f"TEWi_{plot}" for plot in all_plots]].to_numpy()
+    return assign_columns(df_crop, {f"REWi_{plot}": rew[:, j] for j, plot in enumerate(all_plots)})
@@ -31,5 +31,5 @@ def calc_crop_int(df_crop, df_cc, df_cp, valid_crops_df, all_plots, all_crops, s
     df_crop = calculate_net_sown_area_by_plot(df_crop, valid_crops_df, df_cc)
     df_crop = calc_soil_ke(df_crop, df_cc, all_crops)
     df_crop = calc_final_evap_red(df_crop, all_crops)
-    df_crop = calc_final_evap_red_plot_wise(df_crop, all_crops, all_plots)
+    df_crop = calc_final_evap_red_plot_wise(df_crop, valid_crops_df, all_crops, all_plots)
     return df_crop
\ No newline at end of file
@@ -11,15 +11,13 @@ This module contains functions for calculating water supply availability:
 # FILE PURPOSE: Calculates water supply availability from external sources like canals
 # ========================================
 import numpy as np
+from shared.model_calendar import get_month_position
 
 
 # water_supply.py - Function 001: Calculates canal water supply availability
-# Interactions: numpy
-def calc_canal_supply(df_ir, df_mm):
-    def get_canal_supply(row):
-        month_index = row.name % 12
-        value = df_ir.loc[month_index, "Canal_WA"]
-        return 0 if np.isnan(value) else value
-
-    df_mm["Canal_supply"] = df_mm.apply(get_canal_supply, axis=1)
+# Interactions: shared.model_calendar.get_month_position, numpy
+def calc_canal_supply(df_ir, df_mm, model_calendar):
+    # The irrigation table holds one row per calendar month, looked up by each month's position
+    canal_supply = df_ir.loc[get_month_position(model_calendar), "Canal_WA"].to_numpy(dtype=np.float64)
+    df_mm["Canal_supply"] = np.where(np.isnan(canal_supply), 0, canal_supply)
     return df_mm
\ No newline at end of file
@@ -12,7 +12,8 @@ This module contains functions for calculating runoff:
 # FILE PURPOSE: Calculates surface runoff using SCS curve number method and processes water abstraction parameters
 # ========================================
 import numpy as np
-from shared.utilities import to_float, mm_to_m3, safe_divide
+from shared.utilities import to_float, mm_to_m3, safe_divide, assign_columns
+from shared.model_calendar import resample_monthly
 from surface_water_bucket.processing.curve_numbers import calc_cn
 from outputs.output_aggregator import calc_weighted_avg
 from aquifer_storage_bucket.influx.recharge_calculations import get_recharge
@@ -21,27 +22,36 @@ from surface_water_bucket.influx.precipitation_processing import get_rain_src_mo
 
 # runoff_calculations.py - Function 001: Processes monthly runoff and converts to cubic meters
 # Interactions: calculate_monthly_qi, shared.utilities.to_float, shared.utilities.mm_to_m3
-def process_monthly_qi(df_dd, df_mm, inp_aquifer_para):
+def process_monthly_qi(df_dd, df_mm, inp_aquifer_para, model_calendar):
     # Calculate monthly Qi
-    df_mm = calculate_monthly_qi(df_dd, df_mm)
+    df_mm = calculate_monthly_qi(df_dd, df_mm, model_calendar)
     # Convert Qom from mm to m^3
     df_mm["Qom(m^3)"] = mm_to_m3(to_float(inp_aquifer_para[3], 0), df_mm["Qom"])
     return df_mm
 
 
 # runoff_calculations.py - Function 002: Calculates runoff discharge using curve number method
-# Interactions: surface_water_bucket.processing.curve_numbers.calc_cn, calc_abstraction, aquifer_storage_bucket.influx.recharge_calculations.get_recharge, surface_water_bucket.influx.precipitation_processing.get_rain_src_model, runoff_cn, calc_runoff_cn, get_eff_rain
+# Interactions: calc_runoff_arrays, shared.utilities.assign_columns, numpy
 def calc_discharge(df_dd, df_crop, fixed_values_list):
-    df_dd["CNi"] = calc_cn(df_crop)
-    df_dd["Si"], df_dd["Iai"] = calc_abstraction(df_dd, df_crop, fixed_values_list[0], fixed_values_list[1],
-                                                 fixed_values_list[2])
-    df_dd["Recharge_src"] = df_dd.apply(lambda x: get_recharge(x["Pi"], fixed_values_list[3]), axis=1)
-    df_dd["Rain_src"] = df_dd.apply(lambda row: get_rain_src_model(row["Pi"], row["Recharge_src"]), axis=1)
-    df_dd["runoff"] = df_dd.apply(lambda row: runoff_cn(row["Pi"], row["Iai"], row["Si"]), axis=1)
-    df_dd["Qi"] = df_dd.apply(lambda row: calc_runoff_cn(row["Rain_src"], row["Iai"], row["runoff"]), axis=1)
-    df_dd["Eff_Rain"] = df_dd.apply(lambda row: get_eff_rain(row["Rain_src"], row["Qi"]), axis=1)
-    df_dd["Pei"] = df_dd.apply(lambda row: get_eff_rain(row["Pi"], row["Qi"]), axis=1)
-    return df_dd
+    return assign_columns(df_dd, calc_runoff_arrays(df_dd["Pi"].to_numpy(dtype=np.float64), df_crop,
+                                                    fixed_values_list))
+
+
+# runoff_calculations.py - Function 002A: Calculates the curve number runoff series for day-indexed arrays
+# Interactions: surface_water_bucket.processing.curve_numbers.calc_cn, calc_abstraction, aquifer_storage_bucket.influx.recharge_calculations.get_recharge, surface_water_bucket.influx.precipitation_processing.get_rain_src_model, runoff_cn, calc_runoff_cn, get_eff_rain
+def calc_runoff_arrays(pi, df_crop, fixed_values_list):
+    # Arrays are days first; rainfall and AMC may carry trailing member axes that broadcast against the curve numbers
+    cni = calc_cn(df_crop)
+    si, iai = calc_abstraction({"CNi": cni}, df_crop, fixed_values_list[0], fixed_values_list[1],
+                               fixed_values_list[2])
+    recharge_src = get_recharge(pi, fixed_values_list[3])
+    rain_src = get_rain_src_model(pi, recharge_src)
+    runoff = runoff_cn(pi, iai, si)
+    qi = calc_runoff_cn(rain_src, iai, runoff)
+    return {
+        "CNi": cni, "Si": si, "Iai": iai, "Recharge_src": recharge_src, "Rain_src": rain_src, "runoff": runoff,
+        "Qi": qi, "Eff_Rain": get_eff_rain(rain_src, qi), "Pei": get_eff_rain(pi, qi),
+    }
 
 
 # runoff_calculations.py - Function 003: Calculates water abstraction parameters for runoff calculation
@@ -66,9 +76,9 @@ def runoff_cn(pi, iai, si):
 
 
 # runoff_calculations.py - Function 005: Applies runoff calculation only when rainfall exceeds initial abstraction
-# Interactions: None
+# Interactions: numpy
 def calc_runoff_cn(rain_src, iai, runoff):
-    return 0 if rain_src < iai else runoff
+    return np.where(rain_src < iai, 0, runoff)
 
 
 # runoff_calculations.py - Function 006: Calculates effective rainfall by subtracting runoff from net rainfall
@@ -79,10 +89,10 @@ def get_eff_rain(rain_src, runoff):
 
 
 # runoff_calculations.py - Function 007: Aggregates daily runoff to monthly totals and merges with monthly data
-# Interactions: pandas
-def calculate_monthly_qi(df_dd, df_mm):
-    # Resample the Qi values to a monthly frequency and sum them
-    qom = df_dd.resample("M", on="Date")["Qi"].sum().reset_index()
+# Interactions: shared.model_calendar.resample_monthly, pandas
+def calculate_monthly_qi(df_dd, df_mm, model_calendar):
+    # Sum the Qi values per calendar month
+    qom = resample_monthly(model_calendar, df_dd, ["Qi"])
 
     # Merge the resampled monthly Qi values into df_mm
     df_mm = df_mm.merge(qom, on="Date", how="left")